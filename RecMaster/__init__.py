@@ -1,11 +1,51 @@
-from .videoRecorder import RecorderUI, ScreenRecorder
-from .audio_recorder import AudioRecorderManager
+import importlib
+import sys
 
 __version__ = "0.1.1"
 
+# 公开的名称和所在的模块：第一次访问时才导入，import RecMaster 不加载 numpy、comtypes 和 tkinter
+_EXPORTS = {
+    'AudioRecorderManager': 'audio_recorder',
+    'CaptureBackend': 'capture_backend',
+    'SyntheticCaptureBackend': 'capture_backend',
+    'ScreenRecorder': 'screen_recorder',
+    'AudioPipe': 'muxed_recording',
+    'MuxedRecording': 'muxed_recording',
+    'RecorderUI': 'videoRecorder',
+}
+
+# 只有 Windows 上才有的模块：在其他平台缺少它们时界面不可用，RecorderUI 为 None
+_WINDOWS_MODULES = {'comtypes', 'pycaw', 'pywintypes', 'win32api', 'win32con', 'win32event', 'win32file',
+                    'win32gui', 'win32pipe', 'win32process', 'tkinter', '_tkinter'}
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    except ImportError as e:
+        # 其他缺失的依赖照常报错，也不缓存，安装后可以直接重试
+        missing = (e.name or '').split('.')[0]
+        if name != 'RecorderUI' or sys.platform == 'win32' or missing not in _WINDOWS_MODULES:
+            raise
+        # 非 Windows 环境（如 Linux 构建机）只提供采集部分，没有界面
+        return None
+    # 缓存到模块字典，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 def main():
-    """Entry point for the application"""
+    """Entry point for the application: 带参数时为命令行录制（见 cli.py），否则启动界面"""
+    if len(sys.argv) > 1:
+        from .cli import main as cli_main
+        sys.exit(cli_main())
+    from .videoRecorder import RecorderUI
     ui = RecorderUI()
     ui.run()
 
-__all__ = ['RecorderUI', 'ScreenRecorder', 'AudioRecorderManager', 'main'] 
\ No newline at end of file
+__all__ = ['RecorderUI', 'ScreenRecorder', 'AudioRecorderManager', 'AudioPipe', 'MuxedRecording',
+           'CaptureBackend', 'SyntheticCaptureBackend', 'main']
\ No newline at end of file
@@ -1,420 +1,582 @@
 # 新建文件 audio_recorder.py，用于封装音频录制功能
-import comtypes
-import ctypes
 import threading
-import wave
 import time
-import numpy as np
+from collections import deque
 from datetime import datetime
-from comtypes import CLSCTX_ALL, CoCreateInstance, GUID, COMMETHOD, HRESULT, IUnknown
-from ctypes import POINTER, byref, sizeof, c_float, c_ulong, cast, c_uint
-from ctypes.wintypes import (DWORD, LPCWSTR, LPWSTR, WORD, UINT, INT, BOOL,
-                            BYTE, VARIANT_BOOL, HANDLE, LPVOID)
-from ctypes import c_uint32 as UINT32
-from ctypes import c_uint64 as UINT64
-from pycaw.pycaw import AudioUtilities, IAudioClient
-
-# 定义常量
-AUDCLNT_SHAREMODE_SHARED = 0
-AUDCLNT_STREAMFLAGS_LOOPBACK = 0x00020000
-REFERENCE_TIME = ctypes.c_longlong
-
-# 定义音频格式 GUID
-KSDATAFORMAT_SUBTYPE_IEEE_FLOAT = GUID('{00000003-0000-0010-8000-00aa00389b71}')
-KSDATAFORMAT_SUBTYPE_PCM = GUID('{00000001-0000-0010-8000-00aa00389b71}')
-
-# 定义 GUID
-CLSID_MMDeviceEnumerator = GUID('{BCDE0395-E52F-467C-8E3D-C4579291692E}')
-IID_IMMDeviceEnumerator = GUID('{A95664D2-9614-4F35-A746-DE8DB63617E6}')
-IID_IAudioCaptureClient = GUID('{C8ADBD64-E71E-48A0-A4DE-185C395CD317}')
-
-# 定义结构体
-class PROPERTYKEY(ctypes.Structure):
-    _fields_ = [
-        ('fmtid', GUID),
-        ('pid', DWORD),
-    ]
-
-class PROPVARIANT(ctypes.Structure):
-    _fields_ = [
-        ('vt', WORD),
-        ('wReserved1', WORD),
-        ('wReserved2', WORD),
-        ('wReserved3', WORD),
-        ('data', DWORD * 4),
-    ]
-
-class WAVEFORMATEX(ctypes.Structure):
-    _pack_ = 1
-    _fields_ = [
-        ('wFormatTag', ctypes.c_ushort),
-        ('nChannels', ctypes.c_ushort),
-        ('nSamplesPerSec', ctypes.c_uint),
-        ('nAvgBytesPerSec', ctypes.c_uint),
-        ('nBlockAlign', ctypes.c_ushort),
-        ('wBitsPerSample', ctypes.c_ushort),
-        ('cbSize', ctypes.c_ushort),
-    ]
-
-class WAVEFORMATEXTENSIBLE(ctypes.Structure):
-    _pack_ = 1
-    class SamplesUnion(ctypes.Union):
-        _fields_ = [
-            ('wValidBitsPerSample', ctypes.c_ushort),
-            ('wSamplesPerBlock', ctypes.c_ushort),
-            ('wReserved', ctypes.c_ushort),
-        ]
-    _fields_ = [
-        ('Format', WAVEFORMATEX),
-        ('Samples', SamplesUnion),
-        ('dwChannelMask', ctypes.c_uint),
-        ('SubFormat', comtypes.GUID),
-    ]
-
-# 定义接口
-class IAudioCaptureClient(IUnknown):
-    _iid_ = IID_IAudioCaptureClient
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'GetBuffer',
-                  (['out'], POINTER(LPVOID), 'ppData'),
-                  (['out'], POINTER(UINT32), 'pNumFramesToRead'),
-                  (['out'], POINTER(DWORD), 'pdwFlags'),
-                  (['out'], POINTER(UINT64), 'pu64DevicePosition'),
-                  (['out'], POINTER(UINT64), 'pu64QPCPosition')),
-        COMMETHOD([], HRESULT, 'ReleaseBuffer',
-                  (['in'], UINT32, 'NumFramesRead')),
-        COMMETHOD([], HRESULT, 'GetNextPacketSize',
-                  (['out'], POINTER(UINT32), 'pNumFramesInNextPacket')),
-    ]
-
-class IPropertyStore(IUnknown):
-    _iid_ = GUID('{886D8EEB-8CF2-4446-8D02-CDBA1DBDCF99}')
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'GetCount',
-                  (['out'], POINTER(DWORD), 'cProps')),
-        COMMETHOD([], HRESULT, 'GetAt',
-                  (['in'], DWORD, 'iProp'),
-                  (['out'], POINTER(PROPERTYKEY), 'pkey')),
-        COMMETHOD([], HRESULT, 'GetValue',
-                  (['in'], POINTER(PROPERTYKEY), 'key'),
-                  (['out'], POINTER(PROPVARIANT), 'pv')),
-        COMMETHOD([], HRESULT, 'SetValue',
-                  (['in'], POINTER(PROPERTYKEY), 'key'),
-                  (['in'], POINTER(PROPVARIANT), 'propvar')),
-        COMMETHOD([], HRESULT, 'Commit')
-    ]
-
-class IMMDevice(IUnknown):
-    _iid_ = GUID('{D666063F-1587-4E43-81F1-B948E807363F}')
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'Activate',
-                  (['in'], POINTER(comtypes.GUID), 'iid'),
-                  (['in'], DWORD, 'dwClsCtx'),
-                  (['in'], POINTER(DWORD), 'pActivationParams'),
-                  (['out','retval'], POINTER(POINTER(IUnknown)), 'ppInterface')),
-        COMMETHOD([], HRESULT, 'OpenPropertyStore',
-                  (['in'], DWORD, 'stgmAccess'),
-                  (['out','retval'], POINTER(POINTER(IPropertyStore)), 'ppProperties')),
-        COMMETHOD([], HRESULT, 'GetId',
-                  (['out','retval'], POINTER(LPCWSTR), 'ppstrId')),
-        COMMETHOD([], HRESULT, 'GetState',
-                  (['out','retval'], POINTER(DWORD), 'pdwState')),
-    ]
-
-class IMMDeviceCollection(IUnknown):
-    _iid_ = GUID('{0BD7A1BE-7A1A-44DB-8397-CC5392387B5E}')
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'GetCount',
-                  (['out', 'retval'], POINTER(c_uint), 'pcDevices')),
-        COMMETHOD([], HRESULT, 'Item',
-                  (['in'], c_uint, 'nDevice'),
-                  (['out', 'retval'], POINTER(POINTER(IMMDevice)), 'ppDevice')),
-    ]
-
-class IMMNotificationClient(IUnknown):
-    _iid_ = GUID('{7991EEC9-7E89-4D85-8390-6C703CEC60C0}')
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'OnDeviceStateChanged',
-                  (['in'], LPCWSTR, 'pwstrDeviceId'),
-                  (['in'], DWORD, 'dwNewState')),
-        COMMETHOD([], HRESULT, 'OnDeviceAdded',
-                  (['in'], LPCWSTR, 'pwstrDeviceId')),
-        COMMETHOD([], HRESULT, 'OnDeviceRemoved',
-                  (['in'], LPCWSTR, 'pwstrDeviceId')),
-        COMMETHOD([], HRESULT, 'OnDefaultDeviceChanged',
-                  (['in'], DWORD, 'flow'),
-                  (['in'], DWORD, 'role'),
-                  (['in'], LPCWSTR, 'pwstrDefaultDeviceId')),
-        COMMETHOD([], HRESULT, 'OnPropertyValueChanged',
-                  (['in'], LPCWSTR, 'pwstrDeviceId'),
-                  (['in'], PROPERTYKEY, 'key'))
-    ]
-
-class IMMDeviceEnumerator(IUnknown):
-    _iid_ = IID_IMMDeviceEnumerator
-    _methods_ = [
-        COMMETHOD([], HRESULT, 'EnumAudioEndpoints',
-                  (['in'], DWORD, 'dataFlow'),
-                  (['in'], DWORD, 'dwStateMask'),
-                  (['out','retval'], POINTER(POINTER(IMMDeviceCollection)), 'ppDevices')),
-        COMMETHOD([], HRESULT, 'GetDefaultAudioEndpoint',
-                  (['in'], DWORD, 'dataFlow'),
-                  (['in'], DWORD, 'role'),
-                  (['out','retval'], POINTER(POINTER(IMMDevice)), 'ppEndpoint')),
-        COMMETHOD([], HRESULT, 'GetDevice',
-                  (['in'], LPCWSTR, 'pwstrId'),
-                  (['out','retval'], POINTER(POINTER(IMMDevice)), 'ppDevice')),
-        COMMETHOD([], HRESULT, 'RegisterEndpointNotificationCallback',
-                  (['in'], POINTER(IMMNotificationClient))),
-        COMMETHOD([], HRESULT, 'UnregisterEndpointNotificationCallback',
-                  (['in'], POINTER(IMMNotificationClient))),
-    ]
+import numpy as np
+from .capture_backend import (CaptureBackend, DeviceInvalidatedError, qpc_now,
+                              AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY, AUDCLNT_BUFFERFLAGS_SILENT,
+                              AUDCLNT_BUFFERFLAGS_TIMESTAMP_ERROR)
+from .sample_format import PacketConverter, SAMPLE_WIDTHS, default_target
+from .mixer import StreamMixer, TeeSink, channel_matrix
+from .resampler import PolyphaseResampler, ResamplingSink
+from .ring_buffer import RingBuffer, RingBufferWriter
+from .wav_writer import StreamingWavWriter
+from .device_catalog import CAPTURE, RENDER, DeviceCatalog
+from .timeline import QPC_FREQUENCY, SampleTimeline, TimestampLog, timestamps_filename
+
+try:
+    import comtypes
+    from .wasapi import WasapiCaptureBackend, WasapiDeviceSource
+except ImportError:
+    # 非 Windows 环境（如 Linux 构建机）只能使用模拟后端
+    comtypes = None
+    WasapiCaptureBackend = None
+
+def open_wave_sink(filename, channels, sample_width, sample_rate, **options):
+    """打开 WAV 文件作为写线程的输出，options 传给 StreamingWavWriter"""
+    return StreamingWavWriter(filename, channels, sample_width, sample_rate, **options)
+
+# 每个设备保留的最近故障事件数
+GLITCH_EVENT_HISTORY = 100
+
+def _write_silence(ring, zero_block, nbytes, frame_bytes=1):
+    """用共享的全零块写入 nbytes 字节静音，不分配内存
+
+    环形缓冲区空间不足时只写入放得下的整帧，返回实际写入的字节数。
+    """
+    written = 0
+    while written < nbytes:
+        free = ring.capacity - ring.fill()
+        size = min(nbytes - written, len(zero_block), free - free % frame_bytes)
+        if size <= 0 or not ring.write(zero_block[:size]):
+            break
+        written += size
+    return written
+
+def _drop_unwritten(timeline, timestamp_log, frame):
+    """环形缓冲区已满，frame 之后的帧没有写入：退回时间线并记录 dropped，之后按静音补齐"""
+    frames = timeline.rollback(frame)
+    if frames:
+        timestamp_log.record('dropped', frame, frames)
+    return frames
+
+def _fill_silence(timeline, ring, zero_block, frame_bytes, timestamp_log, frame):
+    """按时间线补静音到 frame，返回实际写入的帧数"""
+    position = timeline.written
+    frames = timeline.fill_until(frame)
+    if not frames:
+        return 0
+    timestamp_log.record('fill', position, frames, gap_frames=frames)
+    written = _write_silence(ring, zero_block, frames * frame_bytes, frame_bytes) // frame_bytes
+    if written < frames:
+        _drop_unwritten(timeline, timestamp_log, position + written)
+    return written
+
+class _ConvertingBackend(CaptureBackend):
+    """把重新连接的设备转换成原音轨的声道数和采样率（float32），供采集循环照常使用
+
+    环形缓冲区、时间线和写线程都按原设备的格式建立，新设备的数据包在这里解码为 float32、
+    按 channel_matrix 映射声道、用多相重采样器转换采样率，设备位置和 QPC 换算到原采样率。
+    设备位置不连续时用静音补齐（超过 1 秒或回退时从新位置重新开始）。
+    SILENT 包也按静音送入重采样器，保持滤波器状态和位置连续，不再带 SILENT 标志。
+    """
+    def __init__(self, backend, channels, sample_rate):
+        super().__init__()
+        self.backend = backend
+        source = backend.format
+        self.format = {
+            'channels': channels,
+            'sample_rate': sample_rate,
+            'bits_per_sample': 32,
+            'valid_bits_per_sample': 32,
+            'is_float': True,
+            'sample_format': 'float32'
+        }
+        self._in_rate = source['sample_rate']
+        self._decoder = PacketConverter(source, target='float32')
+        self._matrix = channel_matrix(source['channels'], channels)
+        self._resampler = PolyphaseResampler(self._in_rate, sample_rate, channels)
+        self._out = np.empty(0, dtype=np.float32)
+        self._inner_frames = 0
+        self._input_start = None
+        self._fed = 0
+        self._out_base = 0
+
+    def wait(self, timeout):
+        return self.backend.wait(timeout)
+
+    def get_next_packet_size(self):
+        return self.backend.get_next_packet_size()
+
+    def _feed(self, floats):
+        frames = self._resampler.process(floats.reshape(-1, self._matrix.shape[0]) @ self._matrix)
+        self._fed += len(floats) // self._matrix.shape[0]
+        return frames
+
+    def get_buffer(self):
+        buffer, num_frames, flags, device_position, qpc_position = self.backend.get_buffer()
+        self._inner_frames = num_frames
+        if not num_frames:
+            return buffer, num_frames, flags, device_position, qpc_position
+        out_rate = self.format['sample_rate']
+        in_channels = self._matrix.shape[0]
+        gap = device_position - (self._input_start + self._fed) if self._input_start is not None else -1
+        if gap < 0 or gap > self._in_rate:
+            # 第一个包、位置回退或中断太久：从这个包的位置重新开始
+            self._resampler.reset()
+            self._input_start = device_position
+            self._fed = 0
+            self._out_base = device_position * out_rate // self._in_rate
+            gap = 0
+        start = self._resampler.frames_out
+        pieces = []
+        if gap:
+            pieces.append(np.array(self._feed(np.zeros(gap * in_channels, dtype=np.float32))))
+        if flags & AUDCLNT_BUFFERFLAGS_SILENT or not buffer:
+            floats = np.zeros(num_frames * in_channels, dtype=np.float32)
+        else:
+            data, _ = self._decoder.convert(buffer, num_frames)
+            floats = np.frombuffer(data, dtype=np.float32, count=num_frames * in_channels)
+        pieces.append(self._feed(floats))
+        self._out = np.ascontiguousarray(np.concatenate(pieces) if len(pieces) > 1 else pieces[0])
+        frames = len(self._out)
+        # 重采样有延迟：输出的第一帧对应的输入时刻早于这个数据包
+        qpc_position += int(round((start / out_rate - (device_position - self._input_start) / self._in_rate)
+                                  * QPC_FREQUENCY))
+        flags &= ~AUDCLNT_BUFFERFLAGS_SILENT
+        if not frames:
+            return None, 0, flags, self._out_base + start, qpc_position
+        return self._out.ctypes.data, frames, flags, self._out_base + start, qpc_position
+
+    def release_buffer(self, num_frames):
+        # 归还新设备的整个数据包，与转换后的帧数无关
+        self.backend.release_buffer(self._inner_frames)
+
+    def start(self):
+        self.backend.start()
+
+    def stop(self):
+        self.backend.stop()
+
+    def close(self):
+        self.backend.close()
 
 class AudioRecorderManager:
     """音频录制管理器，负责管理多个设备的录制"""
-    def __init__(self):
+    def __init__(self, backend_factory=None, event_driven=True, event_timeout=0.1,
+                 sink_factory=None, ring_seconds=2.0, high_water_mark=0.75,
+                 write_chunk_seconds=0.25, target_format=None, mix_channels=2,
+                 sample_rate=None, resample_quality='medium', segment_seconds=None,
+                 header_commit_interval=2.0, idle_fill_delay=0.2, device_source=None,
+                 follow_default=True, reattach_interval=0.5):
+        """backend_factory(device, is_input) 返回 CaptureBackend，默认使用 WASAPI 后端
+
+        event_driven=True 时采集线程等待设备事件，每次唤醒取完所有数据包；
+        False 时退回到 1ms 轮询。
+        每个设备有一个 ring_seconds 长的环形缓冲区，写线程每积累 write_chunk_seconds
+        的数据写一次 sink_factory(filename, channels, sample_width, sample_rate)
+        返回的对象（默认为 WAV 文件）。缓冲区超过 high_water_mark 时计入统计。
+        target_format 为写入的样本格式（int16/int24/int32，默认浮点设备转 int16、
+        整数设备保留有效位数）；float32 只能用于自定义 sink。
+        mix_channels 为混音输出的声道数。
+        sample_rate 不为空时所有设备在写线程中重采样到该采样率；混音时默认统一到第一个设备的采样率。
+        resample_quality 为 fast/medium/high/best，见 resampler.RESAMPLE_QUALITIES。
+        默认的 WAV 输出超过 4GB 时自动切换为 RF64，每 header_commit_interval 秒更新一次文件头；
+        segment_seconds 不为空时按时长切分为编号的分段文件（见 get_segments）。
+        音轨按设备位置/QPC 放在以 start_recording 时刻为零点的时间线上，空档精确补静音，
+        每个文件旁边写一个 .timestamps.csv 逐包时间戳文件；设备超过 idle_fill_delay 秒
+        没有数据包时（回环设备静音）按 QPC 时钟补静音。
+        device_source 为设备目录的 DeviceSource（默认为 WASAPI），设备列表缓存并由设备通知更新。
+        设备在录制中失效（拔出、被禁用）时不结束音轨：每 reattach_interval 秒尝试重新打开，
+        期间按 QPC 时钟补静音；follow_default=True 时录制开始时的默认设备跟随新的默认设备。
+        """
+        if target_format == 'float32' and sink_factory is None:
+            raise ValueError("WAV 输出只支持整数 PCM 格式")
         self.is_recording = False
         self.audio_clients = []
         self.recording_threads = []
         self.start_time = None
-        
-        # 初始化 COM
-        comtypes.CoInitialize()
+        self.start_qpc = None
+        self.stop_qpc = None
+        self.idle_fill_delay = idle_fill_delay
+        self.timestamp_files = []
+        self.backend_factory = backend_factory or WasapiCaptureBackend
+        self.event_driven = event_driven
+        self.event_timeout = event_timeout
+        self.segment_seconds = segment_seconds
+        self.header_commit_interval = header_commit_interval
+        self.sink_factory = sink_factory or self._open_wave_file
+        self.ring_seconds = ring_seconds
+        self.high_water_mark = high_water_mark
+        self.write_chunk_seconds = write_chunk_seconds
+        self.target_format = target_format
+        self.device_stats = {}
+        self._writers = {}
+        self._file_sinks = {}
+        self.mix_channels = mix_channels
+        self.sample_rate = sample_rate
+        self.resample_quality = resample_quality
+        self.mixer = None
+        self.mixed_filename = None
+        self.stem_files = []
+        self.device_source = device_source
+        self.follow_default = follow_default
+        self.reattach_interval = reattach_interval
+        self._device_catalog = None
+        # COM 在第一次枚举或录制时才初始化，创建管理器不接触音频设备
+        self._com_initialized = False
+
+    def _ensure_com(self):
+        """在第一次使用 WASAPI 的线程上初始化 COM"""
+        if comtypes is not None and not self._com_initialized:
+            comtypes.CoInitialize()
+            self._com_initialized = True
+
+    @property
+    def device_catalog(self):
+        """设备目录（见 device_catalog.py），第一次访问时创建；没有可用的设备来源时为 None"""
+        if self._device_catalog is None:
+            source = self.device_source
+            if source is None:
+                if comtypes is None:
+                    return None
+                self._ensure_com()
+                source = WasapiDeviceSource()
+            self._device_catalog = DeviceCatalog(source)
+        return self._device_catalog
 
-    def get_available_devices(self):
-        """获取所有可用的音频设备"""
-        output_devices = []
-        input_devices = []
+    def get_available_devices(self, refresh=False):
+        """获取所有可用的音频设备；设备列表由目录缓存，refresh=True 时重新读取全部设备"""
+        catalog = self.device_catalog
+        if catalog is None:
+            print("[Audio] 当前平台不支持 WASAPI，无法枚举音频设备")
+            return [], []
         
         try:
-            # 创建设备枚举器
-            enumerator = CoCreateInstance(
-                CLSID_MMDeviceEnumerator,
-                IMMDeviceEnumerator,
-                CLSCTX_ALL
-            )
-            
-            # 获取默认输出设备
-            try:
-                default_output = enumerator.GetDefaultAudioEndpoint(0, 1)  # eRender = 0, eConsole = 1
-                default_output_id = ctypes.wstring_at(default_output.GetId())
-                print(f"[Audio] Default output device ID: {default_output_id}")
-            except Exception as e:
-                print(f"[Audio] Error getting default output device: {e}")
-                default_output_id = None
-            
-            # 获取输出设备
-            collection = enumerator.EnumAudioEndpoints(0, 1)  # eRender = 0
-            count = collection.GetCount()
-            
-            audio_devices = AudioUtilities.GetAllDevices()
-            device_names = {dev.id: dev.FriendlyName for dev in audio_devices}
-            
-            for i in range(count):
-                try:
-                    device = collection.Item(i)
-                    device_id_ptr = device.GetId()
-                    if device_id_ptr:
-                        device_id = ctypes.wstring_at(device_id_ptr)
-                        friendly_name = device_names.get(device_id, f"输出设备 {i}")
-                        output_devices.append({
-                            'name': friendly_name,
-                            'device': device,
-                            'id': device_id,
-                            'is_default': device_id == default_output_id
-                        })
-                except Exception as e:
-                    print(f"处理输出设备 {i} 时出错: {str(e)}")
-            
-            # 获取输入设备
-            collection = enumerator.EnumAudioEndpoints(1, 1)  # eCapture = 1
-            count = collection.GetCount()
-            
-            for i in range(count):
-                try:
-                    device = collection.Item(i)
-                    device_id_ptr = device.GetId()
-                    if device_id_ptr:
-                        device_id = ctypes.wstring_at(device_id_ptr)
-                        friendly_name = device_names.get(device_id, f"输入设备 {i}")
-                        input_devices.append({
-                            'name': friendly_name,
-                            'device': device,
-                            'id': device_id
-                        })
-                except Exception as e:
-                    print(f"处理输入设备 {i} 时出错: {str(e)}")
-                    
+            if refresh:
+                catalog.invalidate()
+            output_devices, input_devices = catalog.devices()
+            default_output = next((d for d in output_devices if d['is_default']), None)
+            if default_output:
+                print(f"[Audio] Default output device ID: {default_output['id']}")
+            return output_devices, input_devices
         except Exception as e:
             print(f"获取设备列表时出错: {str(e)}")
-            
-        return output_devices, input_devices
+            return [], []
 
     def _initialize_audio_client(self, device, is_input=False):
-        """初始化音频客户端"""
-        # 激活设备的 IAudioClient 接口
-        audio_interface = device.Activate(
-            IAudioClient._iid_, CLSCTX_ALL, None)
-        audio_client = audio_interface.QueryInterface(IAudioClient)
-        
-        # 获取设备的原生格式
-        wave_format_ptr = audio_client.GetMixFormat()
-        wave_format = ctypes.cast(wave_format_ptr, POINTER(WAVEFORMATEX)).contents
-        
-        # 检查是否为扩展格式
-        if wave_format.wFormatTag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE
-            wave_format_ext = ctypes.cast(wave_format_ptr, POINTER(WAVEFORMATEXTENSIBLE)).contents
-            sub_format = wave_format_ext.SubFormat
-            is_float = (sub_format == KSDATAFORMAT_SUBTYPE_IEEE_FLOAT)
-        else:
-            is_float = (wave_format.wFormatTag == 3)  # WAVE_FORMAT_IEEE_FLOAT
-        
-        # 初始化音频客户端
-        buffer_duration = REFERENCE_TIME(int(10000000))  # 1秒
-        flags = 0 if is_input else AUDCLNT_STREAMFLAGS_LOOPBACK
-        hr = audio_client.Initialize(
-            AUDCLNT_SHAREMODE_SHARED,
-            flags,
-            buffer_duration,
-            0,
-            wave_format_ptr,
-            None
-        )
-        
-        if hr != 0:
-            raise Exception(f"初始化音频客户端失败，错误代码：{hr}")
-        
-        # 获取捕获客户端
-        capture_client = audio_client.GetService(IID_IAudioCaptureClient)
-        capture_client = capture_client.QueryInterface(IAudioCaptureClient)
-        
+        """创建并打开采集后端"""
+        if self.backend_factory is None:
+            raise Exception("当前平台没有可用的音频采集后端")
+        backend = self.backend_factory(device, is_input=is_input)
+        format_info = backend.open(event_driven=self.event_driven)
         return {
-            'client': audio_client,
-            'capture': capture_client,
-            'format': {
-                'channels': wave_format.nChannels,
-                'sample_rate': wave_format.nSamplesPerSec,
-                'bits_per_sample': wave_format.wBitsPerSample,
-                'is_float': is_float
-            }
+            'backend': backend,
+            'format': format_info
         }
 
     def _record_device_audio(self, client_info, start_time):
         """录制单个设备的音频"""
+        if comtypes is not None:
+            # 重新连接时本线程调用 Activate 和设备目录，需要初始化 COM
+            comtypes.CoInitialize()
+        backend = client_info['backend']
+        filename = client_info['filename']
         try:
-            audio_client = client_info['client']
-            capture_client = client_info['capture']
             format_info = client_info['format']
-            filename = client_info['filename']
             
             print(f"\n[Audio] Device recording start - {filename}")
             print(f"[Audio] Format: {format_info}")
             print(f"[Audio] Start timestamp: {time.time()}")
             
-            # 开始录制
-            audio_client.Start()
-            
             buffer_stats = {
                 'total_frames': 0,
                 'total_packets': 0,
                 'empty_packets': 0,
-                'last_packet_time': time.time()
+                'wakeups': 0,
+                'wakeups_per_sec': 0.0,
+                'capture_mode': 'event' if self.event_driven else 'poll',
+                'silent_packets': 0,
+                'discontinuities': 0,
+                'timestamp_errors': 0,
+                'glitch_events': deque(maxlen=GLITCH_EVENT_HISTORY),
+                'start_time': time.time(),
+                'last_packet_time': time.time(),
+                'device_name': client_info['name'],
+                'reattaches': 0,
+                'lost_seconds': 0.0
             }
+            self.device_stats[filename] = buffer_stats
             
-            with wave.open(filename, 'wb') as wave_file:
-                wave_file.setnchannels(format_info['channels'])
-                wave_file.setsampwidth(2 if format_info['is_float'] else format_info['bits_per_sample'] // 8)
-                wave_file.setframerate(format_info['sample_rate'])
-                
-                # 计算每10ms的帧数
-                frames_per_10ms = int(format_info['sample_rate'] * 0.01)
-                
-                # 准备空白帧（10ms的数据）
-                silence_data = np.zeros(frames_per_10ms * format_info['channels'], 
-                                      dtype=np.int16).tobytes()
-                
-                # 跟踪设备活动状态
-                last_write_time = time.time()
-                device_active = False
-                active_duration = 0
-                last_active_check = time.time()
+            converter = PacketConverter(format_info, target=client_info['target_format'])
+            sample_rate = format_info['sample_rate']
+            frame_bytes = format_info['channels'] * converter.sample_width
+            chunk_bytes = max(1, int(self.write_chunk_seconds * sample_rate)) * frame_bytes
+            
+            # 采集线程只写环形缓冲区，磁盘写入由独立的写线程合并成大块完成
+            ring = RingBuffer(max(1, int(self.ring_seconds * sample_rate)) * frame_bytes,
+                              high_water_mark=self.high_water_mark, wake_bytes=chunk_bytes,
+                              name=filename)
+            sink = self._open_device_sink(client_info, converter.sample_width)
+            timestamp_log = TimestampLog(timestamps_filename(filename), sample_rate,
+                                         self.start_qpc, self.start_time)
+            self.timestamp_files.append(timestamp_log.filename)
+            writer = RingBufferWriter(ring, sink, frame_bytes, chunk_bytes=chunk_bytes,
+                                      flush_hooks=[timestamp_log.flush])
+            self._writers[filename] = (ring, writer)
+            writer.start()
+            # SILENT 包和补静音共用的 100ms 全零块
+            zero_block = memoryview(bytes(max(1, sample_rate // 10) * frame_bytes))
+            glitch_events = buffer_stats['glitch_events']
+            
+            # 音轨时间线以所有设备共同的 start_qpc 为零点
+            timeline = SampleTimeline(sample_rate, self.start_qpc)
+            idle_fill_frames = int(self.idle_fill_delay * sample_rate)
+            buffer_stats['timeline'] = timeline.stats
+            
+            try:
+                # 开始录制；设备此时已经失效同样进入重新连接
+                try:
+                    backend.start()
+                except DeviceInvalidatedError as e:
+                    client_info['reattach'] = str(e)
                 
                 while self.is_recording:
-                    current_time = time.time()
-                    packet_length = capture_client.GetNextPacketSize()
-                    buffer_stats['total_packets'] += 1
+                    try:
+                        if client_info.get('reattach'):
+                            # 设备通知：设备被移除或默认设备已切换
+                            raise DeviceInvalidatedError(client_info.pop('reattach'))
+                        if self.event_driven:
+                            # 等待设备事件，超时后同样检查一次（回环设备静音时不会触发事件）
+                            backend.wait(self.event_timeout)
+                        buffer_stats['wakeups'] += 1
+                        current_time = time.time()
                     
-                    if packet_length > 0:
-                        buffer, num_frames, flags, _, _ = capture_client.GetBuffer()
-                        buffer_stats['total_frames'] += num_frames
+                        # 每次唤醒取完所有可用的数据包
+                        packets_read = 0
+                        while backend.get_next_packet_size() > 0:
+                            buffer, num_frames, flags, device_position, qpc_position = backend.get_buffer()
+                            packets_read += 1
+                            buffer_stats['total_packets'] += 1
+                            buffer_stats['total_frames'] += num_frames
                         
-                        if buffer:
-                            if buffer_stats['total_packets'] % 100 == 0:  # 每100个包打印一次统计
-                                # print(f"[Audio] Buffer stats: {buffer_stats}")
-                                # print(f"[Audio] Current delay: {current_time - buffer_stats['last_packet_time']:.3f}s")
-                                buffer_stats['last_packet_time'] = current_time
-                        else:
-                            buffer_stats['empty_packets'] += 1
+                            if flags & AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY and buffer_stats['total_packets'] > 1:
+                                # 启动后的第一个包通常带有该标志，不算作故障
+                                buffer_stats['discontinuities'] += 1
+                                glitch_events.append((round(current_time - buffer_stats['start_time'], 3),
+                                                      'discontinuity', device_position))
+                            if flags & AUDCLNT_BUFFERFLAGS_TIMESTAMP_ERROR:
+                                buffer_stats['timestamp_errors'] += 1
+                                glitch_events.append((round(current_time - buffer_stats['start_time'], 3),
+                                                      'timestamp_error', device_position))
                         
-                        if buffer_stats['total_packets'] % 100 == 0:  # 每100个包打印一次统计
-                            # print(f"[Audio] Buffer stats: {buffer_stats}")
-                            # print(f"[Audio] Current delay: {current_time - buffer_stats['last_packet_time']:.3f}s")
-                            buffer_stats['last_packet_time'] = current_time
+                            silent = flags & AUDCLNT_BUFFERFLAGS_SILENT
+                            if not buffer and not silent:
+                                buffer_stats['empty_packets'] += 1
+                                backend.release_buffer(num_frames)
+                                continue
                         
-                        buffer_size = num_frames * format_info['channels'] * (format_info['bits_per_sample'] // 8)
-                        audio_data = ctypes.string_at(buffer, buffer_size)
+                            # 按设备位置定位数据包，空档用静音精确补齐，重叠部分丢弃
+                            end = timeline.written
+                            position, gap, skip = timeline.place(
+                                device_position, qpc_position, num_frames,
+                                qpc_valid=not flags & AUDCLNT_BUFFERFLAGS_TIMESTAMP_ERROR)
+                            timestamp_log.record('packet', position, num_frames, device_position,
+                                                 qpc_position, flags, gap, skip)
+                            if gap:
+                                end += _write_silence(ring, zero_block, gap * frame_bytes, frame_bytes) // frame_bytes
                         
-                        if format_info['is_float']:
-                            float_data = np.frombuffer(audio_data, dtype=np.float32)
-                            if np.max(np.abs(float_data)) > 0.0001:
-                                device_active = True
-                                active_duration += current_time - last_active_check
-                            audio_data = (float_data * 32767).astype(np.int16).tobytes()
-                        else:
-                            int_data = np.frombuffer(audio_data, dtype=np.int16)
-                            if np.max(np.abs(int_data)) > 10:
-                                device_active = True
-                                active_duration += current_time - last_active_check
-                            
-                        wave_file.writeframes(audio_data)
-                        last_write_time = current_time
+                            # end 为实际写入的位置，空档没有写完时数据包不能写在错误的位置
+                            if skip < num_frames and end == position + skip:
+                                if silent:
+                                    # 静音包不读取设备缓冲区，直接写入全零块
+                                    buffer_stats['silent_packets'] += 1
+                                    end += _write_silence(ring, zero_block, (num_frames - skip) * frame_bytes,
+                                                          frame_bytes) // frame_bytes
+                                else:
+                                    # 直接读取设备缓冲区，转换到复用的输出缓冲区
+                                    audio_data, _ = converter.convert(buffer + skip * converter.frame_bytes,
+                                                                      num_frames - skip)
+                                    if ring.write(audio_data):
+                                        end = position + num_frames
+                            # 环形缓冲区已满时没写入的部分退回时间线，由下一个数据包或补静音补齐
+                            _drop_unwritten(timeline, timestamp_log, end)
                         
-                        capture_client.ReleaseBuffer(num_frames)
-                    else:
-                        # 只在设备未激活或激活时间不足100ms时插入空白帧
-                        if not device_active or active_duration < 0.1:
-                            elapsed = current_time - last_write_time
-                            if elapsed >= 0.01:
-                                frames_needed = int(elapsed * format_info['sample_rate'])
-                                if frames_needed > 0:
-                                    silence = np.zeros(frames_needed * format_info['channels'], 
-                                                     dtype=np.int16).tobytes()
-                                    wave_file.writeframes(silence)
-                                    last_write_time = current_time
-                        
-                        time.sleep(0.001)
+                            backend.release_buffer(num_frames)
                     
-                    last_active_check = current_time
+                        if packets_read:
+                            buffer_stats['last_packet_time'] = current_time
+                        else:
+                            # 回环设备静音时不产生数据包：按 QPC 时钟补静音到 idle_fill_delay 之前，
+                            # 保持音轨（以及混音器）持续推进；之后到达的重叠数据会被丢弃
+                            _fill_silence(timeline, ring, zero_block, frame_bytes, timestamp_log,
+                                          timeline.qpc_to_frame(qpc_now()) - idle_fill_frames)
+                        
+                            if not self.event_driven:
+                                time.sleep(0.001)
+                    except DeviceInvalidatedError as e:
+                        new_backend, new_converter = self._reattach_device(
+                            client_info, str(e), timeline, ring, zero_block, frame_bytes,
+                            timestamp_log, buffer_stats, idle_fill_frames)
+                        if new_backend is None:
+                            # 录制结束时设备仍未恢复，音轨补静音到结束位置；旧后端已经关闭
+                            backend = None
+                            break
+                        backend, converter = new_backend, new_converter
+                
+                # 所有音轨补齐到同一个结束位置；写线程仍在运行，环形缓冲区满时等它腾出空间
+                stop_frame = timeline.qpc_to_frame(self.stop_qpc or qpc_now())
+                _fill_silence(timeline, ring, zero_block, frame_bytes, timestamp_log, stop_frame)
+                deadline = time.monotonic() + 1.0
+                while timeline.written < stop_frame and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                    _fill_silence(timeline, ring, zero_block, frame_bytes, timestamp_log, stop_frame)
+            finally:
+                writer.stop()
+                sink.close()
+                timestamp_log.close()
                 
+            elapsed = time.time() - buffer_stats['start_time']
+            if elapsed > 0:
+                buffer_stats['wakeups_per_sec'] = buffer_stats['wakeups'] / elapsed
+            
             print(f"\n[Audio] Final buffer stats for {filename}:")
             print(f"Total frames: {buffer_stats['total_frames']}")
             print(f"Total packets: {buffer_stats['total_packets']}")
             print(f"Empty packets: {buffer_stats['empty_packets']}")
+            print(f"Silent packets: {buffer_stats['silent_packets']}, "
+                  f"discontinuities: {buffer_stats['discontinuities']}, "
+                  f"timestamp errors: {buffer_stats['timestamp_errors']}")
+            print(f"Wakeups/sec: {buffer_stats['wakeups_per_sec']:.1f} ({buffer_stats['capture_mode']})")
+            if buffer_stats['reattaches']:
+                print(f"Device lost {buffer_stats['reattaches']} times, "
+                      f"{buffer_stats['lost_seconds']:.2f}s filled with silence, "
+                      f"now {buffer_stats['device_name']}")
+            print(f"Timeline: {timeline.written} frames, gaps filled: {timeline.stats['gap_frames']}, "
+                  f"idle fill: {timeline.stats['fill_frames']}, "
+                  f"overlap dropped: {timeline.stats['skipped_frames']}, "
+                  f"ring full dropped: {timeline.stats['dropped_frames']}, resyncs: {timeline.stats['resyncs']}")
+            ring_stats = ring.get_stats()
+            print(f"Ring overflows: {ring_stats['overflows']}, "
+                  f"peak fill: {ring_stats['peak_fill_ratio']:.0%}, "
+                  f"high-water events: {ring_stats['high_water_events']}")
             
         except Exception as e:
             print(f"[Audio] Recording error: {str(e)}")
             import traceback
             traceback.print_exc()
         finally:
-            audio_client.Stop()
+            try:
+                if backend is not None:
+                    backend.stop()
+                    backend.close()
+            finally:
+                if comtypes is not None:
+                    comtypes.CoUninitialize()
             print(f"停止录制设备: {filename}")
 
-    def start_recording(self, selected_outputs=None, selected_input=None, path_manager=None):
-        """开始录制指定的设备"""
+    def _replacement_device(self, client_info):
+        """设备失效后要打开的设备：跟随默认设备时为当前的默认设备，否则为原设备（还不在目录中时为 None）"""
+        catalog = self._device_catalog
+        if catalog is None or client_info.get('device_id') is None:
+            # 没有设备目录（如模拟设备）：直接重新打开原设备
+            return {'name': client_info['name'], 'device': client_info['device'],
+                    'id': client_info.get('device_id')}
+        if client_info['follow_default']:
+            return catalog.default_device(client_info['flow'])
+        catalog.devices()
+        return catalog.get(client_info['device_id'])
+
+    def _reattach_device(self, client_info, reason, timeline, ring, zero_block, frame_bytes,
+                         timestamp_log, buffer_stats, idle_fill_frames):
+        """设备失效后重新打开设备，返回 (新的后端, 新的转换器)；录制在此期间结束时返回 (None, None)
+
+        等待期间按 QPC 时钟补静音，保持音轨与其他音轨和视频对齐；新设备的第一个数据包
+        按其 QPC 重新定位，与最后补的静音之间的空档同样精确补齐。
+        环形缓冲区和写线程按原设备的格式建立：新设备的声道数或采样率不同时
+        由 _ConvertingBackend 转换为原格式，只有样本格式不同时由新的 PacketConverter 处理。
+        """
+        filename = client_info['filename']
+        old_format = client_info['format']
+        lost_at = time.time()
+        buffer_stats['glitch_events'].append((round(lost_at - buffer_stats['start_time'], 3),
+                                              'device_lost', reason))
+        print(f"[Audio] {client_info['name']} 失效 ({reason})，正在重新连接: {filename}")
+        try:
+            client_info['backend'].stop()
+            client_info['backend'].close()
+        except Exception as e:
+            print(f"[Audio] 关闭失效设备出错: {e}")
+        
+        while self.is_recording:
+            # 补静音到当前时刻之前 idle_fill_delay，与空闲补静音相同
+            _fill_silence(timeline, ring, zero_block, frame_bytes, timestamp_log,
+                          timeline.qpc_to_frame(qpc_now()) - idle_fill_frames)
+            
+            try:
+                device = self._replacement_device(client_info)
+                if device is not None:
+                    new_client = self._initialize_audio_client(device['device'], client_info['is_input'])
+                    backend = new_client['backend']
+                    new_format = new_client['format']
+                    try:
+                        if (new_format['channels'], new_format['sample_rate']) != \
+                                (old_format['channels'], old_format['sample_rate']):
+                            print(f"[Audio] {device['name']} 的格式 {new_format['channels']}ch "
+                                  f"{new_format['sample_rate']}Hz 与原设备不同，转换为 "
+                                  f"{old_format['channels']}ch {old_format['sample_rate']}Hz")
+                            backend = _ConvertingBackend(backend, old_format['channels'],
+                                                         old_format['sample_rate'])
+                        backend.start()
+                    except Exception:
+                        backend.close()
+                        raise
+                    # client_info['format'] 保持原设备的声道数和采样率，之后再次重连时仍按它转换
+                    client_info.update(backend=backend, format=backend.format,
+                                       device=device['device'], device_id=device.get('id'))
+                    client_info.pop('reattach', None)
+                    timeline.reanchor()
+                    buffer_stats['reattaches'] += 1
+                    buffer_stats['lost_seconds'] += time.time() - lost_at
+                    buffer_stats['device_name'] = device['name']
+                    print(f"[Audio] 已重新连接 {device['name']}，"
+                          f"中断 {time.time() - lost_at:.2f}s: {filename}")
+                    return backend, PacketConverter(backend.format, target=client_info['target_format'])
+            except DeviceInvalidatedError:
+                pass
+            except Exception as e:
+                print(f"[Audio] 重新打开设备失败: {e}")
+            
+            deadline = time.monotonic() + self.reattach_interval
+            while self.is_recording and time.monotonic() < deadline:
+                time.sleep(0.02)
+        
+        buffer_stats['lost_seconds'] += time.time() - lost_at
+        return None, None
+
+    def _on_device_change(self, event, device_id, flow):
+        """设备目录的通知（在通知线程中调用）：标记需要重新连接的设备，由采集线程处理"""
+        for client_info in list(self.audio_clients):
+            if event in ('removed', 'state') and device_id == client_info.get('device_id') \
+                    and self._device_catalog.get(device_id) is None:
+                client_info['reattach'] = 'device removed'
+            elif (event == 'default' and client_info['follow_default'] and flow == client_info['flow']
+                  and device_id != client_info.get('device_id')):
+                client_info['reattach'] = 'default device changed'
+
+    def start_recording(self, selected_outputs=None, selected_input=None, path_manager=None,
+                        mix=False, mix_gains=None, write_stems=False, mix_sink=None,
+                        sample_rate=None, start_qpc=None):
+        """开始录制指定的设备
+
+        mix=True 时在录制过程中把所有设备混合成一个文件（path_manager.get_mixed_audio_filename），
+        mix_gains 为 {设备名: 增益}，write_stems=True 时同时保留每个设备的单独文件。
+        mix_sink 不为空时混音写入该对象（例如送往 ffmpeg 的 AudioPipe）而不是文件，隐含 mix=True。
+        sample_rate 覆盖构造时的输出采样率，start_qpc 指定音轨时间线的零点（默认为当前时刻）。
+        返回需要与视频合并的音频文件列表。
+        """
         try:
             print(f"\n[Audio] Manager start_recording called at: {time.time()}")
+            self._ensure_com()
             
             self.audio_clients = []
+            self.device_stats = {}
+            self._writers = {}
+            self._file_sinks = {}
+            self.mixer = None
+            self.mixed_filename = None
+            self.stem_files = []
             
             if selected_outputs:
                 for device in selected_outputs:
@@ -426,9 +588,12 @@ class AudioRecorderManager:
                                 device_name=device['name']
                             )
                             self.audio_clients.append({
+                                'name': device['name'],
                                 'device': device['device'],
-                                'client': client_info['client'],
-                                'capture': client_info['capture'],
+                                'device_id': device.get('id'),
+                                'flow': RENDER,
+                                'follow_default': self.follow_default and device.get('is_default', False),
+                                'backend': client_info['backend'],
                                 'format': client_info['format'],
                                 'filename': filename,
                                 'is_input': False
@@ -442,9 +607,12 @@ class AudioRecorderManager:
                     if client_info:
                         filename = path_manager.get_audio_filename(is_input=True)
                         self.audio_clients.append({
+                            'name': selected_input['name'],
                             'device': selected_input['device'],
-                            'client': client_info['client'],
-                            'capture': client_info['capture'],
+                            'device_id': selected_input.get('id'),
+                            'flow': CAPTURE,
+                            'follow_default': self.follow_default and selected_input.get('is_default', False),
+                            'backend': client_info['backend'],
                             'format': client_info['format'],
                             'filename': filename,
                             'is_input': True
@@ -455,10 +623,34 @@ class AudioRecorderManager:
             if not self.audio_clients:
                 raise Exception("没有可用的录制设备")
             
+            mix = mix or mix_sink is not None
+            output_rate = sample_rate or self.sample_rate
+            if mix and output_rate is None:
+                output_rate = self.audio_clients[0]['format']['sample_rate']
+            for client_info in self.audio_clients:
+                client_info['target_format'] = self.target_format or default_target(client_info['format'])
+                client_info['output_rate'] = output_rate or client_info['format']['sample_rate']
+                client_info['write_file'] = True
+            
+            if mix:
+                self._setup_mixer(path_manager, mix_gains or {}, write_stems, mix_sink)
+            
             self.is_recording = True
             self.start_time = time.time()
+            self.start_qpc = qpc_now()
+            if start_qpc is not None:
+                # 时间线零点早于当前时刻，墙上时间同样前移
+                self.start_time -= (self.start_qpc - start_qpc) / QPC_FREQUENCY
+                self.start_qpc = start_qpc
+            self.stop_qpc = None
+            self.timestamp_files = []
             print(f"[Audio] All devices initialized, starting threads at: {self.start_time}")
             
+            if self.mixer:
+                self.mixer.start()
+            if self._device_catalog is not None:
+                self._device_catalog.add_listener(self._on_device_change)
+            
             for client_info in self.audio_clients:
                 thread = threading.Thread(
                     target=self._record_device_audio,
@@ -467,20 +659,135 @@ class AudioRecorderManager:
                 self.recording_threads.append(thread)
                 thread.start()
             
-            return [client['filename'] for client in self.audio_clients]
+            files = [client['filename'] for client in self.audio_clients if 'mix_input' not in client]
+            if self.mixed_filename:
+                files.insert(0, self.mixed_filename)
+            return files
             
         except Exception as e:
             print(f"开始录制失败: {str(e)}")
             self.stop_recording()
             raise
 
+    def _open_wave_file(self, filename, channels, sample_width, sample_rate):
+        """默认的 sink_factory：流式 WAV 文件，记录下来用于统计和分段列表"""
+        sink = open_wave_sink(filename, channels, sample_width, sample_rate,
+                              commit_interval=self.header_commit_interval,
+                              segment_seconds=self.segment_seconds)
+        self._file_sinks[filename] = sink
+        return sink
+
+    def get_segments(self):
+        """返回 {文件名: [分段文件...]}，未分段时列表中只有文件本身"""
+        return {filename: list(sink.segments) for filename, sink in self._file_sinks.items()}
+
+    def _setup_mixer(self, path_manager, mix_gains, write_stems, mix_sink=None):
+        """创建混音器，采样率不同的设备先重采样到混音采样率"""
+        sample_rate = self.audio_clients[0]['output_rate']
+        
+        if mix_sink is not None:
+            sink = mix_sink
+        else:
+            self.mixed_filename = path_manager.get_mixed_audio_filename()
+            sink = self.sink_factory(self.mixed_filename, self.mix_channels, 2, sample_rate)
+        self.mixer = StreamMixer(sink, sample_rate, channels=self.mix_channels)
+        for client_info in self.audio_clients:
+            client_info['mix_input'] = self.mixer.add_input(
+                client_info['name'],
+                client_info['format']['channels'],
+                SAMPLE_WIDTHS[client_info['target_format']],
+                gain=mix_gains.get(client_info['name'], 1.0)
+            )
+            client_info['write_file'] = write_stems
+            if write_stems:
+                self.stem_files.append(client_info['filename'])
+        print(f"[Audio] Mixing {len(self.audio_clients)} devices into {self.mixed_filename or 'mix sink'}")
+
+    def _open_device_sink(self, client_info, sample_width):
+        """设备写线程的输出：WAV 文件、混音输入，或两者同时；采样率不同时先重采样"""
+        format_info = client_info['format']
+        output_rate = client_info['output_rate']
+        sinks = []
+        if client_info['write_file']:
+            sinks.append(self.sink_factory(client_info['filename'], format_info['channels'],
+                                           sample_width, output_rate))
+        if 'mix_input' in client_info:
+            sinks.append(client_info['mix_input'])
+        sink = sinks[0] if len(sinks) == 1 else TeeSink(*sinks)
+        if format_info['sample_rate'] != output_rate:
+            print(f"[Audio] Resampling {client_info['name']}: {format_info['sample_rate']} -> "
+                  f"{output_rate} Hz ({self.resample_quality})")
+            sink = ResamplingSink(sink, format_info['sample_rate'], output_rate,
+                                  format_info['channels'], client_info['target_format'],
+                                  self.resample_quality)
+        return sink
+
+    def get_stats(self):
+        """返回各设备的采集统计（按文件名索引），包括每秒唤醒次数和环形缓冲区状态"""
+        stats = {}
+        now = time.time()
+        for filename, buffer_stats in self.device_stats.items():
+            item = dict(buffer_stats)
+            item['glitch_events'] = list(buffer_stats['glitch_events'])
+            if self.is_recording:
+                elapsed = now - item['start_time']
+                if elapsed > 0:
+                    item['wakeups_per_sec'] = item['wakeups'] / elapsed
+            if filename in self._writers:
+                ring, writer = self._writers[filename]
+                item['ring'] = ring.get_stats()
+                item['writer'] = writer.get_stats()
+            if filename in self._file_sinks:
+                item['file'] = self._file_sinks[filename].get_stats()
+            stats[filename] = item
+        if self.mixer:
+            stats[self.mixed_filename or 'mix'] = self.mixer.get_stats()
+            if self.mixed_filename in self._file_sinks:
+                stats[self.mixed_filename]['file'] = self._file_sinks[self.mixed_filename].get_stats()
+        return stats
+
+    def get_glitch_report(self):
+        """各设备的采集质量报告（按文件名索引）
+
+        discontinuities 为 DATA_DISCONTINUITY（采集线程没有及时取走数据，设备丢了数据），
+        timestamp_errors 为 TIMESTAMP_ERROR，glitches_per_minute 可以直接用于告警，
+        events 为最近的故障 (录制开始后的秒数, 类型, 设备位置)。
+        """
+        report = {}
+        now = time.time()
+        for filename, buffer_stats in self.device_stats.items():
+            glitches = buffer_stats['discontinuities'] + buffer_stats['timestamp_errors']
+            minutes = (now - buffer_stats['start_time']) / 60
+            report[filename] = {
+                'total_packets': buffer_stats['total_packets'],
+                'silent_packets': buffer_stats['silent_packets'],
+                'discontinuities': buffer_stats['discontinuities'],
+                'timestamp_errors': buffer_stats['timestamp_errors'],
+                'glitches_per_minute': glitches / minutes if minutes > 0 else 0.0,
+                'events': list(buffer_stats['glitch_events']),
+            }
+        return report
+
     def stop_recording(self):
         """止所有设备的录制"""
         if self.is_recording:
+            # 各音轨都补齐到这一时刻
+            self.stop_qpc = qpc_now()
             self.is_recording = False
             
             for thread in self.recording_threads:
                 thread.join(timeout=5)
+            if self._device_catalog is not None:
+                self._device_catalog.remove_listener(self._on_device_change)
+            
+            if self.mixer:
+                # 各设备写线程都已结束，混合剩余数据并关闭混音文件
+                self.mixer.stop(timeout=5)
+                mixer_stats = self.mixer.get_stats()
+                print(f"[Audio] Mixed {mixer_stats['frames_mixed']} frames into {self.mixed_filename or 'mix sink'}")
+                for name, input_stats in mixer_stats['inputs'].items():
+                    print(f"[Audio]   {name}: late frames {input_stats['late_frames']}, "
+                          f"dropped frames {input_stats['dropped_frames']}")
             
             self.recording_threads = []
             self.audio_clients = []
@@ -488,4 +795,7 @@ class AudioRecorderManager:
     def __del__(self):
         """清理资源"""
         self.stop_recording()
-        comtypes.CoUninitialize() 
\ No newline at end of file
+        if self._device_catalog is not None:
+            self._device_catalog.close()
+        if self._com_initialized:
+            comtypes.CoUninitialize()
\ No newline at end of file
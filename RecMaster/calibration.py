@@ -0,0 +1,248 @@
+# 编码器校准：在本机对合成的屏幕内容试编码，生成每台机器自己的质量参数表
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+# 未校准时使用的质量参数，也是校准时各档位的目标（crf/码率不变，preset 和帧率按实测调整）
+DEFAULT_QUALITY_PARAMS = {
+    1: {  # 最低质量
+        'fps': 15,
+        'crf': 32,
+        'preset': 'ultrafast',
+        'video_bitrate': '1000k',
+    },
+    2: {  # 低质量
+        'fps': 20,
+        'crf': 28,
+        'preset': 'veryfast',
+        'video_bitrate': '1500k',
+    },
+    3: {  # 中等质量
+        'fps': 24,
+        'crf': 23,
+        'preset': 'medium',
+        'video_bitrate': '2500k',
+    },
+    4: {  # 高质量
+        'fps': 30,
+        'crf': 20,
+        'preset': 'slow',
+        'video_bitrate': '4000k',
+    },
+    5: {  # 最高质量
+        'fps': 60,
+        'crf': 18,
+        'preset': 'veryslow',
+        'video_bitrate': '6000k',
+    }
+}
+
+# x264 preset，从快到慢
+X264_PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast',
+                'medium', 'slow', 'slower', 'veryslow')
+
+# 校准时尝试的帧率（preset 降到 ultrafast 仍不够快时降低帧率）
+CALIBRATION_FPS = (60, 30, 24, 20, 15, 10)
+
+# 合成的屏幕内容：滚动的高细节文字区域、静态界面、视频播放
+CALIBRATION_CLIPS = {
+    'text_scroll': 'cellauto=s={size}:r={fps}:rule=110:scroll=1',
+    'static_ui': 'smptehdbars=s={size}:r={fps}',
+    'video': 'testsrc2=s={size}:r={fps},noise=alls=20:allf=t',
+}
+
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.rec')
+PROBE_FILE = 'ffmpeg_probe.json'
+PROFILE_FILE = 'quality_profile.json'
+
+# 常见的 H.264 编码器，探测结果中记录本机 ffmpeg 支持哪些
+H264_ENCODERS = ('libx264', 'h264_nvenc', 'h264_qsv', 'h264_amf', 'h264_mf', 'h264_vaapi',
+                 'h264_videotoolbox')
+
+def _machine_id():
+    """参数表只对生成它的机器有效"""
+    return {'node': platform.node(), 'machine': platform.machine(), 'cpu_count': os.cpu_count()}
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def probe_ffmpeg(ffmpeg='ffmpeg', profile_dir=PROFILE_DIR, refresh=False):
+    """返回 ffmpeg 的路径、版本和可用的 H.264 编码器
+
+    结果按 ffmpeg 可执行文件的路径、大小和修改时间缓存在 profile_dir 中，
+    ffmpeg 没有变化时不再启动探测进程。找不到 ffmpeg 时返回 None。
+    """
+    path = shutil.which(ffmpeg)
+    if path is None:
+        return None
+    stat = os.stat(path)
+    key = {'path': path, 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+    cache_file = os.path.join(profile_dir, PROBE_FILE)
+    cached = None if refresh else _read_json(cache_file)
+    if cached and cached.get('key') == key:
+        return cached
+
+    version = subprocess.run([path, '-hide_banner', '-version'],
+                             capture_output=True, text=True).stdout
+    encoders = subprocess.run([path, '-hide_banner', '-encoders'],
+                              capture_output=True, text=True).stdout
+    match = re.search(r'ffmpeg version (\S+)', version)
+    probe = {
+        'key': key,
+        'version': match.group(1) if match else version.split('\n', 1)[0],
+        'encoders': [name for name in H264_ENCODERS if re.search(rf'\s{name}\s', encoders)],
+        'probed_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    _write_json(cache_file, probe)
+    return probe
+
+def measure(probe, clip, size, fps, preset, crf, seconds=3.0, workdir=None):
+    """用 libx264 编码 seconds 秒的合成内容，返回 (实时倍数, 码率 kbps)"""
+    source = CALIBRATION_CLIPS[clip].format(size=size, fps=fps)
+    output = os.path.join(workdir or tempfile.gettempdir(), f'calibrate_{clip}.mp4')
+    cmd = [
+        probe['key']['path'], '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', source, '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+        output
+    ]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"校准编码失败: {result.stderr.strip()[-300:]}")
+    kbps = os.path.getsize(output) * 8 / 1000 / seconds
+    os.remove(output)
+    return seconds / elapsed, kbps
+
+def calibrate(size='1920x1080', seconds=3.0, headroom=1.5, levels=None, profile_dir=PROFILE_DIR,
+              ffmpeg='ffmpeg', log=print):
+    """为每个质量档位选出本机能以 headroom 倍实时编码的最慢 preset（压缩率最好）
+
+    从档位默认的 preset 开始逐级加快，ultrafast 仍不够时降低帧率；
+    每个候选取三种合成内容中最慢的实时倍数。结果写入 profile_dir/quality_profile.json。
+    """
+    probe = probe_ffmpeg(ffmpeg, profile_dir)
+    if probe is None:
+        raise RuntimeError("找不到 ffmpeg")
+    if 'libx264' not in probe['encoders']:
+        raise RuntimeError(f"ffmpeg {probe['version']} 没有 libx264 编码器")
+    levels = levels or sorted(DEFAULT_QUALITY_PARAMS)
+    workdir = tempfile.mkdtemp(prefix='recmaster_calibrate_')
+    measured = {}
+    table = {}
+    log(f"[Calibrate] ffmpeg {probe['version']}, {size}, {seconds:g}s clips, "
+        f"headroom {headroom:g}x, encoders: {', '.join(probe['encoders'])}")
+
+    def candidate(preset, fps, crf):
+        key = (preset, fps, crf)
+        if key not in measured:
+            results = {clip: measure(probe, clip, size, fps, preset, crf, seconds, workdir)
+                       for clip in CALIBRATION_CLIPS}
+            measured[key] = {
+                'preset': preset,
+                'fps': fps,
+                'crf': crf,
+                'realtime_factor': round(min(r[0] for r in results.values()), 2),
+                'kbps': {clip: round(r[1]) for clip, r in results.items()},
+            }
+            log(f"[Calibrate]   {preset:<10}{fps:>4} fps  crf {crf:<4}"
+                f"{measured[key]['realtime_factor']:>6.2f}x  "
+                + ', '.join(f"{clip} {kbps} kbps" for clip, kbps in measured[key]['kbps'].items()))
+        return measured[key]
+
+    try:
+        for level in levels:
+            target = DEFAULT_QUALITY_PARAMS[level]
+            log(f"[Calibrate] level {level}: target {target['preset']} @ {target['fps']} fps")
+            chosen = None
+            fps_steps = [target['fps']] + [f for f in CALIBRATION_FPS if f < target['fps']]
+            for fps in fps_steps:
+                top = X264_PRESETS.index(target['preset'])
+                for preset in X264_PRESETS[top::-1]:
+                    result = candidate(preset, fps, target['crf'])
+                    if result['realtime_factor'] >= headroom:
+                        chosen = result
+                        break
+                if chosen:
+                    break
+            if chosen is None:
+                # 本机最快的组合也达不到余量，使用其中最快的
+                chosen = candidate('ultrafast', fps_steps[-1], target['crf'])
+            table[level] = dict(target, preset=chosen['preset'], fps=chosen['fps'],
+                                realtime_factor=chosen['realtime_factor'], kbps=chosen['kbps'])
+            log(f"[Calibrate] level {level}: {chosen['preset']} @ {chosen['fps']} fps "
+                f"({chosen['realtime_factor']:.2f}x)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    profile = {
+        'machine': _machine_id(),
+        'ffmpeg_version': probe['version'],
+        'size': size,
+        'headroom': headroom,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'levels': {str(level): params for level, params in table.items()},
+        'measurements': list(measured.values()),
+    }
+    _write_json(os.path.join(profile_dir, PROFILE_FILE), profile)
+    return profile
+
+def load_quality_table(profile_dir=PROFILE_DIR):
+    """读取本机的校准参数表 {档位: 参数}，没有校准过或不是本机生成时返回 None"""
+    profile = _read_json(os.path.join(profile_dir, PROFILE_FILE))
+    if not profile or profile.get('machine') != _machine_id():
+        return None
+    # ffmpeg 升级后原来的测量结果不再可靠（探测结果有缓存，这里不会启动进程）
+    probe = probe_ffmpeg(profile_dir=profile_dir)
+    if probe is not None and probe['version'] != profile.get('ffmpeg_version'):
+        return None
+    try:
+        return {int(level): params for level, params in profile['levels'].items()}
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+def quality_params(level, profile_dir=PROFILE_DIR):
+    """某个质量档位的编码参数：优先使用本机校准的结果"""
+    table = load_quality_table(profile_dir) or {}
+    params = dict(DEFAULT_QUALITY_PARAMS[level])
+    params.update(table.get(level, {}))
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="校准本机的屏幕录制编码参数")
+    parser.add_argument('--size', default='1920x1080', help='校准使用的分辨率')
+    parser.add_argument('--seconds', type=float, default=3.0, help='每段合成内容的时长')
+    parser.add_argument('--headroom', type=float, default=1.5,
+                        help='要求的实时倍数（给录屏和其他程序留出余量）')
+    parser.add_argument('--levels', type=int, nargs='*', help='只校准这些档位')
+    parser.add_argument('--refresh-probe', action='store_true', help='重新探测 ffmpeg')
+    args = parser.parse_args()
+    if args.refresh_probe:
+        probe_ffmpeg(refresh=True)
+    profile = calibrate(args.size, args.seconds, args.headroom, args.levels)
+    print(f"已写入 {os.path.join(PROFILE_DIR, PROFILE_FILE)}")
+    for level, params in profile['levels'].items():
+        print(f"  {level}: {params['preset']} @ {params['fps']} fps, crf {params['crf']}, "
+              f"{params['realtime_factor']:.2f}x")
+
+if __name__ == '__main__':
+    main()
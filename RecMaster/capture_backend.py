@@ -0,0 +1,298 @@
+# 音频采集后端接口，以及不依赖 Windows 的确定性模拟后端
+import random
+import threading
+import time
+import numpy as np
+
+# 模拟后端支持的采样格式: (bits_per_sample, is_float)
+SAMPLE_FORMATS = {
+    'float32': (32, True),
+    'float64': (64, True),
+    'int16': (16, False),
+    'int24': (24, False),
+    'int32': (32, False),
+}
+
+# IAudioCaptureClient::GetBuffer 返回的 flags（_AUDCLNT_BUFFERFLAGS）
+AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY = 0x1
+AUDCLNT_BUFFERFLAGS_SILENT = 0x2
+AUDCLNT_BUFFERFLAGS_TIMESTAMP_ERROR = 0x4
+
+# 模拟后端可以注入的 flags
+INJECTABLE_FLAGS = {
+    'discontinuity': AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY,
+    'silent': AUDCLNT_BUFFERFLAGS_SILENT,
+    'timestamp_error': AUDCLNT_BUFFERFLAGS_TIMESTAMP_ERROR,
+}
+
+# 设备失效（拔出、禁用、音频服务重启）时 IAudioClient 返回的错误码
+AUDCLNT_E_DEVICE_INVALIDATED = 0x88890004
+AUDCLNT_E_SERVICE_NOT_RUNNING = 0x88890010
+AUDCLNT_E_RESOURCES_INVALIDATED = 0x88890026
+DEVICE_INVALIDATED_HRESULTS = (AUDCLNT_E_DEVICE_INVALIDATED, AUDCLNT_E_SERVICE_NOT_RUNNING,
+                               AUDCLNT_E_RESOURCES_INVALIDATED)
+
+class DeviceInvalidatedError(Exception):
+    """采集设备已失效，需要重新打开（或换用新的默认设备）"""
+
+def qpc_now():
+    """返回与 WASAPI u64QPCPosition 同单位（100ns）的当前时间"""
+    return time.perf_counter_ns() // 100
+
+class CaptureBackend:
+    """音频采集后端接口
+
+    AudioRecorderManager 的采集循环只通过这些方法访问设备:
+    open -> start -> (wait / get_next_packet_size / get_buffer / release_buffer)* -> stop -> close
+    get_buffer 与 IAudioCaptureClient.GetBuffer 一致，返回
+    (数据地址, 帧数, flags, 设备位置, QPC 位置)。
+    设备失效时 open/start/get_next_packet_size/get_buffer 抛出 DeviceInvalidatedError。
+    """
+    def __init__(self):
+        self.format = None
+
+    def open(self, event_driven=False):
+        """打开设备，返回格式信息字典；event_driven=True 时启用事件通知"""
+        raise NotImplementedError
+
+    def wait(self, timeout):
+        """等待新数据包到达或超时，返回是否有数据可读
+
+        不支持事件通知的后端退化为 1ms 休眠。
+        """
+        time.sleep(0.001)
+        return self.get_next_packet_size() > 0
+
+    def get_format(self):
+        """返回 open() 协商得到的格式信息"""
+        return self.format
+
+    def get_next_packet_size(self):
+        """返回下一个数据包的帧数，没有数据时返回 0"""
+        raise NotImplementedError
+
+    def get_buffer(self):
+        """取出下一个数据包"""
+        raise NotImplementedError
+
+    def release_buffer(self, num_frames):
+        """归还 get_buffer 取出的数据包"""
+        raise NotImplementedError
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """按固定节奏产生正弦波数据包的模拟后端，用于无声卡环境下的基准测试和长时间测试
+
+    jitter 为抖动配置，例如:
+        None 或 {'type': 'none'}                 严格按节奏
+        {'type': 'uniform', 'max': 0.002}        每包随机延迟 0~max 秒
+        {'type': 'gaussian', 'std': 0.001}       每包高斯延迟（截断为非负）
+        {'type': 'burst', 'every': 50, 'stall': 0.03}  每 every 包卡顿 stall 秒后集中到达
+    inject_flags 为每个包带上 GetBuffer flags 的概率，例如
+        {'silent': 0.5, 'discontinuity': 0.01, 'timestamp_error': 0.01}
+    flag_schedule 为 {包序号: flags}，在指定的包上固定带上这些 flags。
+    注入 discontinuity 时设备位置向前跳过一个包，模拟丢失的数据。
+    fail_at_packet 为设备失效的包序号（模拟拔出设备），之后的读取抛出 DeviceInvalidatedError，
+    为 0 时 start 就失败；invalidate() 随时使设备失效。
+    realtime=False 时数据包立即可用，用于测量采集循环的最大吞吐。
+    相同的参数和 seed 总是产生相同的数据包序列。
+    """
+    def __init__(self, sample_format='float32', channels=2, sample_rate=48000,
+                 packet_duration=0.01, jitter=None, seed=0, realtime=True,
+                 max_packets=None, tone_hz=440, amplitude=0.5, inject_flags=None,
+                 flag_schedule=None, fail_at_packet=None):
+        super().__init__()
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"不支持的采样格式: {sample_format}")
+        if not 1 <= channels <= 8:
+            raise ValueError(f"不支持的声道数: {channels}")
+        if not 44100 <= sample_rate <= 192000:
+            raise ValueError(f"不支持的采样率: {sample_rate}")
+        for name in inject_flags or {}:
+            if name not in INJECTABLE_FLAGS:
+                raise ValueError(f"不支持注入的 flag: {name}")
+
+        self.sample_format = sample_format
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.packet_frames = max(1, int(round(sample_rate * packet_duration)))
+        self.jitter = jitter or {'type': 'none'}
+        self.seed = seed
+        self.realtime = realtime
+        self.max_packets = max_packets
+        self.tone_hz = tone_hz
+        self.amplitude = amplitude
+        self.inject_flags = inject_flags or {}
+        self.flag_schedule = flag_schedule or {}
+        self.fail_at_packet = fail_at_packet
+        self._invalidated = False
+
+        self._table = None
+        self._table_packets = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reset_clock()
+
+    def _reset_clock(self):
+        self._rng = random.Random(self.seed)
+        # flags 使用独立的随机序列，不影响相同 seed 下的抖动序列
+        self._flag_rng = random.Random(self.seed + 1)
+        self._packet_index = 0
+        self._next_due = None
+        self._next_flags = 0
+        self._position_offset = 0
+        self._start_time = 0.0
+        self._start_qpc = 0
+        self._running = False
+
+    def _build_table(self):
+        """预先生成约 1 秒的循环数据表，get_buffer 直接返回表内地址，不产生额外拷贝"""
+        self._table_packets = max(1, int(round(self.sample_rate / self.packet_frames)))
+        total_frames = self._table_packets * self.packet_frames
+        t = np.arange(total_frames, dtype=np.float64) / self.sample_rate
+        wave = self.amplitude * np.sin(2 * np.pi * self.tone_hz * t)
+        # 各声道使用不同相位，便于区分声道
+        samples = np.empty((total_frames, self.channels), dtype=np.float64)
+        for ch in range(self.channels):
+            samples[:, ch] = np.roll(wave, ch * 7)
+
+        if self.sample_format == 'float32':
+            table = samples.astype(np.float32)
+        elif self.sample_format == 'float64':
+            table = samples
+        elif self.sample_format == 'int16':
+            table = np.round(samples * 32767).astype(np.int16)
+        elif self.sample_format == 'int32':
+            table = np.round(samples * 2147483647).astype('<i4')
+        else:
+            int_data = np.round(samples * 8388607).astype('<i4')
+            table = int_data.view(np.uint8).reshape(-1, 4)[:, :3].copy()
+        self._table = np.ascontiguousarray(table).reshape(-1).view(np.uint8)
+
+    def _jitter_delay(self, index):
+        kind = self.jitter.get('type', 'none')
+        if kind == 'uniform':
+            return self._rng.uniform(0, self.jitter.get('max', 0.002))
+        if kind == 'gaussian':
+            return max(0.0, self._rng.gauss(0, self.jitter.get('std', 0.001)))
+        if kind == 'burst':
+            every = self.jitter.get('every', 50)
+            if index % every == every - 1:
+                return self.jitter.get('stall', 0.03)
+        return 0.0
+
+    def _schedule_next(self):
+        """计算当前包的 flags 和到达时间，保证到达时间单调不减"""
+        flags = self.flag_schedule.get(self._packet_index, 0)
+        for name, probability in self.inject_flags.items():
+            if self._flag_rng.random() < probability:
+                flags |= INJECTABLE_FLAGS[name]
+        if flags & AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY:
+            # 丢失一个包：设备位置和到达时间都向后推一个包
+            self._position_offset += self.packet_frames
+        self._next_flags = flags
+
+        # 数据包在最后一帧采集完成后才可用
+        end_position = (self._packet_index + 1) * self.packet_frames + self._position_offset
+        due = end_position / self.sample_rate + self._jitter_delay(self._packet_index)
+        if self._next_due is not None:
+            due = max(due, self._next_due)
+        self._next_due = due
+
+    def open(self, event_driven=False):
+        bits, is_float = SAMPLE_FORMATS[self.sample_format]
+        self._build_table()
+        self.format = {
+            'channels': self.channels,
+            'sample_rate': self.sample_rate,
+            'bits_per_sample': bits,
+            'valid_bits_per_sample': bits,
+            'is_float': is_float,
+            'sample_format': self.sample_format
+        }
+        return self.format
+
+    def start(self):
+        with self._lock:
+            # 与 IAudioClient::Start 相同，已失效的设备无法启动
+            self._check_valid()
+            self._reset_clock()
+            self._schedule_next()
+            self._start_time = time.perf_counter()
+            self._start_qpc = qpc_now()
+            self._running = True
+            self._wake.clear()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+        # 唤醒正在 wait 的采集线程
+        self._wake.set()
+
+    def invalidate(self):
+        """模拟设备失效（拔出），之后的读取抛出 DeviceInvalidatedError"""
+        with self._lock:
+            self._invalidated = True
+        self._wake.set()
+
+    def _check_valid(self):
+        """在持有 _lock 时调用"""
+        if self.fail_at_packet is not None and self._packet_index >= self.fail_at_packet:
+            self._invalidated = True
+        if self._invalidated:
+            raise DeviceInvalidatedError("模拟设备已失效")
+
+    def wait(self, timeout):
+        """按下一个包的到达时间休眠，相当于设备在数据就绪时触发事件"""
+        with self._lock:
+            if self._packet_ready():
+                return True
+            exhausted = self.max_packets is not None and self._packet_index >= self.max_packets
+            if not self._running or not self.realtime or exhausted:
+                delay = timeout
+            else:
+                elapsed = time.perf_counter() - self._start_time
+                delay = min(timeout, max(0.0, self._next_due - elapsed))
+        self._wake.wait(delay)
+        return self.get_next_packet_size() > 0
+
+    def _packet_ready(self):
+        if not self._running:
+            return False
+        if self.max_packets is not None and self._packet_index >= self.max_packets:
+            return False
+        if not self.realtime:
+            return True
+        return time.perf_counter() - self._start_time >= self._next_due
+
+    def get_next_packet_size(self):
+        with self._lock:
+            self._check_valid()
+            return self.packet_frames if self._packet_ready() else 0
+
+    def get_buffer(self):
+        with self._lock:
+            self._check_valid()
+            if not self._packet_ready():
+                return None, 0, 0, 0, 0
+            frame_bytes = self.channels * self.format['bits_per_sample'] // 8
+            offset = (self._packet_index % self._table_packets) * self.packet_frames * frame_bytes
+            address = self._table.ctypes.data + offset
+            device_position = self._packet_index * self.packet_frames + self._position_offset
+            # QPC 为数据包第一帧的采集时刻，由设备位置决定，与到达时的抖动无关
+            qpc_position = self._start_qpc + device_position * 10000000 // self.sample_rate
+            return address, self.packet_frames, self._next_flags, device_position, qpc_position
+
+    def release_buffer(self, num_frames):
+        with self._lock:
+            if num_frames:
+                self._packet_index += 1
+                self._schedule_next()
@@ -0,0 +1,244 @@
+# 命令行录制：不创建界面、不导入 tkinter，适合无人值守的主机和基准测试
+import argparse
+import contextlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from .audio_recorder import AudioRecorderManager
+from .capture_backend import SyntheticCaptureBackend
+from .merge import audio_offset, merge_command
+from .muxed_recording import MuxedRecording
+from .screen_recorder import CONTAINERS, SCALERS, VIDEO_SOURCES, ScreenRecorder
+
+class CliPathManager:
+    """与界面的 RecordingPathManager 相同的接口，所有文件放在 --out 旁边，以输出文件名为前缀"""
+    def __init__(self, output_file):
+        self.output_file = os.path.abspath(output_file)
+        self.base_dir = os.path.dirname(self.output_file)
+        self.prefix = os.path.splitext(os.path.basename(self.output_file))[0]
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        if is_input:
+            return os.path.join(self.base_dir, f'{self.prefix}_audio_in.wav')
+        if device_name:
+            device_name = "".join(c for c in device_name if c.isalnum() or c in (' ', '-', '_')).strip()
+        return os.path.join(self.base_dir, f'{self.prefix}_audio_out_{device_name}.wav')
+
+    def get_mixed_audio_filename(self):
+        return os.path.join(self.base_dir, f'{self.prefix}_audio_mix.wav')
+
+    def get_video_filename(self):
+        return os.path.join(self.base_dir, f'{self.prefix}_video.mp4')
+
+    def get_merged_filename(self):
+        return self.output_file
+
+def _parse_region(value):
+    try:
+        x, y, width, height = (int(v) for v in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError("区域格式为 x,y,w,h")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("区域的宽和高必须大于 0")
+    return x, y, width, height
+
+def _parse_size(value):
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("尺寸格式为 WxH")
+    return width, height
+
+def _parse_scale(value):
+    if value == 'logical':
+        return value
+    try:
+        scale = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("缩放系数为正数或 logical")
+    if scale <= 0:
+        raise argparse.ArgumentTypeError("缩放系数必须大于 0")
+    return scale
+
+def _select_devices(args, manager):
+    """按名称（不区分大小写的子串）选择音频设备，返回 (输出设备列表, 输入设备)"""
+    if args.audio_backend == 'synthetic':
+        # 模拟设备：每个名称一个正弦波后端
+        outputs = [{'name': name, 'device': name} for name in args.audio_out]
+        selected_input = {'name': args.audio_in, 'device': args.audio_in} if args.audio_in else None
+        return outputs, selected_input
+    if not args.audio_out and not args.audio_in:
+        return [], None
+    output_devices, input_devices = manager.get_available_devices()
+
+    def find(devices, name):
+        for device in devices:
+            if name.lower() in device['name'].lower():
+                return device
+        raise SystemExit(f"找不到音频设备: {name}（可用: {', '.join(d['name'] for d in devices) or '无'}）")
+
+    return ([find(output_devices, name) for name in args.audio_out],
+            find(input_devices, args.audio_in) if args.audio_in else None)
+
+def _install_stop_handlers(stop_event):
+    """SIGINT/SIGTERM（Windows 上还有 Ctrl+Break）触发正常停止"""
+    signals = [signal.SIGINT, signal.SIGTERM]
+    if hasattr(signal, 'SIGBREAK'):
+        signals.append(signal.SIGBREAK)
+    for signum in signals:
+        signal.signal(signum, lambda signum, frame: stop_event.set())
+
+def record(args, stop_event=None):
+    """按命令行参数录制，返回结果字典（文件、耗时、编码统计）"""
+    stop_event = stop_event or threading.Event()
+    output_file = args.out or f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+    paths = CliPathManager(output_file)
+    os.makedirs(paths.base_dir, exist_ok=True)
+    result = {'status': 'ok', 'output_file': None, 'video_files': [], 'audio_files': [], 'timings': {}}
+    timings = result['timings']
+
+    recorder = ScreenRecorder(
+        quality=args.quality,
+        video_source=args.source,
+        static_mode=args.static,
+        container=args.container,
+        scale=args.scale,
+        max_size=args.max_size,
+        scaler=args.scaler,
+    )
+    backend_factory = None
+    if args.audio_backend == 'synthetic':
+        backend_factory = lambda device, is_input=False: SyntheticCaptureBackend()
+    manager = AudioRecorderManager(backend_factory=backend_factory)
+    selected_outputs, selected_input = _select_devices(args, manager)
+    has_audio = bool(selected_outputs or selected_input)
+    x, y, width, height = args.region
+
+    start = time.perf_counter()
+    muxed = None
+    audio_files = []
+    if has_audio and args.single_pass:
+        muxed = MuxedRecording(recorder, manager)
+        area = muxed.start(x, y, x + width, y + height, selected_outputs=selected_outputs,
+                           selected_input=selected_input, path_manager=paths)
+    else:
+        area = recorder.start_recording(x, y, x + width, y + height,
+                                        output_file=paths.get_video_filename())
+        if area and has_audio:
+            audio_files = manager.start_recording(
+                selected_outputs=selected_outputs,
+                selected_input=selected_input,
+                path_manager=paths,
+                mix=len(selected_outputs) + (1 if selected_input else 0) > 1
+            ) or []
+    if not area:
+        result.update(status='error', error=recorder.last_error or "录屏启动失败")
+        return result
+    timings['start_seconds'] = time.perf_counter() - start
+    recording_start = time.perf_counter()
+
+    # 等待时长到达或收到停止信号；Windows 上 Event.wait 不会被 Ctrl+C 打断，按 0.2 秒分段等待
+    deadline = time.monotonic() + args.duration if args.duration is not None else None
+    while not stop_event.wait(0.2):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    timings['recorded_seconds'] = time.perf_counter() - recording_start
+    result['encoder'] = recorder.get_stats()
+
+    stop_start = time.perf_counter()
+    if muxed:
+        result['output_file'] = muxed.stop()
+        result['video_files'] = [result['output_file']]
+        timings['stop_seconds'] = time.perf_counter() - stop_start
+        timings['merge_seconds'] = 0.0
+    else:
+        audio_tracks = [(f, audio_offset(f, recorder.start_time, manager.start_time)) for f in audio_files]
+        manager.stop_recording()
+        recorder.stop_recording()
+        timings['stop_seconds'] = time.perf_counter() - stop_start
+        result['video_files'] = [output['file'] for output in recorder.outputs]
+        result['audio_files'] = audio_files
+        merge_start = time.perf_counter()
+        if audio_tracks:
+            merged = subprocess.run(merge_command(recorder.output_file, audio_tracks, paths.get_merged_filename()),
+                                    capture_output=True, text=True)
+            if merged.returncode:
+                result.update(status='error', error=f"合并音视频失败: {merged.stderr.strip()[-500:]}")
+            else:
+                result['output_file'] = paths.get_merged_filename()
+        else:
+            result['output_file'] = recorder.output_file
+        timings['merge_seconds'] = time.perf_counter() - merge_start
+    timings['total_seconds'] = time.perf_counter() - start
+    if result['output_file'] and os.path.exists(result['output_file']):
+        result['output_bytes'] = os.path.getsize(result['output_file'])
+    return result
+
+def list_devices(args):
+    output_devices, input_devices = AudioRecorderManager().get_available_devices()
+    return {
+        'outputs': [{'name': d['name'], 'id': d['id'], 'default': d.get('is_default', False)}
+                    for d in output_devices],
+        'inputs': [{'name': d['name'], 'id': d['id']} for d in input_devices],
+    }
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='recmaster', description='RecMaster 命令行录制（不带参数时启动界面）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rec = commands.add_parser('record', help='录制屏幕区域和音频')
+    rec.add_argument('--region', type=_parse_region, default=(0, 0, 1280, 720), help='录制区域 x,y,w,h')
+    rec.add_argument('--duration', type=float, help='录制秒数；不给出时录制到 Ctrl+C / SIGTERM')
+    rec.add_argument('--audio-out', action='append', default=[], metavar='NAME',
+                     help='录制的输出设备（名称子串，可重复）')
+    rec.add_argument('--audio-in', metavar='NAME', help='录制的输入设备（名称子串）')
+    rec.add_argument('--audio-backend', choices=('wasapi', 'synthetic'), default='wasapi',
+                     help='synthetic 为正弦波模拟设备，用于没有声卡的测试')
+    rec.add_argument('--quality', type=int, default=3, choices=range(1, 6))
+    rec.add_argument('--out', help='最终输出文件，中间文件放在同一目录')
+    rec.add_argument('--source', choices=VIDEO_SOURCES, help='视频输入，默认 Windows 为 gdigrab，其他为 x11grab')
+    rec.add_argument('--container', choices=tuple(CONTAINERS), default='mp4')
+    rec.add_argument('--scale', type=_parse_scale, help="缩放系数或 logical")
+    rec.add_argument('--max-size', type=_parse_size, help='最大输出尺寸 WxH')
+    rec.add_argument('--scaler', choices=SCALERS, default='bicubic')
+    rec.add_argument('--static', action='store_true', help='静态画面模式（丢弃重复帧）')
+    rec.add_argument('--single-pass', action='store_true', help='音频直接送入录屏的 ffmpeg')
+    rec.add_argument('--json', action='store_true', help='结果以 JSON 输出到 stdout，日志输出到 stderr')
+
+    dev = commands.add_parser('devices', help='列出音频设备')
+    dev.add_argument('--json', action='store_true')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    stop_event = threading.Event()
+    _install_stop_handlers(stop_event)
+    # JSON 模式下 stdout 只有结果，录制过程的日志转到 stderr
+    log = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    with log:
+        if args.command == 'devices':
+            result = list_devices(args)
+        else:
+            result = record(args, stop_event)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    elif args.command == 'devices':
+        for kind in ('outputs', 'inputs'):
+            for device in result[kind]:
+                print(f"{kind[:-1]}: {device['name']}")
+    else:
+        print(f"{result['status']}: {result['output_file']} "
+              f"(录制 {result['timings'].get('recorded_seconds', 0):.1f}s, "
+              f"停止 {result['timings'].get('stop_seconds', 0):.2f}s, "
+              f"合并 {result['timings'].get('merge_seconds', 0):.2f}s)")
+        if result.get('error'):
+            print(result['error'])
+    return 0 if result.get('status', 'ok') == 'ok' else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
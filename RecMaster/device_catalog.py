@@ -0,0 +1,291 @@
+# 音频设备目录：缓存端点列表、友好名称和混音格式，由设备变更通知增量失效
+import threading
+import time
+
+# EDataFlow：输出（回环录制）和输入设备
+RENDER = 0
+CAPTURE = 1
+
+# 默认设备使用的 ERole（eMultimedia），与录制时选择默认设备的方式一致
+DEFAULT_ROLE = 1
+
+# DEVICE_STATE_ACTIVE
+DEVICE_STATE_ACTIVE = 0x1
+
+class DeviceSource:
+    """设备目录的数据来源
+
+    endpoints(flow) 返回 flow 方向上活动端点的 [(id, device)]，device 原样传给采集后端；
+    describe(device_id, device) 返回 {'name', 'mix_format'}，mix_format 为格式信息或 None；
+    default_endpoint(flow) 返回默认端点的 id（没有时为 None）。
+    register(listener) 之后设备变化时调用 listener 的 on_device_added(id)、on_device_removed(id)、
+    on_device_state_changed(id, state)、on_default_device_changed(flow, role, id)、
+    on_property_value_changed(id)，可能在其他线程中调用。
+    """
+    def endpoints(self, flow):
+        raise NotImplementedError
+
+    def describe(self, device_id, device):
+        raise NotImplementedError
+
+    def default_endpoint(self, flow):
+        raise NotImplementedError
+
+    def register(self, listener):
+        raise NotImplementedError
+
+    def unregister(self):
+        pass
+
+class FakeDeviceSource(DeviceSource):
+    """内存中的设备来源，用于测试目录的缓存和失效，以及配合 SyntheticCaptureBackend 录制
+
+    add_device/remove_device/set_default/set_property/set_state 修改设备并像 WASAPI 一样发出通知。
+    describe_delay 模拟读取属性存储和激活 IAudioClient 的耗时，calls 统计各方法的调用次数。
+    """
+    def __init__(self, describe_delay=0.0):
+        self.describe_delay = describe_delay
+        self.devices = {}
+        self.defaults = {RENDER: None, CAPTURE: None}
+        self.listener = None
+        self.calls = {'endpoints': 0, 'describe': 0, 'default_endpoint': 0}
+        self._lock = threading.Lock()
+
+    def add_device(self, device_id, name, flow=RENDER, mix_format=None, default=False):
+        with self._lock:
+            self.devices[device_id] = {'name': name, 'flow': flow, 'mix_format': mix_format,
+                                       'state': DEVICE_STATE_ACTIVE}
+        if self.listener:
+            self.listener.on_device_added(device_id)
+        if default or self.defaults[flow] is None:
+            self.set_default(flow, device_id)
+
+    def remove_device(self, device_id):
+        with self._lock:
+            device = self.devices.pop(device_id)
+            flow = device['flow']
+            new_default = None
+            if self.defaults[flow] == device_id:
+                new_default = next((i for i, d in self.devices.items()
+                                    if d['flow'] == flow and d['state'] == DEVICE_STATE_ACTIVE), None)
+                self.defaults[flow] = new_default
+        if self.listener:
+            self.listener.on_device_removed(device_id)
+            if new_default is not None:
+                self.listener.on_default_device_changed(flow, DEFAULT_ROLE, new_default)
+
+    def set_default(self, flow, device_id):
+        with self._lock:
+            self.defaults[flow] = device_id
+        if self.listener:
+            self.listener.on_default_device_changed(flow, DEFAULT_ROLE, device_id)
+
+    def set_property(self, device_id, name=None, mix_format=None):
+        with self._lock:
+            if name is not None:
+                self.devices[device_id]['name'] = name
+            if mix_format is not None:
+                self.devices[device_id]['mix_format'] = mix_format
+        if self.listener:
+            self.listener.on_property_value_changed(device_id)
+
+    def set_state(self, device_id, state):
+        with self._lock:
+            self.devices[device_id]['state'] = state
+        if self.listener:
+            self.listener.on_device_state_changed(device_id, state)
+
+    def endpoints(self, flow):
+        self.calls['endpoints'] += 1
+        with self._lock:
+            return [(device_id, device_id) for device_id, device in self.devices.items()
+                    if device['flow'] == flow and device['state'] == DEVICE_STATE_ACTIVE]
+
+    def describe(self, device_id, device):
+        self.calls['describe'] += 1
+        if self.describe_delay:
+            time.sleep(self.describe_delay)
+        with self._lock:
+            info = self.devices[device_id]
+            return {'name': info['name'], 'mix_format': info['mix_format']}
+
+    def default_endpoint(self, flow):
+        self.calls['default_endpoint'] += 1
+        return self.defaults[flow]
+
+    def register(self, listener):
+        self.listener = listener
+
+    def unregister(self):
+        self.listener = None
+
+class DeviceCatalog:
+    """缓存的音频设备目录
+
+    第一次 devices() 时枚举两个方向的端点并逐个读取名称和混音格式，之后直接返回缓存。
+    注册到 source 的设备通知只修改受影响的部分：新增或重新启用的设备使端点列表重新枚举
+    （已知设备不再读取属性），移除或停用的设备从缓存删除，默认设备变化只更新默认 id，
+    属性变化只重新读取该设备。无法注册通知时每次 devices() 重新枚举端点，属性仍然缓存。
+    add_listener(callback) 的 callback(event, device_id, flow) 在通知线程中调用，
+    event 为 added/removed/state/default/property，不能阻塞。
+    """
+    def __init__(self, source, watch=True):
+        self.source = source
+        self._lock = threading.RLock()
+        self._entries = {}
+        # 各方向的端点 id 顺序，None 表示需要重新枚举
+        self._order = {RENDER: None, CAPTURE: None}
+        self._defaults = {}
+        self._listeners = []
+        self.stats = {'enumerations': 0, 'describes': 0, 'hits': 0, 'events': 0, 'invalidations': 0}
+        self.watching = False
+        if watch:
+            try:
+                source.register(self)
+                self.watching = True
+            except Exception as e:
+                print(f"[Devices] 无法注册设备变更通知，每次刷新重新枚举: {e}")
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _describe(self, device_id, device, flow, index):
+        self.stats['describes'] += 1
+        try:
+            info = self.source.describe(device_id, device)
+        except Exception as e:
+            print(f"[Devices] 读取设备 {device_id} 的属性失败: {e}")
+            info = {'name': None, 'mix_format': None}
+        fallback = f"{'输出' if flow == RENDER else '输入'}设备 {index}"
+        return {'id': device_id, 'device': device, 'flow': flow,
+                'name': info.get('name') or fallback, 'mix_format': info.get('mix_format'),
+                'stale': False}
+
+    def _refresh_flow(self, flow):
+        if self._order[flow] is None or not self.watching:
+            self.stats['enumerations'] += 1
+            endpoints = self.source.endpoints(flow)
+            self._order[flow] = [device_id for device_id, _ in endpoints]
+            for index, (device_id, device) in enumerate(endpoints):
+                entry = self._entries.get(device_id)
+                if entry is None or entry['stale']:
+                    self._entries[device_id] = self._describe(device_id, device, flow, index)
+                else:
+                    self.stats['hits'] += 1
+        else:
+            for index, device_id in enumerate(self._order[flow]):
+                entry = self._entries[device_id]
+                if entry['stale']:
+                    self._entries[device_id] = self._describe(device_id, entry['device'], flow, index)
+                else:
+                    self.stats['hits'] += 1
+        if flow not in self._defaults or not self.watching:
+            try:
+                self._defaults[flow] = self.source.default_endpoint(flow)
+            except Exception as e:
+                print(f"[Devices] 获取默认设备失败: {e}")
+                self._defaults[flow] = None
+
+    def devices(self):
+        """返回 (输出设备列表, 输入设备列表)，每项为 {'name', 'device', 'id', 'is_default', 'mix_format'}"""
+        with self._lock:
+            result = []
+            for flow in (RENDER, CAPTURE):
+                self._refresh_flow(flow)
+                default_id = self._defaults.get(flow)
+                result.append([{'name': entry['name'], 'device': entry['device'], 'id': entry['id'],
+                                'is_default': entry['id'] == default_id,
+                                'mix_format': entry['mix_format']}
+                               for entry in (self._entries[device_id] for device_id in self._order[flow])])
+            return result[0], result[1]
+
+    def get(self, device_id):
+        """按 id 查找已缓存的设备，不在目录中时返回 None"""
+        with self._lock:
+            entry = self._entries.get(device_id)
+            return dict(entry) if entry else None
+
+    def default_device(self, flow):
+        """flow 方向的默认设备（目录中的一项），没有时返回 None"""
+        outputs, inputs = self.devices()
+        return next((device for device in (outputs if flow == RENDER else inputs)
+                     if device['is_default']), None)
+
+    def invalidate(self, device_id=None):
+        """使一个设备（或全部）的缓存失效，下次 devices() 时重新读取"""
+        with self._lock:
+            self.stats['invalidations'] += 1
+            if device_id is None:
+                self._entries.clear()
+                self._order = {RENDER: None, CAPTURE: None}
+                self._defaults.clear()
+            elif device_id in self._entries:
+                self._entries[device_id]['stale'] = True
+
+    def _remove(self, device_id):
+        entry = self._entries.pop(device_id, None)
+        for order in self._order.values():
+            if order is not None and device_id in order:
+                order.remove(device_id)
+        return entry['flow'] if entry else None
+
+    def _notify(self, event, device_id, flow=None):
+        self.stats['events'] += 1
+        for callback in list(self._listeners):
+            try:
+                callback(event, device_id, flow)
+            except Exception as e:
+                print(f"[Devices] 设备变更回调出错: {e}")
+
+    # 以下为 source 的通知回调
+    def on_device_added(self, device_id):
+        with self._lock:
+            # 不知道方向，两个端点列表都重新枚举；已缓存的设备不会重新读取属性
+            self._order = {RENDER: None, CAPTURE: None}
+        self._notify('added', device_id)
+
+    def on_device_removed(self, device_id):
+        with self._lock:
+            flow = self._remove(device_id)
+        self._notify('removed', device_id, flow)
+
+    def on_device_state_changed(self, device_id, state):
+        with self._lock:
+            if state & DEVICE_STATE_ACTIVE:
+                self._order = {RENDER: None, CAPTURE: None}
+                flow = None
+            else:
+                flow = self._remove(device_id)
+        self._notify('state', device_id, flow)
+
+    def on_default_device_changed(self, flow, role, device_id):
+        if role != DEFAULT_ROLE:
+            return
+        with self._lock:
+            self._defaults[flow] = device_id
+        self._notify('default', device_id, flow)
+
+    def on_property_value_changed(self, device_id):
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry:
+                entry['stale'] = True
+            flow = entry['flow'] if entry else None
+        self._notify('property', device_id, flow)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, devices=len(self._entries), watching=self.watching)
+
+    def close(self):
+        """注销设备通知"""
+        if self.watching:
+            try:
+                self.source.unregister()
+            except Exception as e:
+                print(f"[Devices] 注销设备通知失败: {e}")
+            self.watching = False
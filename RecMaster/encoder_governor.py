@@ -0,0 +1,158 @@
+# 编码调节：编码速度跟不上实时时放开线程数、降低 preset/帧率，恢复后再逐级退回
+import os
+import threading
+import time
+from collections import deque
+from .calibration import X264_PRESETS
+
+# 降低帧率时依次尝试的帧率
+FPS_STEPS = (60, 50, 30, 25, 24, 20, 15, 12, 10, 5)
+
+def _describe(params):
+    preset, fps, threads = params
+    return f"{preset}@{fps}fps" + (f"/{threads} threads" if threads else '')
+
+class EncoderGovernor:
+    """根据 EncoderTelemetry 的进度调节 ScreenRecorder 的编码参数
+
+    以录制开始时的 preset/fps/threads 为起点。录制限定了 x264 线程数（ScreenRecorder 的 threads）时，
+    先把线程数逐级翻倍到 max_threads（默认 CPU 核数），不损失画质；之后依次为更快的 preset
+    （直到 min_preset），再为更低的帧率（直到 min_fps）。没有限定线程数时 x264 已经使用全部核心，
+    没有线程数这一级。每次调节通过 ScreenRecorder.restart_encoder 在分段边界切换，输出保持连续。
+
+    - 最近 window 秒内的编码速度（out_time 增量 / 墙上时间增量，不使用 ffmpeg 的累计 speed）
+      低于 min_speed，或丢帧比例超过 drop_tolerance 时降一级；两次降级至少间隔 hold 秒。
+    - 连续 probe_after 秒没有落后时升一级试探；试探后 probe_after 秒内又落后则降回，
+      并把下一次试探的等待时间加倍（最多 max_probe_after 秒）。
+    每次调节记录在 events 中并打印。
+    """
+    def __init__(self, min_speed=0.95, window=5.0, drop_tolerance=0.02, min_preset='ultrafast',
+                 min_fps=10, hold=10.0, warmup=3.0, probe_after=60.0, max_probe_after=600.0,
+                 max_threads=None):
+        if min_preset not in X264_PRESETS:
+            raise ValueError(f"未知的 x264 preset: {min_preset}")
+        self.min_speed = min_speed
+        self.window = window
+        self.drop_tolerance = drop_tolerance
+        self.min_preset = min_preset
+        self.min_fps = min_fps
+        self.hold = hold
+        self.warmup = warmup
+        self.probe_after = probe_after
+        self.max_probe_after = max_probe_after
+        self.max_threads = max_threads
+        self.events = []
+        self.ladder = []
+        self.level = 0
+        self._recorder = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _build_ladder(self, preset, fps, threads=None):
+        """从 (preset, fps, threads) 开始逐级降低负担的参数列表，threads 为 None 时不限定线程数"""
+        thread_steps = [threads]
+        if threads:
+            limit = max(threads, self.max_threads or os.cpu_count() or threads)
+            while thread_steps[-1] < limit:
+                thread_steps.append(min(thread_steps[-1] * 2, limit))
+        most_threads = thread_steps[-1]
+        top = X264_PRESETS.index(preset) if preset in X264_PRESETS else len(X264_PRESETS) - 1
+        bottom = min(X264_PRESETS.index(self.min_preset), top)
+        ladder = [(X264_PRESETS[top], fps, step) for step in thread_steps]
+        ladder.extend((X264_PRESETS[i], fps, most_threads) for i in range(top - 1, bottom - 1, -1))
+        lowest = ladder[-1][0]
+        ladder.extend((lowest, step, most_threads) for step in FPS_STEPS if self.min_fps <= step < fps)
+        return ladder
+
+    def start(self, recorder):
+        self._recorder = recorder
+        self.ladder = self._build_ladder(recorder.preset, recorder.fps, recorder.threads)
+        self.level = 0
+        self.events = []
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _step(self, level, action, reason, speed, drop_ratio):
+        if self._stop_event.is_set():
+            return
+        before = self.ladder[self.level]
+        after = self.ladder[level]
+        event = {
+            'time': round(time.time() - self._recorder.start_time, 3),
+            'action': action,
+            'from': before,
+            'to': after,
+            'reason': reason,
+            'speed': round(speed, 3),
+            'drop_ratio': round(drop_ratio, 4),
+        }
+        self.events.append(event)
+        print(f"[Governor] {event['time']:.1f}s {action}: {_describe(before)} -> "
+              f"{_describe(after)} ({reason}, speed {speed:.2f}x, drops {drop_ratio:.1%})")
+        self.level = level
+        self._recorder.restart_encoder(preset=after[0], fps=after[1], threads=after[2])
+
+    def _run(self):
+        samples = deque()
+        telemetry = None
+        segment_start = last_change = time.monotonic()
+        stable_since = None
+        probe_after = self.probe_after
+        probing_since = None
+        while not self._stop_event.is_set():
+            if self._recorder.telemetry is not telemetry:
+                # 新的分段：重新积累样本
+                telemetry = self._recorder.telemetry
+                samples.clear()
+                segment_start = time.monotonic()
+            if not telemetry.wait_update(timeout=1.0):
+                if telemetry.get_stats()['ended']:
+                    self._stop_event.wait(0.5)
+                continue
+            stats = telemetry.get_stats()
+            now = time.monotonic()
+            samples.append((now, stats['out_time'], stats['frame'], stats['drop_frames']))
+            while now - samples[0][0] > self.window:
+                samples.popleft()
+            if now - segment_start < self.warmup + self.window or len(samples) < 2:
+                continue
+
+            t0, out0, frame0, drop0 = samples[0]
+            elapsed = now - t0
+            if elapsed <= 0:
+                continue
+            speed = (stats['out_time'] - out0) / elapsed
+            drops = stats['drop_frames'] - drop0
+            drop_ratio = drops / max(1, stats['frame'] - frame0 + drops)
+            behind = speed < self.min_speed or drop_ratio > self.drop_tolerance
+
+            if behind:
+                stable_since = None
+                if probing_since is not None and now - probing_since < self.probe_after:
+                    # 试探失败，下一次等待更久
+                    probe_after = min(probe_after * 2, self.max_probe_after)
+                probing_since = None
+                if self.level < len(self.ladder) - 1 and now - last_change >= self.hold:
+                    reason = 'speed' if speed < self.min_speed else 'drops'
+                    self._step(self.level + 1, 'down', reason, speed, drop_ratio)
+                    last_change = time.monotonic()
+                continue
+
+            if stable_since is None:
+                stable_since = now
+            if probing_since is not None and now - probing_since >= self.probe_after:
+                # 试探成功，恢复正常的等待时间
+                probing_since = None
+                probe_after = self.probe_after
+            if self.level > 0 and now - stable_since >= probe_after:
+                self._step(self.level - 1, 'up', 'recovered', speed, drop_ratio)
+                last_change = time.monotonic()
+                stable_since = None
+                probing_since = last_change
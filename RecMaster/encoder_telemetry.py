@@ -0,0 +1,175 @@
+# ffmpeg 编码进度：解析 -progress 输出，持续读取 stderr 到有限长度的日志环
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import win32api
+    import win32con
+    import win32process
+except ImportError:
+    win32process = None
+
+# ffmpeg 进度参数：进度写到 stdout，关闭 stderr 上的统计行
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+# -progress 输出中的整数字段
+_INT_FIELDS = ('frame', 'total_size', 'out_time_us', 'dup_frames', 'drop_frames')
+
+def _parse_number(value, suffix=''):
+    """解析 "1.02x"、"2315.4kbits/s" 之类的值，N/A 返回 None"""
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def process_cpu_seconds(pid):
+    """进程已用的 CPU 时间（用户态 + 内核态，秒），无法读取时返回 None"""
+    try:
+        if win32process is not None:
+            handle = win32api.OpenProcess(win32con.PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+            try:
+                times = win32process.GetProcessTimes(handle)
+            finally:
+                win32api.CloseHandle(handle)
+            # 单位为 100ns
+            return (times['UserTime'] + times['KernelTime']) / 1e7
+        with open(f'/proc/{pid}/stat') as f:
+            # comm 字段可能含空格，从最后一个 ')' 之后开始按空格切分
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+class EncoderTelemetry:
+    """读取 ffmpeg 进程的 -progress 输出和 stderr
+
+    ffmpeg 需要带 PROGRESS_ARGS 启动，stdout/stderr 为管道。两个后台线程：
+    一个按块解析 key=value 进度（每块以 progress=continue/end 结束），
+    一个持续读取 stderr 放入最近 log_lines 行的日志环，避免管道写满后 ffmpeg 阻塞。
+    get_stats 返回最近一次的进度，wait_update 等待下一次进度更新。
+    每次进度更新时同时记录 ffmpeg 进程已用的 CPU 时间 (cpu_seconds)。
+    """
+    def __init__(self, process, log_lines=200):
+        self.process = process
+        self._log = deque(maxlen=log_lines)
+        self._lock = threading.Condition()
+        self._stats = {
+            'frame': 0,
+            'fps': None,
+            'speed': None,
+            'bitrate_kbps': None,
+            'total_size': None,
+            'out_time': 0.0,
+            'dup_frames': 0,
+            'drop_frames': 0,
+            'cpu_seconds': None,
+            'stream_q': {},
+            'updates': 0,
+            'ended': False,
+        }
+        self._updated_at = None
+        self._threads = []
+        for target, stream in ((self._read_progress, process.stdout),
+                               (self._read_log, process.stderr)):
+            if stream is None:
+                continue
+            thread = threading.Thread(target=target, args=(stream,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _publish(self, block):
+        stats = {}
+        for key in _INT_FIELDS:
+            if key in block:
+                try:
+                    stats[key] = int(block[key])
+                except ValueError:
+                    pass
+        if 'out_time_us' in stats:
+            stats['out_time'] = stats.pop('out_time_us') / 1e6
+        if 'fps' in block:
+            stats['fps'] = _parse_number(block['fps'])
+        if 'speed' in block:
+            stats['speed'] = _parse_number(block['speed'], 'x')
+        if 'bitrate' in block:
+            stats['bitrate_kbps'] = _parse_number(block['bitrate'], 'kbits/s')
+        # 多路输出时每个输出流的量化参数，键为 "输出序号:流序号"
+        stream_q = {key[len('stream_'):-len('_q')].replace('_', ':'): _parse_number(value)
+                    for key, value in block.items() if key.startswith('stream_') and key.endswith('_q')}
+        if stream_q:
+            stats['stream_q'] = stream_q
+        cpu_seconds = process_cpu_seconds(self.process.pid)
+        if cpu_seconds is not None:
+            stats['cpu_seconds'] = cpu_seconds
+        with self._lock:
+            self._stats.update(stats)
+            self._stats['updates'] += 1
+            self._stats['ended'] = block.get('progress') == 'end'
+            self._updated_at = time.monotonic()
+            self._lock.notify_all()
+
+    def _read_progress(self, stream):
+        block = {}
+        try:
+            for raw in iter(stream.readline, b''):
+                key, _, value = raw.decode('utf-8', 'replace').strip().partition('=')
+                if not key:
+                    continue
+                block[key] = value
+                if key == 'progress':
+                    self._publish(block)
+                    block = {}
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._stats['ended'] = True
+                self._lock.notify_all()
+
+    def _read_log(self, stream):
+        try:
+            # ffmpeg 的状态行以 \r 结尾，按 \n 和 \r 都切分
+            pending = b''
+            for chunk in iter(lambda: stream.read1(4096), b''):
+                pending += chunk
+                lines = pending.replace(b'\r', b'\n').split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    if line:
+                        self._log.append(line.decode('utf-8', 'replace'))
+            if pending:
+                self._log.append(pending.decode('utf-8', 'replace'))
+        except (OSError, ValueError):
+            pass
+
+    def wait_update(self, timeout=None):
+        """等待下一次进度更新，返回是否收到更新（ffmpeg 已结束时立即返回 False）"""
+        with self._lock:
+            if self._stats['ended']:
+                return False
+            updates = self._stats['updates']
+            self._lock.wait_for(lambda: self._stats['updates'] != updates or self._stats['ended'],
+                                timeout)
+            return self._stats['updates'] != updates
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['age'] = (time.monotonic() - self._updated_at
+                            if self._updated_at is not None else None)
+        stats['log_lines'] = len(self._log)
+        return stats
+
+    def log_tail(self, lines=20):
+        """stderr 最近的若干行"""
+        return list(self._log)[-lines:]
+
+    def join(self, timeout=2.0):
+        """等待读取线程在 ffmpeg 退出后结束"""
+        for thread in self._threads:
+            thread.join(timeout)
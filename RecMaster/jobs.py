@@ -0,0 +1,155 @@
+# 后台任务：录制停止后的收尾（停止编码器、合并音视频、后处理）在工作线程中执行，不阻塞界面
+import itertools
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .encoder_telemetry import EncoderTelemetry, PROGRESS_ARGS
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+class Job:
+    """按顺序执行的若干步骤 [(名称, 函数)]
+
+    每个函数以 (job, 上一步的结果) 调用，返回值传给下一步，最后一步的结果为 job.result。
+    步骤之间检查取消；run_process 启动的 ffmpeg 在取消时被结束。
+    on_done(job) 在任务结束（完成、失败或取消）后在工作线程中调用。
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, name, steps, on_done=None):
+        self.id = next(self._ids)
+        self.name = name
+        self.steps = list(steps)
+        self.on_done = on_done
+        self.status = 'queued'
+        self.step = None
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._step_index = 0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._process = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """请求取消：还没开始的步骤不再执行，正在运行的 ffmpeg 被结束"""
+        self._cancel.set()
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.kill()
+
+    def set_progress(self, fraction):
+        """当前步骤的进度 (0-1)，换算为整个任务的进度"""
+        fraction = max(0.0, min(1.0, fraction))
+        self.progress = (self._step_index + fraction) / len(self.steps)
+
+    def run_process(self, cmd, duration=None):
+        """运行 ffmpeg 命令，可被 cancel 结束；返回 (returncode, stderr 最后几行)
+
+        duration 为输出的预计时长（秒），给出时按 -progress 的输出时长更新进度。
+        """
+        if self.cancelled:
+            raise JobCancelled()
+        if duration:
+            cmd = cmd[:-1] + PROGRESS_ARGS + cmd[-1:]
+        with self._lock:
+            self._process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL,
+                                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process = self._process
+        telemetry = EncoderTelemetry(process)
+        while telemetry.wait_update(timeout=1.0) or not telemetry.get_stats()['ended']:
+            if duration:
+                self.set_progress(telemetry.get_stats()['out_time'] / duration)
+        process.wait()
+        telemetry.join()
+        with self._lock:
+            self._process = None
+        if self.cancelled:
+            raise JobCancelled()
+        return process.returncode, '\n'.join(telemetry.log_tail(10))
+
+    def run(self):
+        if self.cancelled:
+            self.status = 'cancelled'
+        else:
+            self.status = 'running'
+            self.started = time.time()
+            result = None
+            try:
+                for self._step_index, (self.step, function) in enumerate(self.steps):
+                    if self.cancelled:
+                        raise JobCancelled()
+                    self.set_progress(0.0)
+                    result = function(self, result)
+                self.result = result
+                self.progress = 1.0
+                self.status = 'done'
+            except JobCancelled:
+                self.status = 'cancelled'
+            except Exception as e:
+                self.error = str(e)
+                self.status = 'failed'
+                print(f"[Jobs] {self.name} 在 {self.step} 失败: {e}")
+        self.finished = time.time()
+        if self.on_done:
+            self.on_done(self)
+        return self
+
+class JobPool:
+    """最多 workers 个任务同时执行，其余排队
+
+    连续录制时上一段录制的收尾与下一段录制同时进行。
+    """
+    def __init__(self, workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        with self._lock:
+            self._jobs.append(job)
+        self._executor.submit(job.run)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def pending(self):
+        """排队和正在执行的任务"""
+        return [job for job in self.jobs() if job.status in ('queued', 'running')]
+
+    def cancel(self, job_id=None):
+        """取消指定的任务，job_id 为空时取消所有未结束的任务"""
+        for job in self.pending():
+            if job_id is None or job.id == job_id:
+                job.cancel()
+
+    def wait(self, timeout=None):
+        """等待所有任务结束，返回是否全部结束"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def get_stats(self):
+        jobs = self.jobs()
+        stats = {status: sum(1 for job in jobs if job.status == status)
+                 for status in ('queued', 'running', 'done', 'failed', 'cancelled')}
+        stats['running_jobs'] = [{'id': job.id, 'name': job.name, 'step': job.step, 'progress': job.progress}
+                                 for job in jobs if job.status == 'running']
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,227 @@
+# 分段合并：每个视频分段关闭后立即与对应的音频片段封装，停止时只需无损拼接
+import csv
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .timeline import read_timestamps, timestamps_filename
+from .wav_writer import committed_duration, wav_format
+
+# 分段中的音频保持为 PCM，拼接时整条音轨只编码一次 AAC，分段边界没有编码器预填充造成的缝隙
+SEGMENT_AUDIO_ARGS = ['-c:a', 'pcm_f32le']
+# aresample=async 按时间戳补齐分段中音频开始前和结束后的空档
+FINAL_AUDIO_ARGS = ['-af', 'aresample=async=1:first_pts=0', '-c:a', 'aac', '-b:a', '192k']
+
+def concat_files(entries, output_file, codec_args=('-c', 'copy')):
+    """用 concat demuxer 拼接 [(文件, outpoint 秒或 None)]，返回 (是否成功, stderr)
+
+    默认无损拼接，codec_args 可以指定重新编码部分流。
+    """
+    list_file = os.path.splitext(output_file)[0] + '_parts.txt'
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for path, outpoint in entries:
+            path = os.path.abspath(path).replace('\\', '/').replace("'", r"'\''")
+            f.write(f"file '{path}'\n")
+            if outpoint is not None:
+                f.write(f"outpoint {outpoint:.3f}\n")
+    result = subprocess.run(
+        ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file,
+         *codec_args, output_file],
+        capture_output=True, text=True
+    )
+    if result.returncode:
+        return False, result.stderr
+    os.remove(list_file)
+    return True, result.stderr
+
+def read_segment_list(list_file):
+    """读取 ffmpeg segment 复用器写出的 CSV 列表，返回已关闭的分段 [{'file', 'start', 'end'}]"""
+    segments = []
+    if not os.path.exists(list_file):
+        return segments
+    base_dir = os.path.dirname(list_file)
+    with open(list_file, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                # 最后一行可能还没写完
+                continue
+            try:
+                start, end = float(row[1]), float(row[2])
+            except ValueError:
+                continue
+            segments.append({'file': os.path.join(base_dir, row[0]), 'start': start, 'end': end})
+    return segments
+
+def audio_offset(audio_file, video_start_time, audio_start_time=None):
+    """音轨零点相对视频开始的秒数
+
+    优先读取音频旁边的时间戳文件，没有时（例如混音文件）使用 audio_start_time（音频管理器的开始时间）。
+    """
+    if not video_start_time:
+        return 0.0
+    sidecar = timestamps_filename(audio_file)
+    if os.path.exists(sidecar):
+        metadata, _ = read_timestamps(sidecar, metadata_only=True)
+        audio_start_time = metadata.get('start_time', audio_start_time)
+    if not audio_start_time:
+        return 0.0
+    return audio_start_time - video_start_time
+
+def merge_command(video_file, audio_tracks, output_file):
+    """把录制的音轨 [(文件, 偏移)] 合并到视频文件的 ffmpeg 命令：视频直接复制，多路音轨用 amix 混合"""
+    cmd = ['ffmpeg', '-y', '-i', video_file]
+    # 按录制开始时刻与视频对齐
+    for audio_file, offset in audio_tracks:
+        if offset:
+            cmd.extend(['-itsoffset', f'{offset:.3f}'])
+        cmd.extend(['-i', audio_file])
+    if len(audio_tracks) == 1:
+        # 录制时已经混好音，只需要封装
+        cmd.extend(['-map', '0:v', '-map', '1:a'])
+    elif audio_tracks:
+        streams = ''.join(f'[{i + 1}:a]' for i in range(len(audio_tracks)))
+        cmd.extend([
+            '-filter_complex', f'{streams}amix=inputs={len(audio_tracks)}:duration=longest[aout]',
+            '-map', '0:v',
+            '-map', '[aout]',
+        ])
+    cmd.extend(['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k', output_file])
+    return cmd
+
+def mux_segment(video_file, audio_tracks, start, duration, output_file):
+    """把一个视频分段与各音轨中对应的片段封装为 output_file（Matroska）
+
+    audio_tracks 为 [(音频文件, 偏移)]，偏移为音轨零点相对视频开始的秒数（同 merge_audio_video）。
+    音频按 -ss 定位，WAV 的定位不需要读取之前的数据，所以耗时只与分段长度有关。
+    音频以 PCM 写入，由 SegmentMerger.finish 拼接时统一编码。
+    """
+    cmd = ['ffmpeg', '-y', '-i', video_file]
+    for audio_file, offset in audio_tracks:
+        audio_start = start - offset
+        if audio_start + duration <= 0:
+            # 音频在这个分段结束之后才开始：用同格式的静音代替，保持各分段的流一致
+            channels, sample_rate = wav_format(audio_file) or (2, 48000)
+            layout = {1: 'mono', 2: 'stereo'}.get(channels, f'{channels}c')
+            cmd.extend(['-f', 'lavfi', '-t', f'{duration:.3f}',
+                        '-i', f'anullsrc=r={sample_rate}:cl={layout}'])
+            continue
+        if audio_start < 0:
+            # 音频晚于这个分段开始，前面留空
+            cmd.extend(['-itsoffset', f'{-audio_start:.3f}', '-t', f'{duration + audio_start:.3f}'])
+        else:
+            cmd.extend(['-ss', f'{audio_start:.3f}', '-t', f'{duration:.3f}'])
+        cmd.extend(['-i', audio_file])
+    if len(audio_tracks) == 1:
+        cmd.extend(['-map', '0:v', '-map', '1:a'])
+    elif audio_tracks:
+        streams = ''.join(f'[{i + 1}:a]' for i in range(len(audio_tracks)))
+        cmd.extend([
+            '-filter_complex', f'{streams}amix=inputs={len(audio_tracks)}:duration=longest[aout]',
+            '-map', '0:v',
+            '-map', '[aout]',
+        ])
+    cmd.extend(['-c:v', 'copy', *SEGMENT_AUDIO_ARGS, output_file])
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+class SegmentMerger:
+    """分段录制的音视频合并
+
+    ScreenRecorder(segment_seconds=...) 按固定时长写视频分段并把关闭的分段记录在
+    segment_list_file 中。SegmentMerger 在后台轮询该列表，每个分段关闭且音轨已经
+    写到分段结束时（见 wav_writer.committed_duration），在 workers 个线程的池中
+    与音频片段封装。finish 在视频和音频都停止后合并剩下的分段，再拼接为 output_file：
+    视频直接复制，PCM 音频整体编码一次 AAC，停止到文件可用的时间主要取决于音频编码，
+    远快于重新合并整个视频。
+    """
+    def __init__(self, recorder, audio_tracks, output_file, workers=2, poll_interval=1.0):
+        self.recorder = recorder
+        self.audio_tracks = list(audio_tracks)
+        self.output_file = output_file
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._jobs = {}
+        self._audio_done = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.stats = {
+            'segments_merged': 0,
+            'merge_seconds': 0.0,
+            'audio_wait_seconds': 0.0,
+            'failed': [],
+        }
+
+    def start(self):
+        # 由 SegmentMerger 负责拼接，ScreenRecorder 停止时保留分段
+        self.recorder.keep_segments = True
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self._submit_closed()
+
+    def _submit_closed(self):
+        for segment in read_segment_list(self.recorder.segment_list_file):
+            if segment['file'] not in self._jobs:
+                self._jobs[segment['file']] = self._pool.submit(self._merge, segment)
+
+    def _audio_covers(self, seconds):
+        """各音轨是否已经写到视频时间 seconds"""
+        for audio_file, offset in self.audio_tracks:
+            duration = committed_duration(audio_file)
+            if duration is not None and duration < seconds - offset:
+                return False
+        return True
+
+    def _merge(self, segment):
+        wait_start = time.perf_counter()
+        while not self._audio_done.is_set() and not self._audio_covers(segment['end']):
+            self._audio_done.wait(self.poll_interval)
+        self.stats['audio_wait_seconds'] += time.perf_counter() - wait_start
+
+        merge_start = time.perf_counter()
+        output_file = os.path.splitext(segment['file'])[0] + '_av.mkv'
+        result = mux_segment(segment['file'], self.audio_tracks, segment['start'],
+                             segment['end'] - segment['start'], output_file)
+        self.stats['merge_seconds'] += time.perf_counter() - merge_start
+        if result.returncode:
+            print(f"[Merge] 分段合并失败 {segment['file']}: {result.stderr[-300:]}")
+            self.stats['failed'].append(segment['file'])
+            return None
+        self.stats['segments_merged'] += 1
+        print(f"[Merge] {os.path.basename(output_file)} "
+              f"({segment['start']:.1f}s - {segment['end']:.1f}s)")
+        return output_file
+
+    def finish(self):
+        """视频和音频都停止后调用：合并剩余分段并拼接，返回最终文件；失败时返回 None"""
+        self._audio_done.set()
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self._submit_closed()
+        segments = read_segment_list(self.recorder.segment_list_file)
+        merged = [self._jobs[segment['file']].result() for segment in segments]
+        self._pool.shutdown()
+        if not merged or None in merged:
+            print("[Merge] 有分段合并失败，保留分段文件")
+            return None
+        ok, stderr = concat_files([(path, None) for path in merged], self.output_file,
+                                  codec_args=['-c:v', 'copy', *FINAL_AUDIO_ARGS])
+        if not ok:
+            print(f"[Merge] 拼接失败，保留分段文件: {stderr[-500:]}")
+            return None
+        for path in merged:
+            os.remove(path)
+        for segment in segments:
+            os.remove(segment['file'])
+        os.remove(self.recorder.segment_list_file)
+        self.recorder.clear_marker()
+        return self.output_file
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['segments_closed'] = len(self._jobs)
+        stats['pending'] = sum(1 for job in self._jobs.values() if not job.done())
+        return stats
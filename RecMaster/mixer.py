@@ -0,0 +1,236 @@
+# 录制过程中实时混合多个设备的音频
+import threading
+import numpy as np
+from .ring_buffer import RingBuffer
+from .sample_format import PacketConverter
+
+def channel_matrix(in_channels, out_channels):
+    """声道映射矩阵：相同声道数直通，单声道复制到所有声道，其余按序号折叠后取平均"""
+    matrix = np.zeros((in_channels, out_channels), dtype=np.float32)
+    if in_channels == 1:
+        matrix[0, :] = 1.0
+        return matrix
+    for ch in range(in_channels):
+        matrix[ch, ch % out_channels] = 1.0
+    # 折叠到同一输出声道的输入取平均，避免削波
+    matrix /= np.maximum(matrix.sum(axis=0), 1.0)
+    return matrix
+
+class TeeSink:
+    """把同一份数据写给多个 sink"""
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def writeframes(self, data):
+        for sink in self.sinks:
+            sink.writeframes(data)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+class MixerInput:
+    """混音器的一路输入，实现 writeframes/close，可以直接作为设备写线程的 sink
+
+    写入的整数 PCM 数据转换为 float32 后放入该输入自己的环形缓冲区。
+    缓冲区满时这段数据被丢弃，之后的写入先补上同样长度的静音，保持与其他输入的帧对齐。
+    """
+    def __init__(self, mixer, name, channels, sample_width, gain=1.0):
+        self.mixer = mixer
+        self.name = name
+        self.channels = channels
+        self.gain = gain
+        self.frame_bytes = channels * 4
+        self.matrix = channel_matrix(channels, mixer.channels)
+        self.weighted = self.matrix * np.float32(gain)
+        self._staging = np.empty((mixer.block_frames, channels), dtype=np.float32)
+        self.closed = False
+        # 落后太多时已经按静音混合的帧数，数据到达后丢弃
+        self.skip_frames = 0
+        # 缓冲区满时丢弃的帧数，下次写入前先写入同样长度的静音
+        self._pending_silence = 0
+        self._zeros = np.zeros((mixer.block_frames, channels), dtype=np.float32)
+        self.ring = RingBuffer(int(mixer.buffer_seconds * mixer.sample_rate) * self.frame_bytes,
+                               name=f'混音输入 {name}')
+        self._converter = PacketConverter({
+            'channels': channels,
+            'sample_rate': mixer.sample_rate,
+            'bits_per_sample': sample_width * 8,
+            'is_float': False
+        }, target='float32')
+        self.stats = {
+            'frames_in': 0,
+            'late_frames': 0,
+            'dropped_frames': 0,
+        }
+
+    def _write_pending_silence(self):
+        """写入之前丢弃的帧对应的静音，缓冲区放不下时返回 False"""
+        while self._pending_silence:
+            free = (self.ring.capacity - self.ring.fill()) // self.frame_bytes
+            frames = min(self._pending_silence, len(self._zeros), free)
+            if frames <= 0 or not self.ring.write(self._zeros[:frames]):
+                return False
+            self._pending_silence -= frames
+        return True
+
+    def writeframes(self, data):
+        raw = np.frombuffer(data, dtype=np.uint8)
+        samples = raw.size // self._converter.bytes_per_sample
+        frames = samples // self.channels
+        floats, _ = self._converter.convert_array(raw, samples)
+        if not (self._write_pending_silence() and self.ring.write(floats)):
+            # 缓冲区满：这段数据按静音补齐，之后的帧仍然与其他输入对齐
+            self._pending_silence += frames
+            self.stats['dropped_frames'] += frames
+        self.stats['frames_in'] += frames
+        self.mixer.wake()
+
+    def close(self):
+        self.closed = True
+        self.mixer.wake()
+
+    def available_frames(self):
+        return self.ring.fill() // self.frame_bytes
+
+class StreamMixer:
+    """把多路设备流按样本位置对齐、加权混合成一路，写入 sink
+
+    各输入的第 n 帧视为同一时刻（采集循环已经用静音填平了空档）。
+    某一路落后最快的一路超过 latency 秒时，按静音混合该路缺失的部分，
+    之后到达的对应数据被丢弃并计入 late_frames。
+    normalize=True 时增益按总和归一化，与 ffmpeg amix 的默认行为一致。
+    """
+    def __init__(self, sink, sample_rate, channels=2, sample_width=2, latency=0.5,
+                 block_seconds=0.05, buffer_seconds=4.0, normalize=True):
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.latency_frames = int(latency * sample_rate)
+        self.block_seconds = block_seconds
+        self.block_frames = max(1, int(block_seconds * sample_rate))
+        self.buffer_seconds = buffer_seconds
+        self.normalize = normalize
+        self.inputs = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+        self._acc = np.zeros((self.block_frames, channels), dtype=np.float32)
+        self._mixed = np.empty((self.block_frames, channels), dtype=np.float32)
+        self._output = PacketConverter({
+            'channels': channels,
+            'sample_rate': sample_rate,
+            'bits_per_sample': 32,
+            'is_float': True
+        }, target={2: 'int16', 3: 'int24', 4: 'int32'}[sample_width], max_frames=self.block_frames)
+        self.stats = {
+            'frames_mixed': 0,
+            'blocks': 0,
+        }
+
+    def add_input(self, name, channels, sample_width, gain=1.0):
+        """添加一路输入，返回可以作为 sink 的 MixerInput"""
+        mixer_input = MixerInput(self, name, channels, sample_width, gain)
+        self.inputs.append(mixer_input)
+        return mixer_input
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        total = sum(inp.gain for inp in self.inputs)
+        for inp in self.inputs:
+            weight = inp.gain / total if self.normalize and total > 0 else inp.gain
+            inp.weighted = inp.matrix * np.float32(weight)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止混音线程：剩余数据全部混合，短的输入补静音，然后关闭 sink
+
+        timeout 秒内没有结束时（例如 sink 是读端不再读取的管道）调用 sink 的 abort（如果有），
+        放弃剩余数据后再等待 timeout 秒。
+        """
+        for inp in self.inputs:
+            inp.closed = True
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f"[Audio] 混音线程 {timeout}s 内没有结束，放弃剩余数据")
+                abort = getattr(self.sink, 'abort', None)
+                if abort is not None:
+                    abort()
+                    self._thread.join(timeout)
+        self.sink.close()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.block_seconds)
+                self._wake.clear()
+                self._mix_available(final=False)
+            self._mix_available(final=True)
+        except Exception as e:
+            self.error = e
+            print(f"[Audio] Mixer error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+    def _frames_to_mix(self, final):
+        available = [inp.available_frames() - inp.skip_frames for inp in self.inputs]
+        newest = max(available) if available else 0
+        if final:
+            return max(newest, 0)
+        # 已关闭的输入不再等待
+        waiting = [n for inp, n in zip(self.inputs, available) if not inp.closed]
+        ready = min(waiting) if waiting else newest
+        # 落后超过 latency 的输入按静音处理
+        return max(ready, newest - self.latency_frames, 0)
+
+    def _drop_late(self, inp):
+        """丢弃已经按静音混合过的迟到数据"""
+        while inp.skip_frames > 0:
+            frames = min(inp.skip_frames, inp.available_frames(), self.block_frames)
+            if frames <= 0:
+                return
+            size = inp.ring.read_into(inp._staging.reshape(-1).view(np.uint8),
+                                      frames * inp.frame_bytes, inp.frame_bytes)
+            inp.skip_frames -= size // inp.frame_bytes
+
+    def _mix_available(self, final):
+        for inp in self.inputs:
+            self._drop_late(inp)
+        remaining = self._frames_to_mix(final)
+        while remaining > 0:
+            frames = min(remaining, self.block_frames)
+            acc = self._acc[:frames]
+            acc.fill(0)
+            for inp in self.inputs:
+                staging = inp._staging
+                size = inp.ring.read_into(staging.reshape(-1).view(np.uint8),
+                                          frames * inp.frame_bytes, inp.frame_bytes)
+                got = size // inp.frame_bytes
+                if got:
+                    mixed = self._mixed[:got]
+                    np.matmul(staging[:got], inp.weighted, out=mixed)
+                    np.add(acc[:got], mixed, out=acc[:got])
+                if got < frames and not final and not inp.closed:
+                    inp.skip_frames += frames - got
+                    inp.stats['late_frames'] += frames - got
+
+            data, _ = self._output.convert_array(acc.reshape(-1).view(np.uint8),
+                                                 frames * self.channels)
+            self.sink.writeframes(data)
+            self.stats['frames_mixed'] += frames
+            self.stats['blocks'] += 1
+            remaining -= frames
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['inputs'] = {inp.name: dict(inp.stats, gain=inp.gain, overflows=inp.ring.stats['overflows'])
+                           for inp in self.inputs}
+        return stats
@@ -0,0 +1,299 @@
+# 单次录制直接输出带音轨的视频：混音数据经管道送入录屏的 ffmpeg 进程，停止后无需合并
+import errno
+import itertools
+import os
+import select
+import shutil
+import tempfile
+import time
+from .capture_backend import qpc_now
+
+try:
+    import win32event
+    import win32file
+    import win32pipe
+    import pywintypes
+except ImportError:
+    win32event = win32file = win32pipe = pywintypes = None
+
+ERROR_IO_PENDING = 997
+ERROR_PIPE_CONNECTED = 535
+
+# 等待连接和写入时检查 abort 的间隔（毫秒）
+_WAIT_SLICE_MS = 100
+
+# 读端关闭后写入管道时的异常
+_PIPE_ERRORS = (OSError,) if pywintypes is None else (OSError, pywintypes.error)
+
+# 写入管道的样本格式对应的 ffmpeg 原始音频格式
+PIPE_FORMATS = {
+    'int16': 's16le',
+    'int24': 's24le',
+    'int32': 's32le',
+    'float32': 'f32le',
+}
+
+_pipe_ids = itertools.count()
+
+class AudioPipe:
+    """供 ffmpeg 读取的原始 PCM 管道，接口与 wave 写对象的 writeframes/close 相同
+
+    POSIX 上为临时目录中的 FIFO，Windows 上为命名管道 \\\\.\\pipe\\recmaster_<pid>_<n>。
+    第一次 writeframes 时连接读端（最多等待 connect_timeout 秒），
+    写入在管道满时等待，由 ffmpeg 的读取速度形成背压。
+    ffmpeg 退出后写入的数据被丢弃并计入统计，不会让写线程出错；close 后 ffmpeg 读到 EOF。
+    连接和写入都不会无限阻塞：Windows 上使用重叠 I/O 等待事件，POSIX 上 FIFO 为非阻塞并用 select 等待，
+    abort() 之后等待中的线程在 0.1 秒内返回。
+    """
+    def __init__(self, sample_format='int16', sample_rate=48000, channels=2,
+                 connect_timeout=5.0):
+        if sample_format not in PIPE_FORMATS:
+            raise ValueError(f"不支持的管道样本格式: {sample_format}")
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.connect_timeout = connect_timeout
+        self._fd = None
+        self._handle = None
+        self._tmpdir = None
+        self._broken = False
+        self._closed = False
+        self._aborted = False
+        self.stats = {
+            'bytes_written': 0,
+            'bytes_dropped': 0,
+            'write_calls': 0,
+        }
+        if os.name == 'nt':
+            if win32pipe is None:
+                raise RuntimeError("Windows 上的音频管道需要 pywin32")
+            self.path = rf'\\.\pipe\recmaster_{os.getpid()}_{next(_pipe_ids)}'
+            self._handle = win32pipe.CreateNamedPipe(
+                self.path,
+                win32pipe.PIPE_ACCESS_OUTBOUND | win32file.FILE_FLAG_OVERLAPPED,
+                win32pipe.PIPE_TYPE_BYTE | win32pipe.PIPE_WAIT,
+                1, 1024 * 1024, 1024 * 1024, 0, None
+            )
+            # 连接和写入共用一个 OVERLAPPED（同一时刻只有写线程在操作管道）
+            self._overlapped = pywintypes.OVERLAPPED()
+            self._overlapped.hEvent = win32event.CreateEvent(None, True, False, None)
+            self._connected = False
+        else:
+            self._tmpdir = tempfile.mkdtemp(prefix='recmaster_')
+            self.path = os.path.join(self._tmpdir, 'audio.pcm')
+            os.mkfifo(self.path)
+
+    def input_args(self):
+        """ffmpeg 读取此管道的输入参数"""
+        return [
+            '-thread_queue_size', '1024',
+            '-f', PIPE_FORMATS[self.sample_format],
+            '-ar', str(self.sample_rate),
+            '-ac', str(self.channels),
+            '-i', self.path,
+        ]
+
+    def _wait_overlapped(self, deadline=None):
+        """等待重叠操作完成，返回传输的字节数；超过 deadline 或 abort 时取消操作并返回 None"""
+        while True:
+            if win32event.WaitForSingleObject(self._overlapped.hEvent, _WAIT_SLICE_MS) == win32event.WAIT_OBJECT_0:
+                return win32file.GetOverlappedResult(self._handle, self._overlapped, False)
+            if self._aborted or (deadline is not None and time.monotonic() >= deadline):
+                win32file.CancelIo(self._handle)
+                # 取消完成之后 OVERLAPPED 才能再次使用
+                try:
+                    win32file.GetOverlappedResult(self._handle, self._overlapped, True)
+                except pywintypes.error:
+                    pass
+                return None
+
+    def _connect(self):
+        """等待 ffmpeg 打开读端，超时或 abort 时返回 False"""
+        if self._handle is not None:
+            if not self._connected:
+                win32event.ResetEvent(self._overlapped.hEvent)
+                try:
+                    result = win32pipe.ConnectNamedPipe(self._handle, self._overlapped)
+                except pywintypes.error as e:
+                    print(f"[Audio] 等待音频管道连接失败: {str(e)}")
+                    return False
+                # ERROR_PIPE_CONNECTED：读端在 ConnectNamedPipe 之前已经打开
+                if result == ERROR_IO_PENDING and \
+                        self._wait_overlapped(time.monotonic() + self.connect_timeout) is None:
+                    print(f"[Audio] ffmpeg 在 {self.connect_timeout}s 内没有打开音频管道")
+                    return False
+                self._connected = True
+            return True
+        if self._fd is not None:
+            return True
+        # 非阻塞打开在没有读端时立即返回 ENXIO，按超时重试
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+                break
+            except OSError as e:
+                if e.errno != errno.ENXIO or self._aborted or time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.01)
+        # 保持非阻塞，管道满时在 _write_fd 中等待，才能被 abort 打断
+        self._fd = fd
+        return True
+
+    def _write_handle(self, mv):
+        win32event.ResetEvent(self._overlapped.hEvent)
+        win32file.WriteFile(self._handle, mv, self._overlapped)
+        return self._wait_overlapped()
+
+    def _write_fd(self, mv):
+        while True:
+            try:
+                return os.write(self._fd, mv)
+            except BlockingIOError:
+                if self._aborted:
+                    return None
+                select.select([], [self._fd], [], _WAIT_SLICE_MS / 1000)
+
+    def writeframes(self, data):
+        mv = memoryview(data)
+        if mv.format != 'B' or mv.ndim != 1:
+            mv = mv.cast('B')
+        if self._broken or self._closed or self._aborted or not self._connect():
+            self._broken = True
+            self.stats['bytes_dropped'] += mv.nbytes
+            return
+        self.stats['write_calls'] += 1
+        try:
+            while mv.nbytes:
+                if self._handle is not None:
+                    written = self._write_handle(mv)
+                else:
+                    written = self._write_fd(mv)
+                if written is None:
+                    # abort：读端不再读取，放弃剩余数据
+                    self._broken = True
+                    self.stats['bytes_dropped'] += mv.nbytes
+                    return
+                self.stats['bytes_written'] += written
+                mv = mv[written:]
+        except _PIPE_ERRORS as e:
+            print(f"[Audio] 音频管道已断开: {str(e)}")
+            self._broken = True
+            self.stats['bytes_dropped'] += mv.nbytes
+
+    def abort(self):
+        """放弃剩余数据：等待连接或写入的线程在 0.1 秒内返回，之后的写入计入 bytes_dropped
+
+        可以在其他线程中调用，例如混音线程没有按时结束、ffmpeg 已经退出时。
+        """
+        self._aborted = True
+
+    def close(self):
+        """关闭写端，ffmpeg 读到 EOF 后结束音频流"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._handle is not None:
+            # abort 之后读端可能不再读取，FlushFileBuffers 会一直等待
+            if self._connected and not self._aborted:
+                try:
+                    win32file.FlushFileBuffers(self._handle)
+                    win32pipe.DisconnectNamedPipe(self._handle)
+                except pywintypes.error:
+                    pass
+            win32file.CloseHandle(self._handle)
+            self._handle = None
+            return
+        if self._fd is None:
+            # 从未写入时也打开一次写端，避免 ffmpeg 阻塞在打开 FIFO 上
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                pass
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['broken'] = self._broken
+        stats['aborted'] = self._aborted
+        return stats
+
+class MuxedRecording:
+    """录屏与音频在同一个 ffmpeg 进程中编码封装
+
+    所有音频设备在采集过程中混合（见 StreamMixer），混音结果写入 AudioPipe，
+    录屏的 ffmpeg 同时读取屏幕和管道，直接输出最终的 mp4。
+    音轨时间线以启动 ffmpeg 的时刻为零点，与视频第一帧的偏差为 ffmpeg 打开屏幕输入的耗时。
+    停止时先停止音频（管道 EOF），再让 ffmpeg 结束，不需要再次读写整个文件。
+    """
+    def __init__(self, recorder, audio_manager, sample_rate=48000):
+        self.recorder = recorder
+        self.audio_manager = audio_manager
+        self.sample_rate = sample_rate
+        self.pipe = None
+        self.output_file = None
+        self.start_qpc = None
+        self._stop_start = None
+        self.stats = {}
+
+    def start(self, start_x, start_y, end_x, end_y, selected_outputs=None, selected_input=None,
+              path_manager=None, mix_gains=None):
+        """启动录屏和音频采集，返回录制区域；录屏启动失败时返回 None"""
+        self.pipe = AudioPipe('int16', self.sample_rate, self.audio_manager.mix_channels)
+        self.output_file = path_manager.get_merged_filename()
+        self.start_qpc = qpc_now()
+        recording_area = self.recorder.start_recording(start_x, start_y, end_x, end_y,
+                                                       audio_inputs=[self.pipe],
+                                                       output_file=self.output_file)
+        if not recording_area:
+            self.pipe.close()
+            return None
+        # 容器为 mkv 时扩展名由录屏器改写
+        self.output_file = self.recorder.output_file
+        try:
+            self.audio_manager.start_recording(
+                selected_outputs=selected_outputs,
+                selected_input=selected_input,
+                path_manager=path_manager,
+                mix_gains=mix_gains,
+                mix_sink=self.pipe,
+                sample_rate=self.sample_rate,
+                start_qpc=self.start_qpc
+            )
+        except Exception:
+            self.pipe.close()
+            self.recorder.stop_recording()
+            raise
+        return recording_area
+
+    def stop_audio(self):
+        """停止音频采集：音频补齐到停止时刻后关闭管道，ffmpeg 的音频流结束
+
+        之后音频管理器可以开始下一次录制，finish 可以在其他线程中执行。
+        """
+        self._stop_start = time.perf_counter()
+        process = self.recorder.process
+        if process is not None and process.poll() is not None:
+            # ffmpeg 已经退出：管道没有读端，先放弃剩余音频，混音线程不会阻塞在连接或写入上
+            print("[Muxed] ffmpeg 已退出，放弃剩余音频")
+            self.pipe.abort()
+        self.audio_manager.stop_recording()
+        self.pipe.close()
+
+    def finish(self):
+        """stop_audio 之后结束 ffmpeg，返回输出文件；停止到文件可用的耗时记录在 stats['finalize_seconds']"""
+        self.recorder.stop_recording()
+        self.stats = {
+            'finalize_seconds': time.perf_counter() - self._stop_start,
+            'pipe': self.pipe.get_stats(),
+        }
+        print(f"[Muxed] {self.output_file} ready in {self.stats['finalize_seconds']:.2f}s")
+        return self.output_file
+
+    def stop(self):
+        """停止录制，返回输出文件"""
+        self.stop_audio()
+        return self.finish()
@@ -0,0 +1,162 @@
+# 崩溃恢复：录制期间在输出文件旁写标记文件，下次启动时修复没有正常结束的录制
+import argparse
+import glob
+import json
+import os
+import subprocess
+import time
+from .merge import concat_files
+
+try:
+    import win32api
+    import win32con
+except ImportError:
+    win32api = win32con = None
+
+MARKER_SUFFIX = '.recording'
+
+def marker_filename(output_file):
+    return output_file + MARKER_SUFFIX
+
+def write_marker(output_file, info):
+    """写入（或覆盖）output_file 的录制标记；先写临时文件再替换，崩溃时不会留下半个标记"""
+    marker = marker_filename(output_file)
+    tmp = marker + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(dict(info, output_file=os.path.abspath(output_file)), f, ensure_ascii=False)
+    os.replace(tmp, marker)
+
+def remove_marker(output_file):
+    try:
+        os.remove(marker_filename(output_file))
+    except FileNotFoundError:
+        pass
+
+def _pid_alive(pid):
+    """进程是否仍在运行（标记中的 ffmpeg 还在运行说明录制没有中断）"""
+    if not pid:
+        return False
+    try:
+        if win32api is not None:
+            handle = win32api.OpenProcess(win32con.PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+            try:
+                # STILL_ACTIVE
+                return win32api.GetExitCodeProcess(handle) == 259
+            finally:
+                win32api.CloseHandle(handle)
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在但属于其他用户
+        return True
+    except Exception:
+        return False
+
+def find_leftovers(directory):
+    """directory 中没有正常结束的录制（只读取标记文件，不探测视频），返回标记内容列表"""
+    leftovers = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return leftovers
+    for entry in entries:
+        if not entry.name.endswith(MARKER_SUFFIX):
+            continue
+        try:
+            with open(entry.path, encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if _pid_alive(info.get('pid')):
+            continue
+        leftovers.append(info)
+    return leftovers
+
+def _parts(info):
+    """录制留下的 MPEG-TS 分段（按时长分段或编码调节重启），返回 concat_files 的 [(文件, outpoint)]"""
+    if info.get('segment_pattern'):
+        pattern = glob.escape(info['segment_pattern']).replace('%03d', '[0-9]' * 3)
+        return [(path, None) for path in sorted(glob.glob(pattern))]
+    runs = [run for run in info.get('runs', [])
+            if run['file'] != info['output_file'] and os.path.exists(run['file'])]
+    # 与 ScreenRecorder._concat_segments 相同，截掉与下一个编码进程重叠的部分
+    return [(run['file'], following['start_time'] - run['start_time'] if following else None)
+            for run, following in zip(runs, runs[1:] + [None])]
+
+def _remux(output_file):
+    """-c copy 重新封装，写出完整的索引和时长；失败时保留原文件"""
+    base, ext = os.path.splitext(output_file)
+    tmp = f'{base}.recovering{ext}'
+    result = subprocess.run(['ffmpeg', '-y', '-i', output_file, '-c', 'copy', tmp],
+                            capture_output=True, text=True)
+    if result.returncode or not os.path.exists(tmp) or os.path.getsize(tmp) == 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False, result.stderr
+    os.replace(tmp, output_file)
+    return True, result.stderr
+
+def recover(info):
+    """修复一个没有正常结束的录制，返回 {'output_file', 'status', 'seconds', 'error'}
+
+    分片 MP4 和 MKV 重新封装即可得到完整文件，内容到最后一个写完的分片为止；
+    MPEG-TS 分段直接拼接；普通 MP4 没有写出 moov 时无法恢复，只报告失败并保留文件。
+    """
+    start = time.perf_counter()
+    output_file = info['output_file']
+    parts = _parts(info)
+    error = None
+    if parts:
+        ok, stderr = concat_files(parts, output_file)
+        if ok:
+            for path, _ in parts:
+                os.remove(path)
+            if info.get('segment_list_file') and os.path.exists(info['segment_list_file']):
+                os.remove(info['segment_list_file'])
+    elif os.path.exists(output_file):
+        ok, stderr = _remux(output_file)
+        # 同时编码的额外输出（见 ScreenRecorder 的 renditions）
+        for path in info.get('renditions', []):
+            if ok and os.path.exists(path):
+                ok, stderr = _remux(path)
+    else:
+        ok, stderr = False, ''
+        error = '没有找到录制文件'
+    if not ok and error is None:
+        error = stderr.strip().splitlines()[-1] if stderr.strip() else 'ffmpeg 失败'
+    marker = marker_filename(output_file)
+    if ok:
+        os.remove(marker)
+    else:
+        # 改名后不再重复尝试，文件留给用户处理
+        os.replace(marker, marker + '.failed')
+    return {
+        'output_file': output_file,
+        'status': 'recovered' if ok else 'failed',
+        'seconds': time.perf_counter() - start,
+        'error': error,
+    }
+
+def recover_directory(directory):
+    """修复 directory 中所有没有正常结束的录制，返回每个录制的结果"""
+    results = []
+    for info in find_leftovers(directory):
+        result = recover(info)
+        print(f"[Recovery] {result['status']}: {result['output_file']} "
+              f"({result['seconds']:.2f}s){' - ' + result['error'] if result['error'] else ''}")
+        results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='修复目录中没有正常结束的录制')
+    parser.add_argument('directory', nargs='?', default=os.path.join(os.path.expanduser('~'), '.rec'))
+    args = parser.parse_args()
+    results = recover_directory(args.directory)
+    if not results:
+        print(f"[Recovery] {args.directory} 中没有需要修复的录制")
+    return 0 if all(result['status'] == 'recovered' for result in results) else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
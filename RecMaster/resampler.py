@@ -0,0 +1,182 @@
+# 录制过程中把设备流统一到同一采样率的流式多相重采样
+from math import gcd
+import numpy as np
+from .sample_format import PacketConverter, SAMPLE_WIDTHS
+
+# 质量等级: (每相抽头数, Kaiser beta, 截止频率相对 Nyquist 的比例)
+RESAMPLE_QUALITIES = {
+    'fast': (8, 5.0, 0.85),
+    'medium': (16, 7.0, 0.9),
+    'high': (32, 9.0, 0.94),
+    'best': (64, 10.0, 0.96),
+}
+
+# 有理数比 up/down 的最大分子，超过时多相滤波器表过大
+MAX_UP = 1024
+
+def design_filter(up, down, quality='medium'):
+    """设计 Kaiser 窗 sinc 低通原型，并拆成 up 个相位，返回 (up, taps) 的 float32 数组
+
+    降采样时按 down/up 加长滤波器，保证截止频率降低后过渡带宽度不变。
+    原型中心位于整数位置 up * taps // 2，对应的群延迟由重采样器补偿。
+    """
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError(f"不支持的重采样质量: {quality}")
+    base_taps, beta, rolloff = RESAMPLE_QUALITIES[quality]
+    taps = int(np.ceil(base_taps * max(1.0, down / up)))
+    length = up * taps
+    # 截止频率以上采样后的采样率为单位
+    cutoff = 0.5 * rolloff * min(1.0, up / down) / up
+    n = np.arange(length, dtype=np.float64) - length // 2
+    prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+    # 零插值后每个相位只有 1/up 的能量，乘以 up 保持增益
+    prototype *= up / prototype.sum()
+    # phases[p, j] = prototype[j * up + p]
+    return np.ascontiguousarray(prototype.reshape(taps, up).T.astype(np.float32))
+
+class PolyphaseResampler:
+    """按块处理的流式多相重采样器，输入输出都是 (帧数, 声道数) 的 float32 数组
+
+    对输出的每一帧计算其在输入中的位置和相位，一次性取出整块的滤波窗口做向量化乘加，
+    块与块之间只保留 taps 帧历史。群延迟已经补偿，输出第 k 帧对应输入时刻 k / out_rate，
+    flush 之后的总输出帧数为 ceil(输入帧数 * out_rate / in_rate)。
+    process 返回的数组在下一次调用前有效。
+    """
+    def __init__(self, in_rate, out_rate, channels, quality='medium'):
+        divisor = gcd(int(in_rate), int(out_rate))
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.quality = quality
+        self.up = int(out_rate) // divisor
+        self.down = int(in_rate) // divisor
+        if self.up > MAX_UP:
+            raise ValueError(f"不支持的采样率转换: {in_rate} -> {out_rate}")
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            self.taps = 1
+            self._phases = np.ones((1, 1), dtype=np.float32)
+        else:
+            self._phases = design_filter(self.up, self.down, quality)
+            self.taps = self._phases.shape[1]
+        self._history = self.taps - 1
+        self._offsets = np.arange(self.taps, dtype=np.int64)
+        self._capacity = 0
+        self._out_capacity = 0
+        self._buf = np.zeros((self._history, channels), dtype=np.float32)
+        self._allocate(1024, 1024)
+        self.reset()
+
+    def reset(self):
+        self._buf[:self._history] = 0
+        # 下一个输出帧在 _buf 中的位置（以 1/up 帧为单位），含群延迟补偿
+        self._position = self._history * self.up + self.up * self.taps // 2
+        self.frames_in = 0
+        self.frames_out = 0
+
+    def _allocate(self, frames, out_frames):
+        if frames > self._capacity:
+            old = self._buf
+            self._capacity = max(frames, 2 * self._capacity)
+            self._buf = np.zeros((self._history + self._capacity, self.channels), dtype=np.float32)
+            self._buf[:self._history] = old[:self._history]
+        if out_frames > self._out_capacity:
+            self._out_capacity = max(out_frames, 2 * self._out_capacity)
+            size = self._out_capacity
+            self._window = np.empty((size, self.taps, self.channels), dtype=np.float32)
+            self._coefs = np.empty((size, 1, self.taps), dtype=np.float32)
+            self._out = np.empty((size, 1, self.channels), dtype=np.float32)
+            self._index = np.empty((size, self.taps), dtype=np.int64)
+
+    def output_frames(self, input_frames):
+        """输入 input_frames 帧后，总共应当输出的帧数"""
+        return -(-input_frames * self.up // self.down)
+
+    def process(self, frames):
+        """重采样一块数据，返回本次可以输出的帧"""
+        frames = frames.reshape(-1, self.channels)
+        self.frames_in += len(frames)
+        if self.passthrough:
+            self.frames_out += len(frames)
+            return frames
+        return self._process(frames)
+
+    def _process(self, frames):
+        count_in = len(frames)
+        end = self._history + count_in
+        # 在 _buf 中可用的最后一帧为 end - 1，计算能输出的帧数
+        limit = end * self.up - self._position
+        count = max(0, -(-limit // self.down))
+        self._allocate(count_in, count)
+        buf = self._buf
+        buf[self._history:end] = frames
+
+        if count:
+            positions = self._position + self.down * np.arange(count, dtype=np.int64)
+            base, phase = np.divmod(positions, self.up)
+            index = self._index[:count]
+            np.subtract(base[:, None], self._offsets, out=index)
+            window = self._window[:count]
+            np.take(buf[:end], index, axis=0, out=window, mode='clip')
+            coefs = self._coefs[:count]
+            np.take(self._phases, phase, axis=0, out=coefs[:, 0, :], mode='clip')
+            out = self._out[:count]
+            np.matmul(coefs, window, out=out)
+            self._position += count * self.down
+
+        # 只保留下一块需要的历史
+        shift = end - self._history
+        buf[:self._history] = buf[shift:end]
+        self._position -= shift * self.up
+        self.frames_out += count
+        return self._out[:count, 0, :]
+
+    def flush(self):
+        """输入结束：用静音推出滤波器中剩余的帧，并截断到准确的总帧数"""
+        if self.passthrough:
+            return np.empty((0, self.channels), dtype=np.float32)
+        frames_in = self.frames_in
+        frames_out = self.frames_out
+        expected = self.output_frames(frames_in)
+        tail = self._process(np.zeros((self.taps, self.channels), dtype=np.float32))
+        self.frames_in = frames_in
+        self.frames_out = expected
+        return tail[:max(0, expected - frames_out)]
+
+class ResamplingSink:
+    """把 sample_format 格式的 PCM 重采样到 out_rate 后写入下一级 sink（WAV 文件或混音输入）
+
+    在写线程中运行，不占用采集线程的时间。
+    """
+    def __init__(self, sink, in_rate, out_rate, channels, sample_format, quality='medium'):
+        self.sink = sink
+        self.channels = channels
+        self.resampler = PolyphaseResampler(in_rate, out_rate, channels, quality)
+        self._decoder = PacketConverter({
+            'channels': channels,
+            'sample_rate': in_rate,
+            'bits_per_sample': SAMPLE_WIDTHS[sample_format] * 8,
+            'is_float': sample_format == 'float32'
+        }, target='float32')
+        self._encoder = PacketConverter({
+            'channels': channels,
+            'sample_rate': out_rate,
+            'bits_per_sample': 32,
+            'is_float': True
+        }, target=sample_format)
+
+    def writeframes(self, data):
+        raw = np.frombuffer(data, dtype=np.uint8)
+        samples = raw.size // self._decoder.bytes_per_sample
+        floats, _ = self._decoder.convert_array(raw, samples)
+        self._write(self.resampler.process(np.frombuffer(floats, dtype=np.float32)))
+
+    def _write(self, frames):
+        if len(frames):
+            out = np.ascontiguousarray(frames).reshape(-1)
+            data, _ = self._encoder.convert_array(out.view(np.uint8), out.size)
+            self.sink.writeframes(data)
+
+    def close(self):
+        self._write(self.resampler.flush())
+        self.sink.close()
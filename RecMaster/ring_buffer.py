@@ -0,0 +1,174 @@
+# 采集线程与磁盘写入之间的环形缓冲区
+import threading
+import time
+
+class RingBuffer:
+    """预分配的单生产者/单消费者字节环形缓冲区
+
+    采集线程调用 write，写线程调用 read_into。两端各自只修改自己的位置计数，
+    在 GIL 下不需要加锁。采集线程永不阻塞：缓冲区满时 write 不写入任何数据、返回 False，
+    计入 overflows/dropped_bytes，每次连续溢出的开始打印一条日志（name 用于区分设备）。
+    没有写入的数据由调用方负责处理，音频采集循环在时间线上回退这段数据，之后以静音补齐，
+    保证文件长度与时间线一致。
+    """
+    def __init__(self, capacity, high_water_mark=0.75, wake_bytes=None, name=None):
+        self.capacity = int(capacity)
+        self.name = name
+        self.high_water_mark = high_water_mark
+        self._high_water_bytes = int(self.capacity * high_water_mark)
+        # 积累到 wake_bytes 时唤醒写线程，最多为容量的一半，保证写线程有机会追上
+        self.wake_bytes = min(wake_bytes or self.capacity // 4, self.capacity // 2)
+        self._buf = bytearray(self.capacity)
+        self._view = memoryview(self._buf)
+        self._write_pos = 0
+        self._read_pos = 0
+        self._above_high_water = False
+        self._overflowing = False
+        self.data_ready = threading.Event()
+        self.stats = {
+            'capacity': self.capacity,
+            'high_water_mark': high_water_mark,
+            'overflows': 0,
+            'dropped_bytes': 0,
+            'high_water_events': 0,
+            'peak_fill': 0,
+        }
+
+    def fill(self):
+        """当前缓冲的字节数"""
+        return self._write_pos - self._read_pos
+
+    def write(self, data):
+        """写入一个数据包，空间不足时丢弃并返回 False"""
+        mv = memoryview(data)
+        if mv.format != 'B' or mv.ndim != 1:
+            mv = mv.cast('B')
+        size = mv.nbytes
+        used = self._write_pos - self._read_pos
+        if size > self.capacity - used:
+            self.stats['overflows'] += 1
+            self.stats['dropped_bytes'] += size
+            if not self._overflowing:
+                # 连续溢出只在开始时记录一次，避免采集线程被日志拖慢
+                self._overflowing = True
+                print(f"[Audio] 环形缓冲区已满，丢弃数据 {self.name or ''} "
+                      f"(容量 {self.capacity} 字节, 累计溢出 {self.stats['overflows']} 次)")
+            self.data_ready.set()
+            return False
+        self._overflowing = False
+
+        start = self._write_pos % self.capacity
+        first = min(size, self.capacity - start)
+        self._view[start:start + first] = mv[:first]
+        if first < size:
+            self._view[:size - first] = mv[first:]
+        # 数据拷贝完成后再发布写位置
+        self._write_pos += size
+
+        used += size
+        if used > self.stats['peak_fill']:
+            self.stats['peak_fill'] = used
+        if used >= self._high_water_bytes:
+            if not self._above_high_water:
+                self._above_high_water = True
+                self.stats['high_water_events'] += 1
+        else:
+            self._above_high_water = False
+        if used >= self.wake_bytes:
+            self.data_ready.set()
+        return True
+
+    def read_into(self, out, max_bytes, align=1):
+        """读出最多 max_bytes 字节（按 align 对齐）到 out，返回实际字节数"""
+        available = self._write_pos - self._read_pos
+        size = min(available, max_bytes)
+        size -= size % align
+        if size <= 0:
+            return 0
+        start = self._read_pos % self.capacity
+        first = min(size, self.capacity - start)
+        out[:first] = self._view[start:start + first]
+        if first < size:
+            out[first:size] = self._view[:size - first]
+        self._read_pos += size
+        return size
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['fill'] = self.fill()
+        stats['peak_fill_ratio'] = stats['peak_fill'] / self.capacity if self.capacity else 0.0
+        return stats
+
+class RingBufferWriter:
+    """写线程：把环形缓冲区中的数据合并成大块，顺序写入 sink
+
+    sink 只需要提供 writeframes(data)，例如 wave 文件对象。
+    flush_hooks 中的函数在每轮写出之后（包括停止时的最后一轮）在写线程中调用，
+    用于写出时间戳等旁路数据。
+    """
+    def __init__(self, ring, sink, frame_bytes, chunk_bytes=256 * 1024, flush_interval=0.1,
+                 flush_hooks=()):
+        self.ring = ring
+        self.sink = sink
+        self.frame_bytes = frame_bytes
+        chunk_bytes = min(chunk_bytes, ring.wake_bytes)
+        self.chunk_bytes = max(frame_bytes, chunk_bytes - chunk_bytes % frame_bytes)
+        self.flush_interval = flush_interval
+        self.flush_hooks = list(flush_hooks)
+        self._staging = bytearray(self.chunk_bytes)
+        self._staging_view = memoryview(self._staging)
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+        self.stats = {
+            'writes': 0,
+            'bytes_written': 0,
+            'max_write_time': 0.0,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止写线程，剩余数据会全部写出"""
+        self._stop.set()
+        self.ring.data_ready.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _drain(self, min_bytes):
+        while self.ring.fill() >= max(min_bytes, self.frame_bytes):
+            size = self.ring.read_into(self._staging_view, self.chunk_bytes, self.frame_bytes)
+            if not size:
+                break
+            write_start = time.perf_counter()
+            self.sink.writeframes(self._staging_view[:size])
+            write_time = time.perf_counter() - write_start
+            self.stats['writes'] += 1
+            self.stats['bytes_written'] += size
+            if write_time > self.stats['max_write_time']:
+                self.stats['max_write_time'] = write_time
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                woke = self.ring.data_ready.wait(self.flush_interval)
+                self.ring.data_ready.clear()
+                # 被唤醒时只写满块，定时刷新时写出所有数据
+                self._drain(self.chunk_bytes if woke else 0)
+                self._run_hooks()
+            self._drain(0)
+            self._run_hooks()
+        except Exception as e:
+            self.error = e
+            print(f"[Audio] Writer error: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
+    def _run_hooks(self):
+        for hook in self.flush_hooks:
+            hook()
+
+    def get_stats(self):
+        return dict(self.stats)
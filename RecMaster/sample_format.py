@@ -0,0 +1,195 @@
+# 采集热循环中的数据包格式转换
+import ctypes
+import numpy as np
+
+# 判断设备是否有声音的阈值
+FLOAT_ACTIVITY_THRESHOLD = 0.0001
+INT_ACTIVITY_THRESHOLD = 10 << 16  # 相当于 int16 的 10，按左对齐 int32 计
+
+_ONE = np.float32(1.0)
+_MINUS_ONE = np.float32(-1.0)
+
+# 每种格式的样本字节数
+SAMPLE_WIDTHS = {
+    'int16': 2,
+    'int24': 3,
+    'int32': 4,
+    'float32': 4,
+    'float64': 8,
+}
+
+# 输出格式，float32 以外按满幅缩放
+TARGET_FORMATS = ('int16', 'int24', 'int32', 'float32')
+_FLOAT_SCALES = {
+    'int16': np.float32(32767.0),
+    'int24': np.float32(8388607.0),
+}
+
+def describe_format(bits_per_sample, valid_bits_per_sample=None, is_float=False):
+    """由容器位数、有效位数和 SubFormat 得到格式名称
+
+    有效位数少于容器位数时数据左对齐，按容器格式解码即可。
+    """
+    valid_bits = valid_bits_per_sample or bits_per_sample
+    if valid_bits > bits_per_sample:
+        raise ValueError(f"有效位数 {valid_bits} 大于容器位数 {bits_per_sample}")
+    name = f"{'float' if is_float else 'int'}{bits_per_sample}"
+    if name not in SAMPLE_WIDTHS:
+        raise ValueError(f"不支持的采样格式: {name}")
+    return name
+
+def default_target(format_info):
+    """默认输出格式：浮点转 int16，整数保留有效位数"""
+    if format_info['is_float']:
+        return 'int16'
+    valid_bits = format_info.get('valid_bits_per_sample') or format_info['bits_per_sample']
+    if valid_bits <= 16:
+        return 'int16'
+    if valid_bits <= 24:
+        return 'int24'
+    return 'int32'
+
+class PacketConverter:
+    """把设备缓冲区转换成写入 WAV 的数据，不拷贝输入、不为每个包分配内存
+
+    直接在设备缓冲区上建立 NumPy 视图，所有中间结果和输出都写入预分配、复用的缓冲区。
+    整数格式统一解码为左对齐的 int32（24 位打包数据使用 3 字节步长的重叠视图），
+    浮点格式解码为 float32，转成整数前先饱和截断，超出 [-1.0, 1.0] 的样本不会回绕。
+    源格式与目标格式相同时直接返回设备缓冲区的视图。
+    convert 返回的数据在下一次 convert 之前有效（直通时指向设备缓冲区，
+    必须在 release_buffer 之前写出）。
+    """
+    def __init__(self, format_info, target=None, max_frames=None):
+        self.channels = format_info['channels']
+        self.is_float = format_info['is_float']
+        self.source = describe_format(format_info['bits_per_sample'],
+                                      format_info.get('valid_bits_per_sample'),
+                                      format_info['is_float'])
+        self.target = target or default_target(format_info)
+        if self.target not in TARGET_FORMATS:
+            raise ValueError(f"不支持的输出格式: {self.target}")
+        self.bytes_per_sample = SAMPLE_WIDTHS[self.source]
+        self.frame_bytes = self.channels * self.bytes_per_sample
+        # WAV 文件的样本宽度
+        self.sample_width = SAMPLE_WIDTHS[self.target]
+        self._capacity = 0
+        # 默认预留 1 秒，与 WASAPI 缓冲区长度一致
+        self._allocate(max_frames or format_info['sample_rate'])
+
+    def _allocate(self, frames):
+        samples = frames * self.channels
+        self._capacity = frames
+        self._ints = np.empty(samples, dtype=np.int32)
+        self._floats = np.empty(samples, dtype=np.float32)
+        # 多留 1 字节：24 位编码的最后一个样本按 4 字节写入
+        self._out = np.empty(samples * self.sample_width + 1, dtype=np.uint8)
+        self._tail = np.zeros(4, dtype=np.uint8)
+
+    def view(self, address, num_frames):
+        """在设备缓冲区上建立只读视图，不拷贝数据"""
+        nbytes = num_frames * self.frame_bytes
+        raw = (ctypes.c_char * nbytes).from_address(address)
+        return np.frombuffer(raw, dtype=np.uint8)
+
+    def convert(self, address, num_frames):
+        """转换一个数据包，返回 (可写入 WAV 的数据, 是否有声音)"""
+        return self.convert_array(self.view(address, num_frames), num_frames * self.channels)
+
+    def convert_array(self, raw, samples):
+        """转换已经映射成 uint8 数组的数据包"""
+        if samples > self._capacity * self.channels:
+            self._allocate(-(-samples // self.channels))
+        if samples == 0:
+            return raw.data, False
+        if self.is_float:
+            return self._convert_float(raw, samples)
+        return self._convert_int(raw, samples)
+
+    def _decode_int(self, raw, samples):
+        """整数样本解码为左对齐的 int32"""
+        if self.source == 'int32':
+            return raw.view(np.int32)
+        ints = self._ints[:samples]
+        if self.source == 'int16':
+            np.copyto(ints, raw.view(np.int16))
+            np.left_shift(ints, 16, out=ints)
+        else:
+            # 24 位打包样本：以 3 字节为步长建立重叠的 int32 视图，左移 8 位丢掉
+            # 下一个样本的字节。最后一个样本会越过缓冲区末尾，单独处理。
+            if samples > 1:
+                packed = np.ndarray(shape=(samples - 1,), dtype='<i4', buffer=raw,
+                                    strides=(3,))
+                np.left_shift(packed, 8, out=ints[:samples - 1])
+            self._tail[1:] = raw[(samples - 1) * 3:samples * 3]
+            ints[samples - 1] = self._tail.view('<i4')[0]
+        return ints
+
+    def _encode_int(self, ints, samples):
+        """左对齐 int32 编码为目标格式"""
+        out = self._out[:samples * self.sample_width]
+        if self.target == 'int16':
+            # 取高 16 位，等价于右移 16 位
+            np.copyto(out.view(np.int16), ints.view(np.int16).reshape(samples, 2)[:, 1])
+        elif self.target == 'int24':
+            # 右移 8 位后以 3 字节步长顺序写入重叠的 int32 视图，
+            # 每个样本的第 4 个字节会被下一个样本覆盖（最后一个写入预留的 1 字节）
+            np.right_shift(ints, 8, out=self._ints[:samples])
+            packed = np.ndarray(shape=(samples,), dtype='<i4', buffer=self._out, strides=(3,))
+            packed[...] = self._ints[:samples]
+        elif self.target == 'int32':
+            np.copyto(out.view(np.int32), ints)
+        else:
+            floats = out.view(np.float32)
+            np.copyto(floats, ints, casting='unsafe')
+            np.multiply(floats, np.float32(1.0 / 2147483648.0), out=floats)
+        return out
+
+    def _convert_int(self, raw, samples):
+        if self.source == 'int16' and self.target == 'int16':
+            # 直通时直接检查 int16 视图，不做任何转换
+            int_data = raw.view(np.int16)
+            threshold = INT_ACTIVITY_THRESHOLD >> 16
+            has_sound = int_data.max() > threshold or int_data.min() < -threshold
+            return raw.data, has_sound
+
+        ints = self._decode_int(raw, samples)
+        has_sound = ints.max() > INT_ACTIVITY_THRESHOLD or ints.min() < -INT_ACTIVITY_THRESHOLD
+        if self.source == self.target:
+            return raw.data, has_sound
+        return self._encode_int(ints, samples).data, has_sound
+
+    def _convert_float(self, raw, samples):
+        src = raw.view(np.float32 if self.source == 'float32' else np.float64)
+        floats = self._floats[:samples]
+        if self.target == 'float32':
+            # 浮点输出保留超出满幅的样本
+            if self.source == 'float32':
+                floats = src
+            else:
+                np.copyto(floats, src, casting='same_kind')
+            has_sound = (floats.max() > FLOAT_ACTIVITY_THRESHOLD or
+                         floats.min() < -FLOAT_ACTIVITY_THRESHOLD)
+            return floats.data.cast('B'), has_sound
+
+        # 先饱和到 [-1, 1] 再缩放，最后向零截断（与 astype 一致）
+        # 带类型转换的 ufunc 会分配临时缓冲区，所以缩放在 float32 上原地完成
+        if self.source == 'float64':
+            np.copyto(floats, src, casting='same_kind')
+            np.minimum(floats, _ONE, out=floats)
+        else:
+            np.minimum(src, _ONE, out=floats)
+        np.maximum(floats, _MINUS_ONE, out=floats)
+        has_sound = floats.max() > FLOAT_ACTIVITY_THRESHOLD or floats.min() < -FLOAT_ACTIVITY_THRESHOLD
+
+        out = self._out[:samples * self.sample_width]
+        if self.target == 'int16':
+            np.multiply(floats, _FLOAT_SCALES['int16'], out=floats)
+            np.copyto(out.view(np.int16), floats, casting='unsafe')
+            return out.data, has_sound
+
+        # float32 只有 24 位精度，int24/int32 都先缩放到 24 位再左对齐
+        ints = self._ints[:samples]
+        np.multiply(floats, _FLOAT_SCALES['int24'], out=floats)
+        np.copyto(ints, floats, casting='unsafe')
+        np.left_shift(ints, 8, out=ints)
+        return self._encode_int(ints, samples).data, has_sound
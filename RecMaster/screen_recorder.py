@@ -0,0 +1,845 @@
+# 屏幕录制：显示器信息和 ffmpeg 录屏进程，不依赖 tkinter
+import os
+import re
+import subprocess
+import threading
+import time
+import traceback
+from datetime import datetime
+from ctypes import POINTER, Structure, c_int, c_void_p, c_bool
+from .calibration import probe_ffmpeg, quality_params
+from .encoder_telemetry import EncoderTelemetry, PROGRESS_ARGS
+from .merge import concat_files, read_segment_list
+from .recovery import remove_marker, write_marker
+
+try:
+    import win32gui
+    import win32api
+    import win32con
+    from ctypes import windll, WINFUNCTYPE
+except ImportError:
+    # 非 Windows 环境只能使用 x11grab 或 lavfi 测试源
+    win32gui = win32api = win32con = None
+
+# 支持的视频输入：Windows 屏幕、X11 屏幕、ffmpeg lavfi 测试图像（用于无桌面环境的测试）
+VIDEO_SOURCES = ('gdigrab', 'x11grab', 'lavfi')
+
+# 静态画面模式：丢弃与上一帧几乎相同的帧（阈值为 ffmpeg mpdecimate 的默认值），
+# max 限制连续丢弃的帧数，保证每秒至少保留一帧
+DECIMATE_FILTER = 'mpdecimate=hi=768:lo=320:frac=0.33:max={max_drop}'
+
+# 可变帧率输出时每隔多少秒强制一个关键帧，保证可以定位
+VFR_KEYFRAME_SECONDS = 10
+
+# 输出容器：mp4 在结束时才写出索引 (moov)，ffmpeg 被强制结束或系统崩溃时整个文件无法播放；
+# fmp4（分片 MP4）每秒写一个分片，mkv 每秒写一个 cluster，文件始终可以播放到最后一个分片
+CONTAINERS = {
+    'mp4': {'ext': '.mp4', 'args': []},
+    'fmp4': {'ext': '.mp4', 'args': ['-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                                      '-frag_duration', '1000000']},
+    'mkv': {'ext': '.mkv', 'args': ['-f', 'matroska', '-cluster_time_limit', '1000']},
+}
+
+# 两阶段录制的中间文件：ultrafast + 固定量化参数，编码开销最小、接近无损，
+# 录制结束后由 TranscodeQueue 压缩到选定的质量
+INTERMEDIATE_PRESET = 'ultrafast'
+INTERMEDIATE_QP = 12
+
+# 防崩溃容器的关键帧间隔（秒），崩溃时最后一个关键帧之后的画面无法解码
+CRASH_SAFE_KEYFRAME_SECONDS = 2
+
+# 缩放算法（ffmpeg swscale 的 flags），从快到慢；area 适合大幅缩小的文字画面
+SCALERS = ('fast_bilinear', 'bilinear', 'bicubic', 'area', 'lanczos')
+
+def scale_filter(width, height, scaler='bicubic'):
+    """缩放到 width x height 的滤镜"""
+    if scaler not in SCALERS:
+        raise ValueError(f"不支持的缩放算法: {scaler}")
+    return f'scale={width}:{height}:flags={scaler}'
+
+# 低码率代理文件：与主文件同时编码，高度不超过 720，帧率不超过 15
+PROXY_RENDITION = {
+    'name': 'proxy',
+    'height': 720,
+    'fps': 15,
+    'crf': 28,
+    'preset': 'veryfast',
+    'video_bitrate': '1000k',
+}
+
+def _vfr_args():
+    """可变帧率输出参数：ffmpeg 5.1 起为 -fps_mode，之前为 -vsync"""
+    probe = probe_ffmpeg()
+    match = re.match(r'n?(\d+)\.(\d+)', probe['version']) if probe else None
+    if match and (int(match.group(1)), int(match.group(2))) < (5, 1):
+        return ['-vsync', 'vfr']
+    return ['-fps_mode', 'vfr']
+
+# 定义必要的结构和类型
+class RECT(Structure):
+    _fields_ = [
+        ('left', c_int),
+        ('top', c_int),
+        ('right', c_int),
+        ('bottom', c_int)
+    ]
+
+class ScreenInfo:
+    def __init__(self):
+        # 设置进程为DPI感知
+        try:
+            windll.shcore.SetProcessDpiAwareness(2)  # PROCESS_PER_MONITOR_DPI_AWARE
+        except Exception:
+            windll.user32.SetProcessDPIAware()
+
+    @staticmethod
+    def get_dpi_scaling(monitor):
+        """获取显示器的DPI缩放值"""
+        try:
+            # 获取监视器句柄对应的DC
+            monitor_info = win32api.GetMonitorInfo(monitor)
+            monitor_handle = win32api.MonitorFromRect(monitor_info['Monitor'])
+            
+            # 使用 GetDpiForWindow 获取DPI
+            hwnd = win32gui.WindowFromPoint((monitor_info['Monitor'][0], monitor_info['Monitor'][1]))
+            dpi = windll.user32.GetDpiForWindow(hwnd)
+            
+            if dpi:
+                return dpi / 96.0
+                
+            # 备用方法：使用DC获取DPI
+            dc = win32gui.GetDC(hwnd)
+            dpi_x = win32gui.GetDeviceCaps(dc, win32con.LOGPIXELSX)
+            win32gui.ReleaseDC(hwnd, dc)
+            
+            return dpi_x / 96.0
+            
+        except Exception as e:
+            print(f"Error getting DPI scaling: {e}")
+            # 最后的备用方法
+            try:
+                dc = win32gui.GetDC(0)
+                dpi = win32gui.GetDeviceCaps(dc, win32con.LOGPIXELSX)
+                win32gui.ReleaseDC(0, dc)
+                return dpi / 96.0
+            except Exception as e2:
+                print(f"Error getting DPI scaling (backup method): {e2}")
+                return 1.0
+
+    @staticmethod
+    def get_real_resolution():
+        """获取所有显示器的真实分辨率（考虑缩放）"""
+        # 确保DPI感知已设置
+        ScreenInfo()
+        
+        monitors = []
+        
+        def callback(monitor, dc, rect, data):
+            monitor_info = win32api.GetMonitorInfo(monitor)
+            scaling = ScreenInfo.get_dpi_scaling(monitor)
+            print(f"Debug - Monitor DPI scaling: {scaling}")
+            
+            # 获取显示器物理位置
+            monitor_rect = monitor_info['Monitor']
+            x = monitor_rect[0]
+            y = monitor_rect[1]
+            width = monitor_rect[2] - monitor_rect[0]
+            height = monitor_rect[3] - monitor_rect[1]
+            
+            # 应用DPI缩放
+            real_width = int(width)  # 不需要再次缩放，因为已经是DPI感知的
+            real_height = int(height)
+            
+            monitors.append({
+                'x': x,
+                'y': y,
+                'width': real_width,
+                'height': real_height,
+                'scaling': scaling
+            })
+            return True
+
+        # 正确定义回调函数类型
+        MONITORENUMPROC = WINFUNCTYPE(c_bool, c_void_p, c_void_p, POINTER(RECT), c_void_p)
+        callback_function = MONITORENUMPROC(callback)
+        
+        # 枚举显示器
+        windll.user32.EnumDisplayMonitors(None, None, callback_function, 0)
+        
+        return monitors
+
+class ScreenRecorder:
+    """ffmpeg 录屏进程
+
+    video_source 为 gdigrab（Windows 默认）、x11grab（其他平台默认）或 lavfi（测试图像）。
+    start_recording 的 audio_inputs 为 AudioPipe 列表时，音频在同一个 ffmpeg 进程中编码封装，
+    停止后不需要再合并。
+    governor 不为空时编码器跟不上实时会以更多线程/更快的 preset/更低的帧率重启为新的分段，
+    停止时无损拼接为 output_file。threads 传给 x264 的 -threads。
+    static_mode=True 时编码前用 mpdecimate 丢弃重复帧，输出可变帧率，保留帧的时间戳不变，
+    与音轨的对齐方式和恒定帧率相同。
+    segment_seconds 不为空时由 ffmpeg 的 segment 复用器按固定时长写 MPEG-TS 分段，
+    关闭的分段记录在 segment_list_file (CSV) 中；停止时拼接为 output_file，
+    keep_segments=True（由 SegmentMerger 设置）时保留分段，由合并器处理。
+    container 为 CONTAINERS 之一（mp4、fmp4、mkv），决定直接输出的文件格式；
+    mkv 时 output_file 的扩展名改为 .mkv。录制期间 output_file 旁有 .recording 标记，
+    正常停止后删除，没有删除的由 recovery.recover_directory 在下次启动时修复。
+    two_phase=True 时以 INTERMEDIATE_PRESET/INTERMEDIATE_QP 录制近无损的中间文件（帧率仍按质量档位），
+    由调用方在录制结束后交给 TranscodeQueue 压缩；这时不使用编码调节。
+    renditions 为额外输出的列表（见 PROXY_RENDITION），每项包含 name 和可选的 height、fps、
+    crf、preset、video_bitrate、container，没有给出的取主文件的参数。屏幕只采集一次，
+    由 split 滤镜分给各路编码器，写到 output_file 同目录的 <名称>_<name>.<扩展名>；
+    所有输出的文件见 outputs。分段录制和编码调节时不使用额外输出。
+    scale 为缩放系数（如 0.5）或 'logical'（按所在显示器的 DPI 缩放比例缩小到逻辑像素），
+    max_size 为 (最大宽, 最大高)，两者都给出时取较小的结果，不会放大。缩放在编码前的
+    滤镜链中完成，scaler 为 SCALERS 之一；编码的尺寸为 output_width x output_height。
+    """
+    def __init__(self, quality=3, video_source=None, governor=None, threads=None,
+                 static_mode=False, lavfi_graph=None, segment_seconds=None, container='mp4',
+                 two_phase=False, renditions=None, scale=None, max_size=None, scaler='bicubic'):
+        if container not in CONTAINERS:
+            raise ValueError(f"不支持的容器: {container}")
+        self.container = container
+        self.two_phase = two_phase
+        self.renditions = list(renditions or [])
+        if scaler not in SCALERS:
+            raise ValueError(f"不支持的缩放算法: {scaler}")
+        self.scale = scale
+        self.max_size = max_size
+        self.scaler = scaler
+        # 本次录制实际的额外输出（参数已补全）
+        self.rendition_outputs = []
+        self.quality = max(1, min(5, quality))
+        self._set_quality_params()
+        # governor 为 EncoderGovernor 时按编码速度在分段边界调节 threads/preset/fps
+        self.governor = governor
+        self.threads = threads
+        self.static_mode = static_mode
+        # lavfi 输入的滤镜图，{size} 和 {fps} 会被替换
+        self.lavfi_graph = lavfi_graph or 'testsrc2=size={size}:rate={fps}'
+        self.segment_seconds = segment_seconds
+        self.segment_list_file = None
+        self.keep_segments = False
+        # 每次启动 ffmpeg 进程的记录（编码调节会重启进程）
+        self.encoder_runs = []
+        self._restart_lock = threading.Lock()
+        self._audio_inputs = []
+        self._left = self._top = 0
+        self.video_source = video_source or ('gdigrab' if os.name == 'nt' else 'x11grab')
+        if self.video_source not in VIDEO_SOURCES:
+            raise ValueError(f"不支持的视频输入: {self.video_source}")
+        self.last_error = None
+        self.recording = False
+        self.output_file = None
+        self.current_fps = 0
+        self.width = 0
+        self.height = 0
+        # 编码的尺寸（缩放后）
+        self.output_width = 0
+        self.output_height = 0
+        self.process = None
+        self.telemetry = None
+        # ffmpeg 进程启动的时刻，合并时用于对齐音轨
+        self.start_time = None
+        # 显示器在第一次录制时才枚举（见 monitors）
+        self._monitors = None
+        self.border_hwnd = None
+
+    def _set_quality_params(self):
+        # 质量参数：本机校准过时使用校准结果（见 calibration.py），否则使用默认表
+        params = quality_params(self.quality)
+        self.fps = params['fps']
+        self.crf = params['crf']
+        self.preset = params['preset']
+        self.video_bitrate = params['video_bitrate']
+
+    def show_recording_border(self, x, y, width, height, master_window):
+        """显示录制区域的边框"""
+        if win32gui is None:
+            return
+        try:
+            # 清理旧的边框窗口
+            if hasattr(self, 'border_hwnd') and self.border_hwnd:
+                win32gui.DestroyWindow(self.border_hwnd)
+                self.border_hwnd = None
+
+            # 注册窗口类
+            wc = win32gui.WNDCLASS()
+            wc.lpszClassName = "RecordingBorder"
+            wc.hbrBackground = win32gui.GetStockObject(win32con.NULL_BRUSH)
+            wc.style = win32con.CS_HREDRAW | win32con.CS_VREDRAW
+            wc.lpfnWndProc = win32gui.DefWindowProc
+            wc.hCursor = win32gui.LoadCursor(0, win32con.IDC_ARROW)
+            
+            try:
+                win32gui.RegisterClass(wc)
+            except Exception:
+                # 类可能已经注册
+                pass
+
+            # 创建窗口
+            ex_style = (
+                win32con.WS_EX_LAYERED |      # 分层窗口
+                win32con.WS_EX_TRANSPARENT |  # 点击穿透
+                win32con.WS_EX_TOPMOST       # 总在最前
+            )
+            style = win32con.WS_POPUP | win32con.WS_VISIBLE
+
+            self.border_hwnd = win32gui.CreateWindowEx(
+                ex_style,
+                wc.lpszClassName,
+                "Border",
+                style,
+                x, y, width, height,
+                0, 0, 0, None
+            )
+
+            # 设置窗口透明度和颜色
+            win32gui.SetLayeredWindowAttributes(
+                self.border_hwnd,
+                win32api.RGB(0, 0, 0),  # 黑色将被透明
+                255,  # 不透明度
+                win32con.LWA_COLORKEY
+            )
+
+            # 创建设备上下文
+            hdc = win32gui.GetDC(self.border_hwnd)
+            
+            # 创建画笔
+            pen = win32gui.CreatePen(win32con.PS_SOLID, 2, win32api.RGB(255, 0, 0))  # 2像素红色边框
+            
+            # 选择画笔
+            old_pen = win32gui.SelectObject(hdc, pen)
+            
+            # 画矩形
+            win32gui.MoveToEx(hdc, 0, 0)
+            win32gui.LineTo(hdc, width - 1, 0)
+            win32gui.LineTo(hdc, width - 1, height - 1)
+            win32gui.LineTo(hdc, 0, height - 1)
+            win32gui.LineTo(hdc, 0, 0)
+            
+            # 清理资源
+            win32gui.SelectObject(hdc, old_pen)
+            win32gui.DeleteObject(pen)
+            win32gui.ReleaseDC(self.border_hwnd, hdc)
+
+            # 显示窗口
+            win32gui.ShowWindow(self.border_hwnd, win32con.SW_SHOW)
+            win32gui.UpdateWindow(self.border_hwnd)
+
+            # 创建一个线程来保持边框可见
+            def keep_border_visible():
+                while self.recording:
+                    if self.border_hwnd:
+                        try:
+                            win32gui.SetWindowPos(
+                                self.border_hwnd, win32con.HWND_TOPMOST,
+                                x, y, width, height,
+                                win32con.SWP_NOACTIVATE | win32con.SWP_SHOWWINDOW
+                            )
+                        except Exception:
+                            break
+                    time.sleep(0.1)
+
+            border_thread = threading.Thread(target=keep_border_visible)
+            border_thread.daemon = True
+            border_thread.start()
+
+            print(f"边框窗口已创建: {width}x{height} at ({x}, {y})")
+
+        except Exception as e:
+            print(f"Error showing recording border: {e}")
+            traceback.print_exc()
+
+    def _video_input_args(self, left, top):
+        """视频输入部分的 ffmpeg 参数"""
+        if self.video_source == 'gdigrab':
+            return [
+                '-f', 'gdigrab',
+                '-framerate', str(self.fps),
+                '-offset_x', str(left),
+                '-offset_y', str(top),
+                '-video_size', f'{self.width}x{self.height}',
+                '-draw_mouse', '1',
+                '-i', 'desktop',
+            ]
+        if self.video_source == 'x11grab':
+            display = os.environ.get('DISPLAY', ':0.0')
+            return [
+                '-f', 'x11grab',
+                '-framerate', str(self.fps),
+                '-video_size', f'{self.width}x{self.height}',
+                '-draw_mouse', '1',
+                '-i', f'{display}+{left},{top}',
+            ]
+        # -re 让测试图像按实时速度产生，与实时音频同步
+        return [
+            '-re',
+            '-f', 'lavfi',
+            '-i', self.lavfi_graph.format(size=f'{self.width}x{self.height}', fps=self.fps),
+        ]
+
+    def _audio_args(self, audio_inputs):
+        """音频管道输入、映射和编码参数；多路音频用 amix 混合"""
+        if not audio_inputs:
+            return [], []
+        input_args = []
+        for audio_input in audio_inputs:
+            input_args.extend(audio_input.input_args())
+        if len(audio_inputs) == 1:
+            output_args = ['-map', '0:v', '-map', '1:a']
+        else:
+            streams = ''.join(f'[{i + 1}:a]' for i in range(len(audio_inputs)))
+            output_args = [
+                '-filter_complex', f'{streams}amix=inputs={len(audio_inputs)}:duration=longest[aout]',
+                '-map', '0:v',
+                '-map', '[aout]',
+            ]
+        output_args.extend(['-c:a', 'aac', '-b:a', '192k'])
+        return input_args, output_args
+
+    def start_recording(self, start_x, start_y, end_x, end_y, audio_inputs=(), output_file=None):
+        """启动 ffmpeg 录屏，返回录制区域；失败时返回 None，错误信息在 last_error 中"""
+        self.last_error = None
+        try:
+            # 在开始录制视频前记录时间戳
+            video_start_time = time.time()
+            print(f"\n[Video] About to start recording at: {video_start_time}")
+            
+            print(f"\n[Video] Recording start timestamp: {time.time()}")
+            print(f"Debug - Original coordinates: start=({start_x}, {start_y}), end=({end_x}, {end_y})")
+            # 找到选择区域所在的显示器和对应的缩放比例
+            scaling = 1.0
+            monitor_found = None
+            for monitor in self.monitors:
+                if (monitor['x'] <= start_x <= monitor['x'] + monitor['width'] and
+                    monitor['y'] <= start_y <= monitor['y'] + monitor['height']):
+                    scaling = monitor['scaling']
+                    monitor_found = monitor
+                    break
+            
+            if monitor_found:
+                print(f"Debug - Monitor found: x={monitor_found['x']}, y={monitor_found['y']}, scaling={scaling}")
+                # 计算录制区域（坐标已经是DPI感知的）
+                left = min(start_x, end_x)
+                top = min(start_y, end_y)
+                self.width = abs(end_x - start_x)
+                self.height = abs(end_y - start_y)
+            else:
+                left = min(start_x, end_x)
+                top = min(start_y, end_y)
+                self.width = abs(end_x - start_x)
+                self.height = abs(end_y - start_y)
+            
+            # 确保宽度和高度是偶数
+            self.width = self.width - (self.width % 2)
+            self.height = self.height - (self.height % 2)
+            
+            print(f"Debug - Recording area: left={left}, top={top}, width={self.width}, height={self.height}, scaling={scaling}")
+            self.output_width, self.output_height = self._output_size(scaling)
+            if (self.output_width, self.output_height) != (self.width, self.height):
+                print(f"Debug - Output size: {self.output_width}x{self.output_height} ({self.scaler})")
+            
+            # Create output filename
+            if output_file:
+                self.output_file = output_file
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                self.output_file = f'screen_recording_{timestamp}.mp4'
+            self.output_file = os.path.splitext(self.output_file)[0] + CONTAINERS[self.container]['ext']
+            
+            self._left, self._top = left, top
+            self._audio_inputs = list(audio_inputs)
+            self.encoder_runs = []
+            # 编码调节需要重启 ffmpeg，只用于没有音频管道的录制（管道只能被一个进程读取）
+            use_governor = (self.governor is not None and not self._audio_inputs
+                            and not self.segment_seconds and not self.two_phase)
+            if self.governor is not None and not use_governor:
+                reason = ('单次录制（音频管道只能被一个进程读取）' if self._audio_inputs
+                          else '分段录制' if self.segment_seconds else '两阶段录制')
+                print(f"[Video] {reason}不支持编码调节，已关闭")
+            base = os.path.splitext(self.output_file)[0]
+            self.rendition_outputs = []
+            if self.renditions and (use_governor or self.segment_seconds):
+                print("[Video] 分段录制和编码调节不支持多路输出，只输出主文件")
+            elif self.renditions:
+                self.rendition_outputs = [self._rendition_params(rendition, base)
+                                          for rendition in self.renditions]
+            if self.segment_seconds:
+                self.segment_list_file = f'{base}_segments.csv'
+                target = f'{base}_seg%03d.ts'
+            elif use_governor:
+                target = self._segment_filename(0)
+            else:
+                target = self.output_file
+            self._launch(target)
+            self.recording = True
+            if use_governor:
+                self.governor.start(self)
+            
+            # 在启动ffmpeg后立即记录时间戳
+            self.start_time = self.encoder_runs[0]['start_time']
+            print(f"[Video] FFmpeg process started at: {self.start_time}")
+            
+            # 返回录制区域的信息
+            return {
+                'left': left,
+                'top': top,
+                'width': self.width,
+                'height': self.height
+            }
+            
+        except Exception as e:
+            self.recording = False
+            self.last_error = str(e)
+            print(f"Recording error: {str(e)}")
+            traceback.print_exc()
+            return None
+
+    def _output_size(self, dpi_scaling):
+        """按 scale/max_size 计算编码尺寸（偶数，不大于采集尺寸）"""
+        factor = 1.0
+        if self.scale == 'logical':
+            factor = 1.0 / dpi_scaling if dpi_scaling else 1.0
+        elif self.scale:
+            factor = float(self.scale)
+        if self.max_size:
+            max_width, max_height = self.max_size
+            factor = min(factor, max_width / self.width, max_height / self.height)
+        if factor >= 1.0:
+            return self.width, self.height
+        return (max(2, int(self.width * factor) // 2 * 2),
+                max(2, int(self.height * factor) // 2 * 2))
+
+    def _scale_filters(self):
+        """需要缩放时返回 [scale 滤镜]，否则为空"""
+        if (self.output_width, self.output_height) == (self.width, self.height):
+            return []
+        return [scale_filter(self.output_width, self.output_height, self.scaler)]
+
+    def _rendition_params(self, rendition, base):
+        """补全一路额外输出的参数，帧率不超过采集帧率"""
+        container = rendition.get('container', 'mp4')
+        if container not in CONTAINERS:
+            raise ValueError(f"不支持的容器: {container}")
+        return {
+            'name': rendition['name'],
+            'file': f"{base}_{rendition['name']}{CONTAINERS[container]['ext']}",
+            'height': rendition.get('height'),
+            'fps': min(rendition.get('fps', self.fps), self.fps),
+            'preset': rendition.get('preset', self.preset),
+            'crf': rendition.get('crf', self.crf),
+            'video_bitrate': rendition.get('video_bitrate', self.video_bitrate),
+            'container': container,
+        }
+
+    def _encoder_args(self, preset, crf, video_bitrate, two_phase=False):
+        """libx264 编码参数；两阶段录制的中间文件使用固定量化参数"""
+        if two_phase:
+            return [
+                '-c:v', 'libx264',
+                '-preset', INTERMEDIATE_PRESET,
+                '-qp', str(INTERMEDIATE_QP),
+                '-pix_fmt', 'yuv420p',
+            ]
+        return [
+            '-c:v', 'libx264',
+            '-preset', preset,
+            '-crf', str(crf),
+            '-b:v', video_bitrate,
+            '-pix_fmt', 'yuv420p',
+        ]
+
+    def _keyframe_args(self, container):
+        """关键帧间隔：可变帧率时保证可定位，分段时让分段边界落在关键帧上，防崩溃容器限制丢失的画面"""
+        keyframe_seconds = []
+        if self.static_mode:
+            keyframe_seconds.append(VFR_KEYFRAME_SECONDS)
+        if self.segment_seconds:
+            keyframe_seconds.append(self.segment_seconds)
+        if container != 'mp4':
+            keyframe_seconds.append(CRASH_SAFE_KEYFRAME_SECONDS)
+        if not keyframe_seconds:
+            return []
+        return ['-force_key_frames', f'expr:gte(t,n_forced*{min(keyframe_seconds)})']
+
+    def _build_command(self, output_file):
+        """按当前的 preset/fps 生成 ffmpeg 命令"""
+        if self.rendition_outputs:
+            return self._build_rendition_command(output_file)
+        audio_input_args, audio_output_args = self._audio_args(self._audio_inputs)
+        cmd = ['ffmpeg'] + self._video_input_args(self._left, self._top) + audio_input_args
+        cmd.extend(audio_output_args)
+        cmd.extend(self._encoder_args(self.preset, self.crf, self.video_bitrate, self.two_phase))
+        video_filters = self._scale_filters()
+        if self.static_mode:
+            video_filters.append(DECIMATE_FILTER.format(max_drop=self.fps))
+        if video_filters:
+            cmd.extend(['-vf', ','.join(video_filters)])
+        if self.static_mode:
+            cmd.extend(_vfr_args())
+        cmd.extend(self._keyframe_args(self.container))
+        if self.segment_seconds:
+            cmd.extend([
+                '-f', 'segment',
+                '-segment_time', str(self.segment_seconds),
+                '-segment_format', 'mpegts',
+                '-reset_timestamps', '1',
+                '-segment_list', self.segment_list_file,
+                '-segment_list_type', 'csv',
+            ])
+        elif output_file == self.output_file:
+            cmd.extend(CONTAINERS[self.container]['args'])
+        if self.threads:
+            cmd.extend(['-threads', str(self.threads)])
+        # 编码进度写到 stdout，由 EncoderTelemetry 解析
+        cmd.extend(PROGRESS_ARGS)
+        cmd.append(output_file)
+        return cmd
+
+    def _build_rendition_command(self, output_file):
+        """一次采集、多路输出：split 把画面分给主文件和每路额外输出，各自缩放、降帧率和编码"""
+        outputs = [{
+            'file': output_file,
+            'height': None,
+            'fps': self.fps,
+            'preset': self.preset,
+            'crf': self.crf,
+            'video_bitrate': self.video_bitrate,
+            'container': self.container,
+            'two_phase': self.two_phase,
+        }] + self.rendition_outputs
+        count = len(outputs)
+        # 先缩放再分给各路输出
+        graph = ['[0:v]' + ''.join(f'{f},' for f in self._scale_filters())
+                 + f'split={count}' + ''.join(f'[v{i}]' for i in range(count))]
+        video_labels = []
+        for i, output in enumerate(outputs):
+            chain = []
+            if output['height']:
+                chain.append(f"scale=-2:'min({output['height']},ih)'")
+            if output['fps'] != self.fps:
+                chain.append(f"fps={output['fps']}")
+            if self.static_mode:
+                chain.append(DECIMATE_FILTER.format(max_drop=output['fps']))
+            if chain:
+                graph.append(f"[v{i}]{','.join(chain)}[o{i}]")
+                video_labels.append(f'[o{i}]')
+            else:
+                video_labels.append(f'[v{i}]')
+
+        # 音频：一路输入可以直接映射到每个输出，多路输入混合后再用 asplit 分开
+        cmd = ['ffmpeg'] + self._video_input_args(self._left, self._top)
+        audio_maps = [[] for _ in outputs]
+        for audio_input in self._audio_inputs:
+            cmd.extend(audio_input.input_args())
+        if len(self._audio_inputs) == 1:
+            audio_maps = [['-map', '1:a'] for _ in outputs]
+        elif self._audio_inputs:
+            streams = ''.join(f'[{i + 1}:a]' for i in range(len(self._audio_inputs)))
+            graph.append(f'{streams}amix=inputs={len(self._audio_inputs)}:duration=longest,'
+                         f'asplit={count}' + ''.join(f'[a{i}]' for i in range(count)))
+            audio_maps = [['-map', f'[a{i}]'] for i in range(count)]
+
+        cmd.extend(['-filter_complex', ';'.join(graph)])
+        cmd.extend(PROGRESS_ARGS)
+        for output, label, audio_map in zip(outputs, video_labels, audio_maps):
+            cmd.extend(['-map', label] + audio_map)
+            if audio_map:
+                cmd.extend(['-c:a', 'aac', '-b:a', '192k'])
+            cmd.extend(self._encoder_args(output['preset'], output['crf'], output['video_bitrate'],
+                                          output.get('two_phase', False)))
+            if self.static_mode:
+                cmd.extend(_vfr_args())
+            cmd.extend(self._keyframe_args(output['container']))
+            cmd.extend(CONTAINERS[output['container']]['args'])
+            if self.threads:
+                cmd.extend(['-threads', str(self.threads)])
+            cmd.append(output['file'])
+        return cmd
+
+    def _launch(self, output_file):
+        """启动一个 ffmpeg 进程写入 output_file，记录为新的分段"""
+        self.process = subprocess.Popen(
+            self._build_command(output_file),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self.telemetry = EncoderTelemetry(self.process)
+        self.encoder_runs.append({
+            'file': output_file,
+            'start_time': time.time(),
+            'preset': self.preset,
+            'fps': self.fps,
+            'threads': self.threads,
+        })
+        self._write_marker()
+
+    def _write_marker(self):
+        """记录当前录制写出的文件，崩溃后由 recovery 修复"""
+        write_marker(self.output_file, {
+            'pid': self.process.pid,
+            'container': self.container,
+            'start_time': self.encoder_runs[0]['start_time'],
+            'runs': [{'file': run['file'], 'start_time': run['start_time']} for run in self.encoder_runs],
+            'segment_pattern': f'{os.path.splitext(self.output_file)[0]}_seg%03d.ts'
+                               if self.segment_seconds else None,
+            'segment_list_file': self.segment_list_file if self.segment_seconds else None,
+            'renditions': [output['file'] for output in self.rendition_outputs],
+        })
+
+    def _segment_filename(self, index):
+        base = os.path.splitext(self.output_file)[0]
+        # MPEG-TS 分段的 SPS/PPS 在码流内，不同 preset 的分段可以直接拼接
+        return f"{base}_part{index:03d}.ts"
+
+    def clear_marker(self):
+        """录制的文件已经处理完毕，删除崩溃恢复标记"""
+        remove_marker(self.output_file)
+
+    def _stop_process(self, process, telemetry):
+        """发送 q 让 ffmpeg 正常结束并等待退出
+
+        mp4 需要等 ffmpeg 写完索引；防崩溃容器的文件随时可以播放，超时后直接结束进程。
+        """
+        timeout = 5 if self.container == 'mp4' else 2
+        # stdout/stderr 由 telemetry 线程读取，这里只发送 q 并等待退出
+        try:
+            process.stdin.write(b'q')
+            process.stdin.close()
+        except OSError:
+            # ffmpeg 已经退出
+            pass
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        except Exception as e:
+            print(f"Error stopping recording: {e}")
+            process.kill()
+            process.wait()
+        telemetry.join()
+        if process.returncode:
+            print(f"[Video] ffmpeg exited with {process.returncode}:")
+            for line in telemetry.log_tail():
+                print(f"[Video]   {line}")
+
+    def restart_encoder(self, preset=None, fps=None, threads=None):
+        """以新的 preset/fps/threads 开始下一个分段
+
+        新进程开始输出后才停止旧进程，中间没有空档；拼接时按两个进程的启动时刻
+        截掉旧分段重叠的部分（见 _concat_segments）。
+        """
+        with self._restart_lock:
+            if not self.recording:
+                return False
+            old_process, old_telemetry = self.process, self.telemetry
+            self.preset = preset or self.preset
+            self.fps = fps or self.fps
+            self.threads = threads or self.threads
+            self._launch(self._segment_filename(len(self.encoder_runs)))
+            if not self.telemetry.wait_update(timeout=5.0):
+                print(f"[Video] 新的编码进程没有输出进度: {self.telemetry.log_tail(3)}")
+            self._stop_process(old_process, old_telemetry)
+            return True
+
+    def _concat_segments(self):
+        """把编码调节产生的分段无损拼接为 output_file，返回是否成功"""
+        runs = [run for run in self.encoder_runs if os.path.exists(run['file'])]
+        if not runs:
+            return True
+        entries = [(run['file'], following['start_time'] - run['start_time'] if following else None)
+                   for run, following in zip(runs, runs[1:] + [None])]
+        ok, stderr = concat_files(entries, self.output_file)
+        if not ok:
+            print(f"[Video] 分段拼接失败，保留分段文件: {stderr[-500:]}")
+            return False
+        for run in runs:
+            os.remove(run['file'])
+        return True
+
+    def _concat_time_segments(self):
+        """把按时长切分的分段无损拼接为 output_file，返回是否成功"""
+        segments = read_segment_list(self.segment_list_file)
+        if not segments:
+            return True
+        ok, stderr = concat_files([(segment['file'], None) for segment in segments],
+                                  self.output_file)
+        if not ok:
+            print(f"[Video] 分段拼接失败，保留分段文件: {stderr[-500:]}")
+            return False
+        for segment in segments:
+            os.remove(segment['file'])
+        os.remove(self.segment_list_file)
+        return True
+
+    @property
+    def monitors(self):
+        """显示器列表，第一次访问时枚举并缓存"""
+        if self._monitors is None:
+            self._monitors = ScreenInfo.get_real_resolution() if win32gui is not None else []
+        return self._monitors
+
+    @property
+    def outputs(self):
+        """本次录制输出的所有视频文件 [{'name', 'file'}]，主文件在第一个"""
+        return [{'name': 'main', 'file': self.output_file}] + [
+            {'name': output['name'], 'file': output['file']} for output in self.rendition_outputs]
+
+    def get_stats(self):
+        """ffmpeg 实际的编码进度（帧数、帧率、速度、重复/丢弃帧、码率、输出时长、文件大小）"""
+        if self.telemetry is None:
+            return {}
+        stats = self.telemetry.get_stats()
+        stats['preset'] = INTERMEDIATE_PRESET if self.two_phase else self.preset
+        stats['target_fps'] = self.fps
+        stats['threads'] = self.threads
+        stats['encoder_runs'] = len(self.encoder_runs)
+        stats['output_size'] = f'{self.output_width}x{self.output_height}'
+        if self.static_mode and stats['out_time'] > 0:
+            # 按时长应有的帧数中被丢弃的比例
+            expected = stats['out_time'] * self.fps
+            stats['decimation_ratio'] = max(0.0, min(1.0, 1 - stats['frame'] / expected))
+        if self.governor is not None:
+            stats['adjustments'] = list(self.governor.events)
+        if self.rendition_outputs:
+            # 每路输出的文件大小、平均码率和 x264 当前的量化参数（-progress 的 stream_<输出>_<流>_q）
+            renditions = []
+            for i, output in enumerate(self.outputs):
+                size = os.path.getsize(output['file']) if os.path.exists(output['file']) else 0
+                renditions.append({
+                    'name': output['name'],
+                    'file': output['file'],
+                    'size': size,
+                    'bitrate_kbps': size * 8 / 1000 / stats['out_time'] if stats['out_time'] else None,
+                    'q': stats['stream_q'].get(f'{i}:0'),
+                })
+            stats['renditions'] = renditions
+        return stats
+
+    def stop_recording(self):
+        if self.recording:
+            if self.governor is not None:
+                self.governor.stop()
+            with self._restart_lock:
+                self.recording = False
+            if self.process:
+                self._stop_process(self.process, self.telemetry)
+                # 分段由 SegmentMerger 拼接时标记留到合并完成；拼接失败时保留标记，下次启动再修复
+                finished = True
+                if self.segment_seconds:
+                    finished = not self.keep_segments and self._concat_time_segments()
+                elif self.encoder_runs[0]['file'] != self.output_file:
+                    finished = self._concat_segments()
+                if finished:
+                    self.clear_marker()
+            
+            # 移除边框窗口
+            if win32gui is not None and self.border_hwnd:
+                try:
+                    win32gui.DestroyWindow(self.border_hwnd)
+                    self.border_hwnd = None
+                except Exception as e:
+                    print(f"Error destroying border window: {e}")
@@ -0,0 +1,143 @@
+# 以设备采样时钟为准的音轨时间线，以及逐包时间戳旁路文件
+import os
+from collections import deque
+
+# WASAPI u64QPCPosition 的单位为 100ns
+QPC_FREQUENCY = 10000000
+
+TIMESTAMP_COLUMNS = ('kind', 'timeline_frame', 'frames', 'device_position', 'qpc_position',
+                     'flags', 'gap_frames', 'skipped_frames')
+
+def timestamps_filename(filename):
+    """音频文件对应的时间戳旁路文件名"""
+    return os.path.splitext(filename)[0] + '.timestamps.csv'
+
+class SampleTimeline:
+    """把数据包放到以录制开始 (start_qpc) 为零点的音轨时间线上
+
+    第一个数据包按其 QPC 时间定位，之后按设备位置 (u64DevicePosition) 逐帧推进，
+    与设备采样时钟一致，不受唤醒时刻抖动影响。设备位置与 QPC 时间相差超过
+    resync_tolerance 秒时（设备时钟停止或复位，例如回环设备空闲后恢复）按 QPC 重新定位。
+    带 TIMESTAMP_ERROR 的数据包不使用其 QPC。
+    """
+    def __init__(self, sample_rate, start_qpc, resync_tolerance=0.05):
+        self.sample_rate = sample_rate
+        self.start_qpc = start_qpc
+        self.resync_frames = int(resync_tolerance * sample_rate)
+        # 已经写入音轨的帧数
+        self.written = 0
+        # 时间线位置 = 设备位置 + _anchor
+        self._anchor = None
+        # rollback 退回过的最远位置，同一段多次退回时只计一次 dropped_frames
+        self._dropped_until = 0
+        self.stats = {
+            'gap_frames': 0,
+            'skipped_frames': 0,
+            'fill_frames': 0,
+            'dropped_frames': 0,
+            'resyncs': 0,
+        }
+
+    def qpc_to_frame(self, qpc_position):
+        return (qpc_position - self.start_qpc) * self.sample_rate // QPC_FREQUENCY
+
+    def place(self, device_position, qpc_position, num_frames, qpc_valid=True):
+        """定位一个数据包，返回 (时间线位置, 之前需要补的静音帧数, 开头需要丢弃的帧数)"""
+        if qpc_valid:
+            qpc_frame = self.qpc_to_frame(qpc_position)
+            if self._anchor is None:
+                self._anchor = qpc_frame - device_position
+            elif abs(self._anchor + device_position - qpc_frame) > self.resync_frames:
+                self._anchor = qpc_frame - device_position
+                self.stats['resyncs'] += 1
+        elif self._anchor is None:
+            self._anchor = self.written - device_position
+
+        position = self._anchor + device_position
+        gap = position - self.written
+        if gap >= 0:
+            skip = 0
+            self.stats['gap_frames'] += gap
+        else:
+            # 与已写入的部分重叠（已经按静音补过），丢弃重叠的帧
+            gap = 0
+            skip = min(self.written - position, num_frames)
+            self.stats['skipped_frames'] += skip
+        self.written = max(self.written, position + num_frames)
+        return position, gap, skip
+
+    def reanchor(self):
+        """设备重新打开后设备位置从零开始，下一个数据包按其 QPC 重新定位"""
+        self._anchor = None
+
+    def rollback(self, frame):
+        """环形缓冲区已满，frame 之后的帧没有写入：已写入位置退回 frame，返回退回的帧数
+
+        退回的部分由之后的数据包（作为空档）或补静音重新补齐，音轨长度不变。
+        """
+        frames = max(0, self.written - frame)
+        if frames:
+            self.stats['dropped_frames'] += max(0, self.written - max(frame, self._dropped_until))
+            self._dropped_until = max(self._dropped_until, self.written)
+            self.written = frame
+        return frames
+
+    def fill_until(self, frame):
+        """补静音到 frame，返回需要补的帧数"""
+        frames = max(0, frame - self.written)
+        self.written += frames
+        self.stats['fill_frames'] += frames
+        return frames
+
+class TimestampLog:
+    """逐包时间戳旁路文件 (CSV)
+
+    采集线程调用 record 只把记录放入队列，flush 由写线程调用，写出队列中的记录。
+    文件开头的注释行记录采样率、start_qpc 和录制开始的墙上时间，
+    合并时用 start_time 对齐音轨与视频。
+    """
+    def __init__(self, filename, sample_rate, start_qpc, start_time):
+        self.filename = filename
+        self._pending = deque()
+        self._file = open(filename, 'w', newline='')
+        self._file.write(f"# sample_rate={sample_rate} qpc_frequency={QPC_FREQUENCY} "
+                         f"start_qpc={start_qpc} start_time={start_time:.6f}\n")
+        self._file.write(','.join(TIMESTAMP_COLUMNS) + '\n')
+
+    def record(self, kind, timeline_frame, frames, device_position='', qpc_position='',
+               flags='', gap_frames=0, skipped_frames=0):
+        self._pending.append((kind, timeline_frame, frames, device_position, qpc_position,
+                              flags, gap_frames, skipped_frames))
+
+    def flush(self):
+        if self._file is None or not self._pending:
+            return
+        lines = []
+        while self._pending:
+            lines.append(','.join(map(str, self._pending.popleft())))
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+def read_timestamps(filename, metadata_only=False):
+    """读取时间戳旁路文件，返回 (元数据字典, 记录列表)；metadata_only 时只读文件头"""
+    metadata = {}
+    rows = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#'):
+                for item in line[1:].split():
+                    key, _, value = item.partition('=')
+                    metadata[key] = float(value) if '.' in value else int(value)
+            elif metadata_only:
+                break
+            elif line and not line.startswith('kind'):
+                rows.append(dict(zip(TIMESTAMP_COLUMNS, line.split(','))))
+    return metadata, rows
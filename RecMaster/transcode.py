@@ -0,0 +1,286 @@
+# 后台转码：先以近无损的快速参数录制，录制结束后在低优先级的进程中压缩到选定的质量
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime
+from .calibration import DEFAULT_QUALITY_PARAMS, PROFILE_DIR, X264_PRESETS, quality_params
+from .encoder_telemetry import EncoderTelemetry, PROGRESS_ARGS
+
+# 转码任务状态，进程退出时保存，下次启动后继续未完成的任务
+QUEUE_FILE = 'transcode_queue.json'
+
+# 后台转码不需要实时，preset 至少为 slow
+TRANSCODE_MIN_PRESET = 'slow'
+
+def probe_duration(filename):
+    """媒体文件的时长（秒），无法读取时返回 None"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', filename],
+            capture_output=True, text=True
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+def transcode_params(quality):
+    """某个质量档位的转码参数：crf/码率与录制相同，preset 取未校准的默认值且不快于 TRANSCODE_MIN_PRESET"""
+    params = quality_params(quality)
+    preset = max(DEFAULT_QUALITY_PARAMS[quality]['preset'], TRANSCODE_MIN_PRESET,
+                 key=X264_PRESETS.index)
+    return {'preset': preset, 'crf': params['crf'], 'video_bitrate': params['video_bitrate']}
+
+def _low_priority():
+    """启动低优先级子进程的 Popen 参数"""
+    if os.name == 'nt':
+        return {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+    return {'preexec_fn': lambda: os.nice(19)}
+
+class TranscodeQueue:
+    """后台转码队列
+
+    submit 加入一个转码任务：视频以 transcode_params(quality) 重新编码，音频直接复制，
+    先写到同目录的临时文件，完成后用 os.replace 原子地替换 output_file（默认为输入文件本身）。
+    最多 workers 个 ffmpeg 同时运行，进程优先级为最低，threads 限制每个 x264 的线程数。
+    任务列表保存在 state_dir/transcode_queue.json 中，程序退出或崩溃时正在转码的任务
+    在下次创建队列时重新开始：可以恢复的是任务本身，转码从头重新进行（删除写了一半的临时文件），
+    不从中断的位置续传。ffmpeg 无法启动时任务标记为 failed。
+    进度由 ffmpeg -progress 的输出时长除以输入时长得到。
+    """
+    def __init__(self, workers=1, state_dir=PROFILE_DIR, threads=None, low_priority=True):
+        self.workers = workers
+        self.threads = threads
+        self.low_priority = low_priority
+        self.state_file = os.path.join(state_dir, QUEUE_FILE)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queue = queue.Queue()
+        self._processes = {}
+        self._closing = False
+        self.jobs = self._load()
+        for job in self.jobs.values():
+            if job['status'] in ('queued', 'running'):
+                # 上次没有完成：删除写了一半的临时文件，从头开始
+                self._remove_tmp(job)
+                job.update(status='queued', progress=0.0)
+                self._queue.put(job['id'])
+        self._save()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _load(self):
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                # 已完成的任务不再保留，失败的任务留给用户查看
+                return {job['id']: job for job in json.load(f) if job['status'] != 'done'}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _save(self):
+        """在持有 _lock 或没有其他线程时调用"""
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(list(self.jobs.values()), f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.state_file)
+
+    @staticmethod
+    def _tmp_filename(job):
+        base, ext = os.path.splitext(job['output_file'])
+        return f'{base}.transcoding{ext}'
+
+    def _remove_tmp(self, job):
+        try:
+            os.remove(self._tmp_filename(job))
+        except OSError:
+            # 不存在，或者被其他程序占用（Windows），留给下次转码覆盖
+            pass
+
+    def submit(self, input_file, quality, output_file=None):
+        """加入转码任务，返回任务 id"""
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'input_file': os.path.abspath(input_file),
+            'output_file': os.path.abspath(output_file or input_file),
+            'quality': quality,
+            'status': 'queued',
+            'progress': 0.0,
+            'error': None,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'input_bytes': os.path.getsize(input_file),
+            'output_bytes': None,
+            'media_seconds': None,
+            'encode_seconds': None,
+        }
+        with self._lock:
+            self.jobs[job['id']] = job
+            self._save()
+        self._queue.put(job['id'])
+        print(f"[Transcode] 已加入队列: {input_file} (质量 {quality})")
+        return job['id']
+
+    def _build_command(self, job, output_file):
+        params = transcode_params(job['quality'])
+        cmd = [
+            'ffmpeg', '-y', '-i', job['input_file'],
+            '-map', '0',
+            '-c:v', 'libx264',
+            '-preset', params['preset'],
+            '-crf', str(params['crf']),
+            '-b:v', params['video_bitrate'],
+            '-pix_fmt', 'yuv420p',
+            '-c:a', 'copy',
+        ]
+        if self.threads:
+            cmd.extend(['-threads', str(self.threads)])
+        cmd.extend(PROGRESS_ARGS)
+        cmd.append(output_file)
+        return cmd
+
+    def _worker(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            job = self.jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        tmp = self._tmp_filename(job)
+        with self._lock:
+            if self._closing:
+                return
+            job.update(status='running', started=datetime.now().isoformat(timespec='seconds'))
+            self._save()
+        duration = probe_duration(job['input_file'])
+        start = time.perf_counter()
+        try:
+            process = subprocess.Popen(
+                self._build_command(job, tmp),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **(_low_priority() if self.low_priority else {})
+            )
+        except OSError as e:
+            # 找不到 ffmpeg 等：任务失败，不能一直停在 running
+            with self._lock:
+                job.update(status='failed', error=f"无法启动 ffmpeg: {e}")
+                self._save()
+                self._idle.notify_all()
+            print(f"[Transcode] 转码失败 {job['input_file']}: {job['error']}")
+            return
+        with self._lock:
+            self._processes[job['id']] = process
+            # shutdown 可能在启动期间取走了进程列表，这里补上结束
+            closing = self._closing
+        if closing:
+            process.kill()
+        telemetry = EncoderTelemetry(process)
+        while telemetry.wait_update(timeout=5.0) or not telemetry.get_stats()['ended']:
+            if duration:
+                job['progress'] = min(1.0, telemetry.get_stats()['out_time'] / duration)
+        process.wait()
+        telemetry.join()
+        with self._lock:
+            self._processes.pop(job['id'], None)
+            try:
+                if self._closing:
+                    # 退出时被结束的任务保持排队状态，下次从头重新转码
+                    self._remove_tmp(job)
+                    job.update(status='queued', progress=0.0)
+                elif process.returncode:
+                    self._remove_tmp(job)
+                    job.update(status='failed', error='\n'.join(telemetry.log_tail(5)))
+                    print(f"[Transcode] 转码失败 {job['input_file']}: {job['error']}")
+                else:
+                    self._finish(job, tmp, duration, time.perf_counter() - start)
+            finally:
+                # 任务无论如何都要离开 running，否则 wait() 永远等不到
+                if job['status'] == 'running':
+                    job.update(status='failed', error=job.get('error') or '转码结束时出错')
+                try:
+                    self._save()
+                except OSError as e:
+                    # 任务状态文件同样可能被占用，下次保存时一并写入
+                    print(f"[Transcode] 无法保存任务列表: {e}")
+                self._idle.notify_all()
+
+    def _finish(self, job, tmp, duration, encode_seconds):
+        """转码成功：临时文件替换输出文件，删除原文件（在持有 _lock 时调用）
+
+        Windows 上输出文件被播放器等打开时 os.replace 抛出 PermissionError，此时任务失败，
+        原文件保留；只有删除原文件失败时任务仍算完成，原文件留在原处。
+        """
+        try:
+            os.replace(tmp, job['output_file'])
+            output_bytes = os.path.getsize(job['output_file'])
+        except OSError as e:
+            self._remove_tmp(job)
+            job.update(status='failed', error=f"无法写入输出文件: {e}")
+            print(f"[Transcode] 转码失败 {job['input_file']}: {job['error']}")
+            return
+        job.update(
+            status='done',
+            progress=1.0,
+            finished=datetime.now().isoformat(timespec='seconds'),
+            output_bytes=output_bytes,
+            media_seconds=duration,
+            encode_seconds=encode_seconds,
+        )
+        if job['input_file'] != job['output_file']:
+            try:
+                os.remove(job['input_file'])
+            except OSError as e:
+                job['error'] = f"无法删除原文件: {e}"
+                print(f"[Transcode] {job['error']}")
+        print(f"[Transcode] 完成 {job['output_file']} "
+              f"({job['input_bytes'] / 1e6:.1f} MB -> {job['output_bytes'] / 1e6:.1f} MB, "
+              f"{job['encode_seconds']:.1f}s)")
+
+    def pending(self):
+        """排队和正在转码的任务数"""
+        return sum(1 for job in self.jobs.values() if job['status'] in ('queued', 'running'))
+
+    def wait(self, timeout=None):
+        """等待所有任务结束，返回是否全部结束"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.pending() == 0, timeout)
+
+    def get_stats(self):
+        """各状态的任务数、正在转码的进度和已完成任务的吞吐量（媒体秒数 / 转码秒数）"""
+        with self._lock:
+            jobs = [dict(job) for job in self.jobs.values()]
+        stats = {status: sum(1 for job in jobs if job['status'] == status)
+                 for status in ('queued', 'running', 'done', 'failed')}
+        stats['running_progress'] = [job['progress'] for job in jobs if job['status'] == 'running']
+        done = [job for job in jobs if job['status'] == 'done' and job['media_seconds']]
+        encode_seconds = sum(job['encode_seconds'] for job in done)
+        stats['throughput'] = (sum(job['media_seconds'] for job in done) / encode_seconds
+                               if encode_seconds else None)
+        return stats
+
+    def shutdown(self):
+        """结束所有转码进程；未完成的任务保存为排队状态，下次创建队列时从头重新转码"""
+        with self._lock:
+            self._closing = True
+            processes = list(self._processes.values())
+        for process in processes:
+            process.kill()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        with self._lock:
+            for job in self.jobs.values():
+                if job['status'] == 'running':
+                    job.update(status='queued', progress=0.0)
+            self._save()
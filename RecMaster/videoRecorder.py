@@ -3,366 +3,38 @@ from tkinter import ttk, messagebox
 import threading
 import time
 from datetime import datetime
-import subprocess
 import os
 import humanize
 import traceback
-import win32gui
-import win32api
-import win32con
-from ctypes import windll, WINFUNCTYPE, POINTER, Structure, c_int, c_void_p, c_bool, byref
 from .audio_recorder import AudioRecorderManager
+from .screen_recorder import PROXY_RENDITION, ScreenInfo, ScreenRecorder
+from .muxed_recording import MuxedRecording
+from .encoder_governor import EncoderGovernor
+from .calibration import calibrate, quality_params
+from .merge import SegmentMerger, audio_offset, merge_command
+from .recovery import recover_directory
+from .transcode import TranscodeQueue
+from .jobs import Job, JobPool
 import getpass
 
-# 定义必要的结构和类型
-class RECT(Structure):
-    _fields_ = [
-        ('left', c_int),
-        ('top', c_int),
-        ('right', c_int),
-        ('bottom', c_int)
-    ]
-
-class ScreenInfo:
-    def __init__(self):
-        # 设置进程为DPI感知
-        try:
-            windll.shcore.SetProcessDpiAwareness(2)  # PROCESS_PER_MONITOR_DPI_AWARE
-        except Exception:
-            windll.user32.SetProcessDPIAware()
-
-    @staticmethod
-    def get_dpi_scaling(monitor):
-        """获取显示器的DPI缩放值"""
-        try:
-            # 获取监视器句柄对应的DC
-            monitor_info = win32api.GetMonitorInfo(monitor)
-            monitor_handle = win32api.MonitorFromRect(monitor_info['Monitor'])
-            
-            # 使用 GetDpiForWindow 获取DPI
-            hwnd = win32gui.WindowFromPoint((monitor_info['Monitor'][0], monitor_info['Monitor'][1]))
-            dpi = windll.user32.GetDpiForWindow(hwnd)
-            
-            if dpi:
-                return dpi / 96.0
-                
-            # 备用方法：使用DC获取DPI
-            dc = win32gui.GetDC(hwnd)
-            dpi_x = win32gui.GetDeviceCaps(dc, win32con.LOGPIXELSX)
-            win32gui.ReleaseDC(hwnd, dc)
-            
-            return dpi_x / 96.0
-            
-        except Exception as e:
-            print(f"Error getting DPI scaling: {e}")
-            # 最后的备用方法
-            try:
-                dc = win32gui.GetDC(0)
-                dpi = win32gui.GetDeviceCaps(dc, win32con.LOGPIXELSX)
-                win32gui.ReleaseDC(0, dc)
-                return dpi / 96.0
-            except Exception as e2:
-                print(f"Error getting DPI scaling (backup method): {e2}")
-                return 1.0
-
-    @staticmethod
-    def get_real_resolution():
-        """获取所有显示器的真实分辨率（考虑缩放）"""
-        # 确保DPI感知已设置
-        ScreenInfo()
-        
-        monitors = []
-        
-        def callback(monitor, dc, rect, data):
-            monitor_info = win32api.GetMonitorInfo(monitor)
-            scaling = ScreenInfo.get_dpi_scaling(monitor)
-            print(f"Debug - Monitor DPI scaling: {scaling}")
-            
-            # 获取显示器物理位置
-            monitor_rect = monitor_info['Monitor']
-            x = monitor_rect[0]
-            y = monitor_rect[1]
-            width = monitor_rect[2] - monitor_rect[0]
-            height = monitor_rect[3] - monitor_rect[1]
-            
-            # 应用DPI缩放
-            real_width = int(width)  # 不需要再次缩放，因为已经是DPI感知的
-            real_height = int(height)
-            
-            monitors.append({
-                'x': x,
-                'y': y,
-                'width': real_width,
-                'height': real_height,
-                'scaling': scaling
-            })
-            return True
-
-        # 正确定义回调函数类型
-        MONITORENUMPROC = WINFUNCTYPE(c_bool, c_void_p, c_void_p, POINTER(RECT), c_void_p)
-        callback_function = MONITORENUMPROC(callback)
-        
-        # 枚举显示器
-        windll.user32.EnumDisplayMonitors(None, None, callback_function, 0)
-        
-        return monitors
-
-class ScreenRecorder:
-    def __init__(self, quality=3):
-        self.quality = max(1, min(5, quality))
-        self._set_quality_params()
-        self.recording = False
-        self.output_file = None
-        self.current_fps = 0
-        self.width = 0
-        self.height = 0
-        self.process = None
-        self.monitors = ScreenInfo.get_real_resolution()
-        self.border_hwnd = None
-
-    def _set_quality_params(self):
-        # 质量参数配置
-        quality_params = {
-            1: {  # 最低质量
-                'fps': 15,
-                'crf': 32,
-                'preset': 'ultrafast',
-                'video_bitrate': '1000k',
-            },
-            2: {  # 低质量
-                'fps': 20,
-                'crf': 28,
-                'preset': 'veryfast',
-                'video_bitrate': '1500k',
-            },
-            3: {  # 中等质量
-                'fps': 24,
-                'crf': 23,
-                'preset': 'medium',
-                'video_bitrate': '2500k',
-            },
-            4: {  # 高质量
-                'fps': 30,
-                'crf': 20,
-                'preset': 'slow',
-                'video_bitrate': '4000k',
-            },
-            5: {  # 最高质量
-                'fps': 60,
-                'crf': 18,
-                'preset': 'veryslow',
-                'video_bitrate': '6000k',
-            }
-        }
-        
-        params = quality_params[self.quality]
-        self.fps = params['fps']
-        self.crf = params['crf']
-        self.preset = params['preset']
-        self.video_bitrate = params['video_bitrate']
-
-    def show_recording_border(self, x, y, width, height, master_window):
-        """显示录制区域的边框"""
-        try:
-            # 清理旧的边框窗口
-            if hasattr(self, 'border_hwnd') and self.border_hwnd:
-                win32gui.DestroyWindow(self.border_hwnd)
-                self.border_hwnd = None
-
-            # 注册窗口类
-            wc = win32gui.WNDCLASS()
-            wc.lpszClassName = "RecordingBorder"
-            wc.hbrBackground = win32gui.GetStockObject(win32con.NULL_BRUSH)
-            wc.style = win32con.CS_HREDRAW | win32con.CS_VREDRAW
-            wc.lpfnWndProc = win32gui.DefWindowProc
-            wc.hCursor = win32gui.LoadCursor(0, win32con.IDC_ARROW)
-            
-            try:
-                win32gui.RegisterClass(wc)
-            except Exception:
-                # 类可能已经注册
-                pass
-
-            # 创建窗口
-            ex_style = (
-                win32con.WS_EX_LAYERED |      # 分层窗口
-                win32con.WS_EX_TRANSPARENT |  # 点击穿透
-                win32con.WS_EX_TOPMOST       # 总在最前
-            )
-            style = win32con.WS_POPUP | win32con.WS_VISIBLE
-
-            self.border_hwnd = win32gui.CreateWindowEx(
-                ex_style,
-                wc.lpszClassName,
-                "Border",
-                style,
-                x, y, width, height,
-                0, 0, 0, None
-            )
-
-            # 设置窗口透明度和颜色
-            win32gui.SetLayeredWindowAttributes(
-                self.border_hwnd,
-                win32api.RGB(0, 0, 0),  # 黑色将被透明
-                255,  # 不透明度
-                win32con.LWA_COLORKEY
-            )
-
-            # 创建设备上下文
-            hdc = win32gui.GetDC(self.border_hwnd)
-            
-            # 创建画笔
-            pen = win32gui.CreatePen(win32con.PS_SOLID, 2, win32api.RGB(255, 0, 0))  # 2像素红色边框
-            
-            # 选择画笔
-            old_pen = win32gui.SelectObject(hdc, pen)
-            
-            # 画矩形
-            win32gui.MoveToEx(hdc, 0, 0)
-            win32gui.LineTo(hdc, width - 1, 0)
-            win32gui.LineTo(hdc, width - 1, height - 1)
-            win32gui.LineTo(hdc, 0, height - 1)
-            win32gui.LineTo(hdc, 0, 0)
-            
-            # 清理资源
-            win32gui.SelectObject(hdc, old_pen)
-            win32gui.DeleteObject(pen)
-            win32gui.ReleaseDC(self.border_hwnd, hdc)
-
-            # 显示窗口
-            win32gui.ShowWindow(self.border_hwnd, win32con.SW_SHOW)
-            win32gui.UpdateWindow(self.border_hwnd)
-
-            # 创建一个线程来保持边框可见
-            def keep_border_visible():
-                while self.recording:
-                    if self.border_hwnd:
-                        try:
-                            win32gui.SetWindowPos(
-                                self.border_hwnd, win32con.HWND_TOPMOST,
-                                x, y, width, height,
-                                win32con.SWP_NOACTIVATE | win32con.SWP_SHOWWINDOW
-                            )
-                        except Exception:
-                            break
-                    time.sleep(0.1)
-
-            border_thread = threading.Thread(target=keep_border_visible)
-            border_thread.daemon = True
-            border_thread.start()
-
-            print(f"边框窗口已创建: {width}x{height} at ({x}, {y})")
-
-        except Exception as e:
-            print(f"Error showing recording border: {e}")
-            traceback.print_exc()
-
-    def start_recording(self, start_x, start_y, end_x, end_y):
-        try:
-            # 在开始录制视频前记录时间戳
-            video_start_time = time.time()
-            print(f"\n[Video] About to start recording at: {video_start_time}")
-            
-            print(f"\n[Video] Recording start timestamp: {time.time()}")
-            print(f"Debug - Original coordinates: start=({start_x}, {start_y}), end=({end_x}, {end_y})")
-            # 找到选择区域所在的显示器和对应的缩放比例
-            scaling = 1.0
-            monitor_found = None
-            for monitor in self.monitors:
-                if (monitor['x'] <= start_x <= monitor['x'] + monitor['width'] and
-                    monitor['y'] <= start_y <= monitor['y'] + monitor['height']):
-                    scaling = monitor['scaling']
-                    monitor_found = monitor
-                    break
-            
-            if monitor_found:
-                print(f"Debug - Monitor found: x={monitor_found['x']}, y={monitor_found['y']}, scaling={scaling}")
-                # 计算录制区域（坐标已经是DPI感知的）
-                left = min(start_x, end_x)
-                top = min(start_y, end_y)
-                self.width = abs(end_x - start_x)
-                self.height = abs(end_y - start_y)
-            else:
-                left = min(start_x, end_x)
-                top = min(start_y, end_y)
-                self.width = abs(end_x - start_x)
-                self.height = abs(end_y - start_y)
-            
-            # 确保宽度和高度是偶数
-            self.width = self.width - (self.width % 2)
-            self.height = self.height - (self.height % 2)
-            
-            print(f"Debug - Recording area: left={left}, top={top}, width={self.width}, height={self.height}, scaling={scaling}")
-            
-            # Create output filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.output_file = f'screen_recording_{timestamp}.mp4'
-            
-            cmd = [
-                'ffmpeg',
-                '-f', 'gdigrab',
-                '-framerate', str(self.fps),
-                '-offset_x', str(left),
-                '-offset_y', str(top),
-                '-video_size', f'{self.width}x{self.height}',
-                '-draw_mouse', '1',
-                '-i', 'desktop',
-                '-c:v', 'libx264',
-                '-preset', self.preset,
-                '-crf', str(self.crf),
-                '-b:v', self.video_bitrate,
-                '-pix_fmt', 'yuv420p',
-                self.output_file
-            ]
-            
-            # 启动 ffmpeg
-            self.process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            self.recording = True
-            
-            # 在启动ffmpeg后立即记录时间戳
-            print(f"[Video] FFmpeg process started at: {time.time()}")
-            
-            # 返回录制区域的信息
-            return {
-                'left': left,
-                'top': top,
-                'width': self.width,
-                'height': self.height
-            }
-            
-        except Exception as e:
-            self.recording = False
-            print(f"Recording error: {str(e)}")
-            traceback.print_exc()
-            messagebox.showerror("Error", f"Recording error: {str(e)}")
-            return None
-
-    def stop_recording(self):
-        if self.recording:
-            self.recording = False
-            if self.process:
-                try:
-                    self.process.communicate(input=b'q', timeout=5)
-                except subprocess.TimeoutExpired:
-                    self.process.kill()
-                    self.process.wait()
-                except Exception as e:
-                    print(f"Error stopping recording: {e}")
-                    self.process.kill()
-                    self.process.wait()
-            
-            # 移除边框窗口
-            if hasattr(self, 'border_hwnd') and self.border_hwnd:
-                try:
-                    win32gui.DestroyWindow(self.border_hwnd)
-                    self.border_hwnd = None
-                except Exception as e:
-                    print(f"Error destroying border window: {e}")
+# 分段录制时每个分段的时长（秒）
+SEGMENT_SECONDS = 300
+
+# 输出分辨率选项：(显示名称, ScreenRecorder 的缩放参数)
+SCALE_OPTIONS = [
+    ("原始分辨率", {}),
+    ("逻辑像素（按 DPI 缩放缩小）", {'scale': 'logical'}),
+    ("不超过 1920x1080", {'max_size': (1920, 1080)}),
+    ("不超过 1280x720", {'max_size': (1280, 720)}),
+    ("50%", {'scale': 0.5}),
+]
+
+# 输出格式选项：(显示名称, ScreenRecorder 的 container)
+CONTAINER_OPTIONS = [
+    ("分片 MP4（防崩溃）", 'fmp4'),
+    ("MKV（防崩溃）", 'mkv'),
+    ("MP4", 'mp4'),
+]
 
 class RecordingPathManager:
     def __init__(self):
@@ -392,6 +64,11 @@ class RecordingPathManager:
             return os.path.join(self.base_dir, 
                 f"{self.timestamp}_audio_out_{device_name}.wav")
     
+    def get_mixed_audio_filename(self):
+        """生成录制时实时混音的文件名"""
+        return os.path.join(self.base_dir, 
+            f"{self.timestamp}_audio_mix.wav")
+    
     def get_video_filename(self):
         """生成视频文件名"""
         return os.path.join(self.base_dir, 
@@ -404,15 +81,20 @@ class RecordingPathManager:
 
 class RecorderUI:
     def __init__(self):
+        # 启动耗时：window_seconds 为窗口第一次绘制，devices_seconds 为设备列表填充完成
+        self._init_start = time.perf_counter()
+        self.startup = {}
         self.window = tk.Tk()
         self.window.title("RecMaster")
         self.window.geometry("400x600")
         self.window.resizable(True, True)
         
-        # 获取屏幕信息
-        self.monitors = ScreenInfo.get_real_resolution()
+        # 显示器和音频设备在窗口显示之后才枚举（见 load_environment）
+        self.monitors = []
         
         self.recorder = None
+        self.muxed = None
+        self.segment_merger = None
         self.recording = False
         self.start_time = None
         self.update_thread = None
@@ -425,7 +107,24 @@ class RecorderUI:
         self.path_manager = RecordingPathManager()
         
         self.selected_indices = set()  # 添加这行来跟踪选中的索引
+        self._device_refresh_pending = False
+        
+        self.current_audio_files = []
+        self._closing = False
+        
+        # 录制停止后的收尾任务（等待编码器、合并音视频），与下一次录制同时进行
+        self.jobs = JobPool(workers=2)
+        # 两阶段录制的后台转码队列，上次没有完成的任务在这里继续
+        self.transcode_queue = TranscodeQueue()
         self.setup_ui()
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_background()
+        
+        # 修复上次没有正常结束的录制（崩溃、强制结束）
+        threading.Thread(target=self.recover_leftovers, daemon=True).start()
+        
+        # after_idle 中再 after(0)：排在窗口第一次绘制的空闲任务之后
+        self.window.after_idle(self.window.after, 0, self.load_environment)
         
     def setup_ui(self):
         # 质量选择
@@ -439,9 +138,61 @@ class RecorderUI:
                     ("高质量", 4),
                     ("最高质量", 5)]
                     
+        self.quality_buttons = {}
         for text, value in qualities:
-            ttk.Radiobutton(quality_frame, text=text, value=value, 
-                           variable=self.quality_var).pack(anchor="w")
+            button = ttk.Radiobutton(quality_frame, text=text, value=value, 
+                                     variable=self.quality_var)
+            button.pack(anchor="w")
+            self.quality_buttons[value] = (button, text)
+        # 选项后面的 preset/帧率要读取校准结果，在窗口显示之后填充（见 load_environment）
+        
+        # 在本机试编码，生成本机的质量参数表
+        self.calibrate_button = ttk.Button(quality_frame, text="校准编码器",
+                                           command=self.calibrate_encoder)
+        self.calibrate_button.pack(anchor="w", pady=2)
+        
+        # 编码跟不上实时时自动降低 preset/帧率
+        self.governor_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_frame, text="自动调节编码（跟不上实时时降低预设/帧率）",
+                        variable=self.governor_var).pack(anchor="w")
+        
+        # 画面大部分时间静止时丢弃重复帧，输出可变帧率
+        self.static_mode_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_frame, text="静态画面模式（丢弃重复帧）",
+                        variable=self.static_mode_var).pack(anchor="w")
+        
+        # 长时间录制：按 5 分钟分段，录制过程中逐段合并音视频
+        self.segmented_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_frame, text="分段录制（停止后快速生成文件）",
+                        variable=self.segmented_var).pack(anchor="w")
+        
+        # 录制时只做最快的近无损编码，停止后在后台以低优先级压缩到选定质量
+        self.two_phase_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_frame, text="先快速录制，后台压缩（录制时占用 CPU 最少）",
+                        variable=self.two_phase_var).pack(anchor="w")
+        
+        # 同一次采集同时编码一个 720p 低码率代理文件
+        self.proxy_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(quality_frame, text="同时输出 720p 代理文件",
+                        variable=self.proxy_var).pack(anchor="w")
+        
+        # 输出分辨率：高 DPI 屏幕按逻辑像素录制可以大幅降低编码开销
+        scale_row = ttk.Frame(quality_frame)
+        scale_row.pack(anchor="w", pady=2)
+        ttk.Label(scale_row, text="输出分辨率:").pack(side="left")
+        self.scale_combo = ttk.Combobox(scale_row, state="readonly",
+                                        values=[name for name, _ in SCALE_OPTIONS])
+        self.scale_combo.current(0)
+        self.scale_combo.pack(side="left", padx=5)
+        
+        # 输出格式：防崩溃格式在程序或系统崩溃时保留已录制的内容
+        container_row = ttk.Frame(quality_frame)
+        container_row.pack(anchor="w", pady=2)
+        ttk.Label(container_row, text="输出格式:").pack(side="left")
+        self.container_combo = ttk.Combobox(container_row, state="readonly",
+                                            values=[name for name, _ in CONTAINER_OPTIONS])
+        self.container_combo.current(0)
+        self.container_combo.pack(side="left", padx=5)
         
         # 添加音频设备选择区域
         audio_frame = ttk.LabelFrame(self.window, text="音频设备", padding=10)
@@ -463,14 +214,16 @@ class RecorderUI:
         # 绑定输入设备选择事件
         self.input_combo.bind('<<ComboboxSelected>>', self.on_input_select)
         
+        # 单次录制：音频直接送入录屏的 ffmpeg，停止后不需要合并
+        self.single_pass_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(audio_frame, text="单次录制（直接输出带音轨的视频）",
+                        variable=self.single_pass_var).pack(anchor="w")
+        
         # 刷新音频设备按钮
         refresh_audio_btn = ttk.Button(audio_frame, text="刷新音频设备",
-                                     command=self.refresh_audio_devices)
+                                     command=lambda: self.refresh_audio_devices(refresh=True))
         refresh_audio_btn.pack(pady=2)
         
-        # 初始化音频设备列表
-        self.refresh_audio_devices()
-        
         # 状态显示区域
         status_frame = ttk.LabelFrame(self.window, text="录制状态", padding=10)
         status_frame.pack(fill="x", padx=10, pady=5)
@@ -481,7 +234,10 @@ class RecorderUI:
             ("time", "录制时间: 00:00:00"),
             ("size", "文件大小: 0 MB"),
             ("fps", "帧率: 0 fps"),
+            ("encoder", "编码: -"),
             ("resolution", "分辨率: -"),
+            ("finalize", "收尾: -"),
+            ("transcode", "后台压缩: -"),
         ]
         
         for i, (key, text) in enumerate(status_items):
@@ -501,12 +257,74 @@ class RecorderUI:
                                     command=self.stop_recording, state="disabled")
         self.stop_button.pack(side="left", padx=5)
         
+        self.cancel_button = ttk.Button(control_frame, text="取消收尾",
+                                        command=self.cancel_finalize, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
+        
         # 进度条
         self.progress_var = tk.DoubleVar()
         self.progress = ttk.Progressbar(self.window, variable=self.progress_var, 
                                       maximum=100)
         self.progress.pack(fill="x", padx=10, pady=5)
 
+    def _refresh_quality_labels(self):
+        """质量选项后面显示实际使用的 preset 和帧率（校准后为本机的结果）"""
+        for level, (button, text) in self.quality_buttons.items():
+            params = quality_params(level)
+            button.config(text=f"{text} ({params['preset']}, {params['fps']} fps)")
+
+    def calibrate_encoder(self):
+        """后台运行编码器校准，完成后更新质量选项"""
+        self.calibrate_button.config(state="disabled", text="正在校准...")
+        
+        def run():
+            try:
+                calibrate()
+                error = None
+            except Exception as e:
+                traceback.print_exc()
+                error = str(e)
+            self.window.after(0, finish, error)
+        
+        def finish(error):
+            self.calibrate_button.config(state="normal", text="校准编码器")
+            if error:
+                messagebox.showerror("错误", f"校准失败: {error}")
+            else:
+                self._refresh_quality_labels()
+                messagebox.showinfo("完成", "已生成本机的质量参数表")
+        
+        threading.Thread(target=run, daemon=True).start()
+
+    def recover_leftovers(self):
+        """后台修复录制目录中没有正常结束的录制，完成后提示结果"""
+        try:
+            results = recover_directory(self.path_manager.base_dir)
+        except Exception as e:
+            print(f"[Recovery] 修复失败: {e}")
+            traceback.print_exc()
+            return
+        if not results:
+            return
+        lines = [f"{'已恢复' if r['status'] == 'recovered' else '无法恢复'}: {r['output_file']}"
+                 for r in results]
+        self.window.after(0, messagebox.showinfo, "恢复录制", "上次有录制没有正常结束:\n" + "\n".join(lines))
+
+    def load_environment(self):
+        """窗口显示后读取质量参数表、枚举显示器和音频设备，填充质量选项和设备列表"""
+        # 先处理掉排队的绘制事件，枚举期间窗口已经是完整的
+        self.window.update()
+        self.startup['window_seconds'] = time.perf_counter() - self._init_start
+        self._refresh_quality_labels()
+        self.monitors = ScreenInfo.get_real_resolution()
+        self.refresh_audio_devices()
+        self.startup['devices_seconds'] = time.perf_counter() - self._init_start
+        # 插拔设备、切换默认设备时自动刷新列表
+        if self.audio_manager.device_catalog is not None:
+            self.audio_manager.device_catalog.add_listener(self.on_device_change)
+        print(f"[Startup] window {self.startup['window_seconds'] * 1000:.0f} ms, "
+              f"devices {self.startup['devices_seconds'] * 1000:.0f} ms")
+
     def on_output_select(self, event):
         """处理输出设备选择变化"""
         current_selection = set(self.output_listbox.curselection())
@@ -519,8 +337,18 @@ class RecorderUI:
         for index in self.selected_indices:
             self.output_listbox.selection_set(index)
 
-    def refresh_audio_devices(self):
-        """刷新音频设备列表"""
+    def on_device_change(self, event, device_id, flow):
+        """设备通知（在音频服务的线程中调用）：合并短时间内的多个通知，稍后在界面线程刷新列表"""
+        if not self._device_refresh_pending:
+            self._device_refresh_pending = True
+            self.window.after(200, self._refresh_after_change)
+
+    def _refresh_after_change(self):
+        self._device_refresh_pending = False
+        self.refresh_audio_devices()
+
+    def refresh_audio_devices(self, refresh=False):
+        """刷新音频设备列表；设备由目录缓存，refresh=True 时重新读取所有设备"""
         try:
             print("\n[Audio] Refreshing audio devices...")
             # 保存当前选择的设备名称
@@ -532,7 +360,7 @@ class RecorderUI:
             self.input_combo.set('')
             
             # 获取设备列表
-            output_devices, input_devices = self.audio_manager.get_available_devices()
+            output_devices, input_devices = self.audio_manager.get_available_devices(refresh=refresh)
             
             print(f"[Audio] Found {len(output_devices)} output devices and {len(input_devices)} input devices")
             
@@ -574,7 +402,19 @@ class RecorderUI:
             self.path_manager.initialize_timestamp()
             
             # 初始化录屏器
-            self.recorder = ScreenRecorder(quality=self.quality_var.get())
+            self.recorder = ScreenRecorder(
+                quality=self.quality_var.get(),
+                governor=EncoderGovernor() if self.governor_var.get() else None,
+                static_mode=self.static_mode_var.get(),
+                segment_seconds=SEGMENT_SECONDS if self.segmented_var.get() else None,
+                container=CONTAINER_OPTIONS[self.container_combo.current()][1],
+                two_phase=self.two_phase_var.get(),
+                renditions=[PROXY_RENDITION] if self.proxy_var.get() else None,
+                # 缩小时 area 保留文字细节
+                scaler='area',
+                **SCALE_OPTIONS[self.scale_combo.current()][1]
+            )
+            self.segment_merger = None
             
             # 获取选中的音频设备（但暂时不开始录制）
             selected_outputs = []
@@ -611,6 +451,8 @@ class RecorderUI:
             select_window.attributes('-topmost', True)
             
             # 获取所有显示器的总边界
+            if not self.monitors:
+                self.monitors = ScreenInfo.get_real_resolution()
             min_x = min(m['x'] for m in self.monitors)
             min_y = min(m['y'] for m in self.monitors)
             max_x = max(m['x'] + m['width'] for m in self.monitors)
@@ -679,38 +521,63 @@ class RecorderUI:
                 self.window.deiconify()
                 
                 try:
-                    # 开始视频录制并获取录制区域信息
-                    recording_area = self.recorder.start_recording(start_x, start_y, end_x, end_y)
+                    if self.single_pass_var.get() and (selected_outputs or selected_input):
+                        # 视频和音频由同一个 ffmpeg 进程编码封装
+                        self.muxed = MuxedRecording(self.recorder, self.audio_manager)
+                        recording_area = self.muxed.start(
+                            start_x, start_y, end_x, end_y,
+                            selected_outputs=selected_outputs,
+                            selected_input=selected_input,
+                            path_manager=self.path_manager
+                        )
+                    else:
+                        self.muxed = None
+                        # 开始视频录制并获取录制区域信息
+                        recording_area = self.recorder.start_recording(start_x, start_y, end_x, end_y,
+                                                                       output_file=video_filename)
+                    
+                    if not recording_area:
+                        raise Exception(self.recorder.last_error or "录屏启动失败")
                     
-                    if recording_area:
+                    if not self.muxed:
                         # 在这里开始音频录制
                         if selected_outputs or selected_input:  # 只在有选择设备时尝试录制音频
                             try:
+                                device_count = len(selected_outputs or []) + (1 if selected_input else 0)
                                 audio_files = self.audio_manager.start_recording(
                                     selected_outputs=selected_outputs,
                                     selected_input=selected_input,
-                                    path_manager=self.path_manager  # 传递path_manager
+                                    path_manager=self.path_manager,  # 传递path_manager
+                                    mix=device_count > 1  # 多个设备时录制过程中直接混音
                                 )
                                 if audio_files:
                                     self.current_audio_files = audio_files
+                                    if self.recorder.segment_seconds:
+                                        # 每个视频分段关闭后立即与对应的音频片段合并
+                                        self.segment_merger = SegmentMerger(
+                                            self.recorder,
+                                            [(f, self._audio_offset(self.recorder, f)) for f in audio_files],
+                                            self.path_manager.get_merged_filename()
+                                        )
+                                        self.segment_merger.start()
                             except Exception as e:
                                 print(f"音频录制初始化失败: {str(e)}")
                                 traceback.print_exc()
                                 # 音频失败不影响视频录制继续
-                        
-                        # 显示边框
-                        self.recorder.show_recording_border(
-                            recording_area['left'],
-                            recording_area['top'],
-                            recording_area['width'],
-                            recording_area['height'],
-                            self.window
-                        )
-                        
-                        # 启动状态更新线程
-                        self.update_thread = threading.Thread(target=self.update_status)
-                        self.update_thread.daemon = True
-                        self.update_thread.start()
+                    
+                    # 显示边框
+                    self.recorder.show_recording_border(
+                        recording_area['left'],
+                        recording_area['top'],
+                        recording_area['width'],
+                        recording_area['height'],
+                        self.window
+                    )
+                    
+                    # 启动状态更新线程
+                    self.update_thread = threading.Thread(target=self.update_status)
+                    self.update_thread.daemon = True
+                    self.update_thread.start()
                 except Exception as e:
                     print(f"录制启动失败: {str(e)}")
                     traceback.print_exc()
@@ -734,55 +601,34 @@ class RecorderUI:
             messagebox.showerror("错误", f"开始录制失败: {str(e)}")
     
     def stop_recording(self):
+        """停止采集并把收尾工作交给后台任务，界面立即可以开始下一次录制"""
         try:
             print("正在停止录制...")
             
             # 停止录制标志
             self.recording = False  # 这会让状态更新线程停止
-            
-            # 停止视频录制
-            video_file = None
-            if self.recorder:
-                video_file = self.recorder.output_file
-                self.recorder.stop_recording()
-                print("视频录制已停止")
-            
-            # 停止音频录制（如果有的话）
-            if hasattr(self, 'audio_manager') and hasattr(self, 'current_audio_files') and self.current_audio_files:
+            recorder, muxed, segment_merger = self.recorder, self.muxed, self.segment_merger
+            self.muxed = None
+            self.segment_merger = None
+            
+            # 音频管理器在下一次录制时复用，先在这里停止；音轨偏移也要在下一次录制前算好
+            audio_tracks = []
+            if muxed:
+                # 单次录制：先停止音频让管道结束，之后只需等 ffmpeg 退出
+                muxed.stop_audio()
+            elif self.current_audio_files:
+                audio_tracks = [(f, self._audio_offset(recorder, f)) for f in self.current_audio_files]
                 self.audio_manager.stop_recording()
                 print("音频录制已停止")
-                
-                # 等待确保视频文件已经完全保存
-                if video_file:
-                    max_wait = 10  # 最多等待10秒
-                    wait_time = 0
-                    while not os.path.exists(video_file) and wait_time < max_wait:
-                        print(f"等待视频文件生成: {video_file}")
-                        time.sleep(1)
-                        wait_time += 1
-                    
-                    if not os.path.exists(video_file):
-                        raise Exception(f"视频文件未能在{max_wait}秒内生成")
-                    
-                    # 等待文件大小稳定（确保写入完成）
-                    last_size = -1
-                    current_size = os.path.getsize(video_file)
-                    while last_size != current_size and wait_time < max_wait:
-                        time.sleep(0.5)
-                        last_size = current_size
-                        current_size = os.path.getsize(video_file)
-                        wait_time += 0.5
-                        print(f"等待视频文件写入完成: {current_size} bytes")
-                
-                # 如果有音频，合并音视频
-                print("开始合并音视频...")
-                self.merge_audio_video()
-            else:
-                print("没有音频需要处理，录制完成")
+            self.current_audio_files = []
             
-            # 等待状态更新线程结束
+            if recorder and recorder.recording:
+                self.jobs.submit(self._finalize_job(recorder, muxed, segment_merger, audio_tracks,
+                                                    self.path_manager.get_merged_filename()))
+            
+            # 等待状态更新线程结束（最多等一次进度更新）
             if self.update_thread and self.update_thread.is_alive():
-                self.update_thread.join(timeout=2)  # 等待最多2秒
+                self.update_thread.join(timeout=2)
             
             # 更新按钮状态
             self.start_button.config(state="normal")
@@ -796,68 +642,75 @@ class RecorderUI:
             print(error_msg)
             messagebox.showerror("错误", error_msg)
     
-    def merge_audio_video(self):
-        """合并音频和视频文件"""
-        try:
-            video_file = self.recorder.output_file
-            merged_file = self.path_manager.get_merged_filename()
-            
-            # 构建 FFmpeg 命令
-            cmd = ['ffmpeg', '-y']  # -y 覆盖已存在的文件
-            
-            # 添加视频输入
-            cmd.extend(['-i', video_file])
-            
-            # 添加所有音频输入
-            for audio_file in self.current_audio_files:
-                cmd.extend(['-i', audio_file])
-            
-            # 添加混音参数
-            filter_complex = []
-            for i in range(len(self.current_audio_files)):
-                filter_complex.append(f'[{i+1}:a]')
-            
-            if filter_complex:
-                filter_str = f"{''.join(filter_complex)}amix=inputs={len(self.current_audio_files)}:duration=longest[aout]"
-                cmd.extend([
-                    '-filter_complex', filter_str,
-                    '-map', '0:v',
-                    '-map', '[aout]'
-                ])
-            
-            # 添加输出参数
-            cmd.extend([
-                '-c:v', 'copy',
-                '-c:a', 'aac',
-                '-b:a', '192k',
-                merged_file
-            ])
+    def _finalize_job(self, recorder, muxed, segment_merger, audio_tracks, merged_file):
+        """一次录制的收尾任务：等待编码器退出，按录制方式合并音视频"""
+        def stop_encoder(job, _):
+            if muxed:
+                return muxed.finish()
+            recorder.stop_recording()
+            print("视频录制已停止")
+            return recorder.output_file
+        
+        def merge(job, video_file):
+            if segment_merger:
+                # 分段录制：之前的分段已经合并，只剩最后一段和无损拼接
+                merged = segment_merger.finish()
+                if not merged:
+                    raise Exception("分段合并失败，分段文件已保留")
+                return merged
+            if muxed or not audio_tracks:
+                # 单次录制的输出即为最终结果；没有音频时直接使用视频文件
+                if not os.path.exists(video_file):
+                    raise Exception(f"视频文件没有生成: {video_file}")
+                return video_file
+            print("开始合并音视频...")
+            return self.merge_audio_video(job, recorder, audio_tracks, merged_file)
+        
+        def done(job):
+            self.window.after(0, self._finalize_done, job, recorder)
+        
+        name = os.path.basename(merged_file)
+        return Job(name, [("停止编码", stop_encoder), ("合并音视频", merge)], on_done=done)
+    
+    def _finalize_done(self, job, recorder):
+        """收尾任务结束（在界面线程中调用）"""
+        if job.status == 'done':
+            print(f"录制完成: {job.result}")
+            self.complete_recording(job.result, recorder)
+        elif job.status == 'failed':
+            messagebox.showerror("错误", f"录制收尾失败（{job.step}）: {job.error}")
+        else:
+            print(f"已取消收尾: {job.name}，录制的原始文件已保留")
+    
+    def cancel_finalize(self):
+        """取消所有未完成的收尾任务（编码器仍会正常停止，合并被中止）"""
+        self.jobs.cancel()
+    
+    def _audio_offset(self, recorder, audio_file):
+        """音轨零点相对视频开始的秒数（见 merge.audio_offset）"""
+        return audio_offset(audio_file, recorder.start_time, self.audio_manager.start_time)
+
+    def merge_audio_video(self, job, recorder, audio_tracks, merged_file):
+        """合并音频和视频文件，返回合并后的文件；同时录制了多路输出时每一路都合并音轨
+
+        在后台任务中执行，ffmpeg 可被取消；进度按录制时长计算。
+        """
+        duration = (recorder.telemetry.get_stats()['out_time'] or None) if recorder.telemetry else None
+        merged_base, merged_ext = os.path.splitext(merged_file)
+        for output in recorder.outputs:
+            target = merged_file if output['name'] == 'main' else f"{merged_base}_{output['name']}{merged_ext}"
+            cmd = merge_command(output['file'], audio_tracks, target)
             
             print("执行FFmpeg命令:", ' '.join(cmd))
-            
-            # 执行合并命令
-            result = subprocess.run(
-                cmd,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode == 0:
-                print(f"音视频合并成功: {merged_file}")
-                self.show_completion_dialog(merged_file)
-            else:
-                raise Exception(f"FFmpeg 返回错误: {result.stderr}")
-            
-        except Exception as e:
-            error_msg = f"合并音视频失败: {str(e)}"
-            print(error_msg)
-            if hasattr(e, 'stderr'):
-                print("FFmpeg错误输出:", e.stderr)
-            messagebox.showerror("错误", error_msg)
+            returncode, stderr = job.run_process(cmd, duration)
+            if returncode != 0:
+                print("FFmpeg错误输出:", stderr)
+                raise Exception(f"合并音视频失败: {stderr.splitlines()[-1] if stderr else returncode}")
+            print(f"音视频合并成功: {target}")
+        return merged_file
     
     def update_status(self):
-        def update_ui(time_str, size_str, res_str, fps_str):
+        def update_ui(time_str, size_str, res_str, fps_str, encoder_str):
             """在主线程中更新UI的辅助函数"""
             try:
                 if not self.recording:  # 如果录制已停止，不再更新UI
@@ -866,12 +719,21 @@ class RecorderUI:
                 self.status_labels["size"].config(text=size_str)
                 self.status_labels["resolution"].config(text=res_str)
                 self.status_labels["fps"].config(text=fps_str)
+                self.status_labels["encoder"].config(text=encoder_str)
             except Exception as e:
                 print(f"UI update error: {e}")
 
         try:
             while self.recording:  # 检查录制状态
-                if self.recorder and self.recorder.output_file:
+                telemetry = self.recorder.telemetry if self.recorder else None
+                if telemetry:
+                    # 等待 ffmpeg 的下一次进度输出（约每 0.5 秒一次）
+                    telemetry.wait_update(timeout=1.0)
+                    stats = self.recorder.get_stats()
+                    if stats['ended']:
+                        # ffmpeg 已退出，不再有进度更新
+                        time.sleep(0.5)
+                    
                     # 1. 更新录制时间
                     elapsed = time.time() - self.start_time
                     hours = int(elapsed // 3600)
@@ -879,28 +741,33 @@ class RecorderUI:
                     seconds = int(elapsed % 60)
                     time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
                     
-                    # 2. 获取当前文件大小
-                    size_str = "0 B"
-                    try:
-                        if os.path.exists(self.recorder.output_file):
-                            size = os.path.getsize(self.recorder.output_file)
-                            size_str = humanize.naturalsize(size)
-                            # print(f"Debug - Current file size: {size} bytes ({size_str})")  # 调试输出
-                    except Exception as e:
-                        print(f"Error getting file size: {e}")
+                    # 2. ffmpeg 已写出的大小
+                    size_str = humanize.naturalsize(stats['total_size'] or 0)
                     
                     # 3. 获取当前分辨率
                     res_str = f"{self.recorder.width}x{self.recorder.height}"
+                    if (self.recorder.output_width, self.recorder.output_height) != (self.recorder.width, self.recorder.height):
+                        res_str += f" → {self.recorder.output_width}x{self.recorder.output_height}"
+                    
+                    # 4. 实际编码帧率（设置值为 self.recorder.fps）
+                    fps = stats['fps']
+                    fps_str = f"{fps:.1f} / {self.recorder.fps} fps" if fps is not None else "-"
                     
-                    # 4. 获取当前帧率
-                    fps_str = f"{self.recorder.fps} fps"
+                    # 5. 编码速度、重复/丢弃帧、码率
+                    speed = f"{stats['speed']:.2f}x" if stats['speed'] is not None else "-"
+                    bitrate = (f"{stats['bitrate_kbps']:.0f} kbps"
+                               if stats['bitrate_kbps'] is not None else "-")
+                    encoder_str = (f"{speed}, dup {stats['dup_frames']}, "
+                                   f"drop {stats['drop_frames']}, {bitrate}")
+                    if 'decimation_ratio' in stats:
+                        encoder_str += f", 丢弃重复帧 {stats['decimation_ratio']:.0%}"
                     
-                    # 5. 在主线程中更新UI
+                    # 6. 在主线程中更新UI
                     if self.recording:  # 再次检查录制状态
-                        self.window.after(1, update_ui, time_str, size_str, res_str, fps_str)
-                
-                # 6. 等待一小段时间后再次更新
-                time.sleep(0.5)
+                        self.window.after(1, update_ui, time_str, size_str, res_str, fps_str,
+                                          encoder_str)
+                else:
+                    time.sleep(0.5)
             
             print("状态更新线程已停止")
             
@@ -908,6 +775,70 @@ class RecorderUI:
             print(f"Status update error: {e}")
             traceback.print_exc()
 
+    def complete_recording(self, filepath, recorder):
+        """录制的最终文件已生成：两阶段录制时加入后台转码队列，然后显示完成对话框"""
+        if recorder.two_phase:
+            self.transcode_queue.submit(filepath, recorder.quality)
+        self.show_completion_dialog(filepath, recorder.two_phase)
+
+    def poll_background(self):
+        """每秒更新收尾任务和后台压缩的状态，进度条显示收尾任务（没有时显示压缩）的进度"""
+        progress = None
+        stats = self.jobs.get_stats()
+        pending = stats['queued'] + stats['running']
+        if pending:
+            running = stats['running_jobs']
+            text = f"{pending} 个任务" + (f", {running[0]['step']} {running[0]['progress']:.0%}" if running else "")
+            progress = running[0]['progress'] if running else 0.0
+        else:
+            text = f"已完成 {stats['done']}" + (f", 失败 {stats['failed']}" if stats['failed'] else "")
+        self.status_labels["finalize"].config(text=text)
+        self.cancel_button.config(state="normal" if pending else "disabled")
+        
+        stats = self.transcode_queue.get_stats()
+        pending = stats['queued'] + stats['running']
+        if pending:
+            running = stats['running_progress']
+            text = f"{pending} 个任务" + (f", {running[0]:.0%}" if running else "")
+            if progress is None:
+                progress = running[0] if running else 0.0
+        else:
+            text = f"已完成 {stats['done']}" + (f", 失败 {stats['failed']}" if stats['failed'] else "")
+        self.status_labels["transcode"].config(text=text)
+        self.progress_var.set(100 * (progress or 0.0))
+        self.window.after(1000, self.poll_background)
+
+    def on_close(self):
+        """关闭窗口：在后台线程中等待收尾任务完成、结束转码进程，完成后销毁窗口
+
+        界面线程不等待，状态栏继续显示收尾进度；收尾期间再次关闭则取消未完成的收尾任务。
+        未完成的转码任务下次启动时从头重新转码。
+        """
+        if self._closing:
+            print("[UI] 再次关闭，取消未完成的收尾任务")
+            self.jobs.cancel()
+            return
+        self._closing = True
+        if self.recording:
+            self.stop_recording()
+        pending = len(self.jobs.pending())
+        if pending:
+            self.window.title(f"RecMaster - 正在完成 {pending} 个收尾任务（再次关闭将取消）")
+        
+        def shutdown():
+            self.jobs.shutdown(wait=True)
+            self.transcode_queue.shutdown()
+        
+        thread = threading.Thread(target=shutdown, daemon=True)
+        thread.start()
+        self._destroy_after(thread)
+
+    def _destroy_after(self, thread):
+        if thread.is_alive():
+            self.window.after(100, self._destroy_after, thread)
+        else:
+            self.window.destroy()
+
     def reset_status(self):
         for label in self.status_labels.values():
             label.config(text="")
@@ -916,7 +847,7 @@ class RecorderUI:
     def run(self):
         self.window.mainloop()
 
-    def show_completion_dialog(self, filepath):
+    def show_completion_dialog(self, filepath, transcoding=False):
         """显示录制完成对话框"""
         dialog = tk.Toplevel(self.window)
         dialog.title("完成")
@@ -924,8 +855,11 @@ class RecorderUI:
         dialog.resizable(False, False)
         
         # 文件路径标签
+        text = f"录制已完成并保存为:\n{filepath}"
+        if transcoding:
+            text += "\n（正在后台压缩，完成后替换此文件）"
         path_label = ttk.Label(dialog, 
-            text=f"录制已完成并保存为:\n{filepath}", 
+            text=text, 
             wraplength=450)
         path_label.pack(pady=10)
         
@@ -0,0 +1,440 @@
+# WASAPI 采集后端：Windows Core Audio 的 COM 接口定义与 IAudioClient 封装
+import comtypes
+import ctypes
+from comtypes import CLSCTX_ALL, CoCreateInstance, GUID, COMMETHOD, HRESULT, IUnknown
+from ctypes import POINTER, byref, c_uint
+from ctypes.wintypes import DWORD, LPCWSTR, WORD, LPVOID
+from ctypes import c_uint32 as UINT32
+from ctypes import c_uint64 as UINT64
+from pycaw.pycaw import IAudioClient
+from .capture_backend import CaptureBackend, DEVICE_INVALIDATED_HRESULTS, DeviceInvalidatedError
+from .sample_format import describe_format
+from .device_catalog import DEFAULT_ROLE, DEVICE_STATE_ACTIVE, DeviceSource
+
+# 定义常量
+AUDCLNT_SHAREMODE_SHARED = 0
+AUDCLNT_STREAMFLAGS_LOOPBACK = 0x00020000
+AUDCLNT_STREAMFLAGS_EVENTCALLBACK = 0x00040000
+WAIT_OBJECT_0 = 0
+REFERENCE_TIME = ctypes.c_longlong
+
+# 定义音频格式 GUID
+KSDATAFORMAT_SUBTYPE_IEEE_FLOAT = GUID('{00000003-0000-0010-8000-00aa00389b71}')
+KSDATAFORMAT_SUBTYPE_PCM = GUID('{00000001-0000-0010-8000-00aa00389b71}')
+
+# 定义 GUID
+CLSID_MMDeviceEnumerator = GUID('{BCDE0395-E52F-467C-8E3D-C4579291692E}')
+IID_IMMDeviceEnumerator = GUID('{A95664D2-9614-4F35-A746-DE8DB63617E6}')
+IID_IAudioCaptureClient = GUID('{C8ADBD64-E71E-48A0-A4DE-185C395CD317}')
+
+# 设备属性
+PKEY_DEVICE_FRIENDLY_NAME = (GUID('{A45C254E-DF1C-4EFD-8020-67D146A850E0}'), 14)
+STGM_READ = 0
+VT_LPWSTR = 31
+
+# 定义结构体
+class PROPERTYKEY(ctypes.Structure):
+    _fields_ = [
+        ('fmtid', GUID),
+        ('pid', DWORD),
+    ]
+
+class PROPVARIANT(ctypes.Structure):
+    _fields_ = [
+        ('vt', WORD),
+        ('wReserved1', WORD),
+        ('wReserved2', WORD),
+        ('wReserved3', WORD),
+        ('data', DWORD * 4),
+    ]
+
+class WAVEFORMATEX(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        ('wFormatTag', ctypes.c_ushort),
+        ('nChannels', ctypes.c_ushort),
+        ('nSamplesPerSec', ctypes.c_uint),
+        ('nAvgBytesPerSec', ctypes.c_uint),
+        ('nBlockAlign', ctypes.c_ushort),
+        ('wBitsPerSample', ctypes.c_ushort),
+        ('cbSize', ctypes.c_ushort),
+    ]
+
+class WAVEFORMATEXTENSIBLE(ctypes.Structure):
+    _pack_ = 1
+    class SamplesUnion(ctypes.Union):
+        _fields_ = [
+            ('wValidBitsPerSample', ctypes.c_ushort),
+            ('wSamplesPerBlock', ctypes.c_ushort),
+            ('wReserved', ctypes.c_ushort),
+        ]
+    _fields_ = [
+        ('Format', WAVEFORMATEX),
+        ('Samples', SamplesUnion),
+        ('dwChannelMask', ctypes.c_uint),
+        ('SubFormat', comtypes.GUID),
+    ]
+
+# 定义接口
+class IAudioCaptureClient(IUnknown):
+    _iid_ = IID_IAudioCaptureClient
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'GetBuffer',
+                  (['out'], POINTER(LPVOID), 'ppData'),
+                  (['out'], POINTER(UINT32), 'pNumFramesToRead'),
+                  (['out'], POINTER(DWORD), 'pdwFlags'),
+                  (['out'], POINTER(UINT64), 'pu64DevicePosition'),
+                  (['out'], POINTER(UINT64), 'pu64QPCPosition')),
+        COMMETHOD([], HRESULT, 'ReleaseBuffer',
+                  (['in'], UINT32, 'NumFramesRead')),
+        COMMETHOD([], HRESULT, 'GetNextPacketSize',
+                  (['out'], POINTER(UINT32), 'pNumFramesInNextPacket')),
+    ]
+
+class IPropertyStore(IUnknown):
+    _iid_ = GUID('{886D8EEB-8CF2-4446-8D02-CDBA1DBDCF99}')
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'GetCount',
+                  (['out'], POINTER(DWORD), 'cProps')),
+        COMMETHOD([], HRESULT, 'GetAt',
+                  (['in'], DWORD, 'iProp'),
+                  (['out'], POINTER(PROPERTYKEY), 'pkey')),
+        COMMETHOD([], HRESULT, 'GetValue',
+                  (['in'], POINTER(PROPERTYKEY), 'key'),
+                  (['out'], POINTER(PROPVARIANT), 'pv')),
+        COMMETHOD([], HRESULT, 'SetValue',
+                  (['in'], POINTER(PROPERTYKEY), 'key'),
+                  (['in'], POINTER(PROPVARIANT), 'propvar')),
+        COMMETHOD([], HRESULT, 'Commit')
+    ]
+
+class IMMDevice(IUnknown):
+    _iid_ = GUID('{D666063F-1587-4E43-81F1-B948E807363F}')
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'Activate',
+                  (['in'], POINTER(comtypes.GUID), 'iid'),
+                  (['in'], DWORD, 'dwClsCtx'),
+                  (['in'], POINTER(DWORD), 'pActivationParams'),
+                  (['out','retval'], POINTER(POINTER(IUnknown)), 'ppInterface')),
+        COMMETHOD([], HRESULT, 'OpenPropertyStore',
+                  (['in'], DWORD, 'stgmAccess'),
+                  (['out','retval'], POINTER(POINTER(IPropertyStore)), 'ppProperties')),
+        # 按地址返回，读取后由调用方 CoTaskMemFree（见 device_id）
+        COMMETHOD([], HRESULT, 'GetId',
+                  (['out','retval'], POINTER(LPVOID), 'ppstrId')),
+        COMMETHOD([], HRESULT, 'GetState',
+                  (['out','retval'], POINTER(DWORD), 'pdwState')),
+    ]
+
+class IMMDeviceCollection(IUnknown):
+    _iid_ = GUID('{0BD7A1BE-7A1A-44DB-8397-CC5392387B5E}')
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'GetCount',
+                  (['out', 'retval'], POINTER(c_uint), 'pcDevices')),
+        COMMETHOD([], HRESULT, 'Item',
+                  (['in'], c_uint, 'nDevice'),
+                  (['out', 'retval'], POINTER(POINTER(IMMDevice)), 'ppDevice')),
+    ]
+
+class IMMNotificationClient(IUnknown):
+    _iid_ = GUID('{7991EEC9-7E89-4D85-8390-6C703CEC60C0}')
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'OnDeviceStateChanged',
+                  (['in'], LPCWSTR, 'pwstrDeviceId'),
+                  (['in'], DWORD, 'dwNewState')),
+        COMMETHOD([], HRESULT, 'OnDeviceAdded',
+                  (['in'], LPCWSTR, 'pwstrDeviceId')),
+        COMMETHOD([], HRESULT, 'OnDeviceRemoved',
+                  (['in'], LPCWSTR, 'pwstrDeviceId')),
+        COMMETHOD([], HRESULT, 'OnDefaultDeviceChanged',
+                  (['in'], DWORD, 'flow'),
+                  (['in'], DWORD, 'role'),
+                  (['in'], LPCWSTR, 'pwstrDefaultDeviceId')),
+        COMMETHOD([], HRESULT, 'OnPropertyValueChanged',
+                  (['in'], LPCWSTR, 'pwstrDeviceId'),
+                  (['in'], PROPERTYKEY, 'key'))
+    ]
+
+class IMMDeviceEnumerator(IUnknown):
+    _iid_ = IID_IMMDeviceEnumerator
+    _methods_ = [
+        COMMETHOD([], HRESULT, 'EnumAudioEndpoints',
+                  (['in'], DWORD, 'dataFlow'),
+                  (['in'], DWORD, 'dwStateMask'),
+                  (['out','retval'], POINTER(POINTER(IMMDeviceCollection)), 'ppDevices')),
+        COMMETHOD([], HRESULT, 'GetDefaultAudioEndpoint',
+                  (['in'], DWORD, 'dataFlow'),
+                  (['in'], DWORD, 'role'),
+                  (['out','retval'], POINTER(POINTER(IMMDevice)), 'ppEndpoint')),
+        COMMETHOD([], HRESULT, 'GetDevice',
+                  (['in'], LPCWSTR, 'pwstrId'),
+                  (['out','retval'], POINTER(POINTER(IMMDevice)), 'ppDevice')),
+        COMMETHOD([], HRESULT, 'RegisterEndpointNotificationCallback',
+                  (['in'], POINTER(IMMNotificationClient))),
+        COMMETHOD([], HRESULT, 'UnregisterEndpointNotificationCallback',
+                  (['in'], POINTER(IMMNotificationClient))),
+    ]
+
+def _parse_wave_format(wave_format_ptr):
+    """从 GetMixFormat 返回的 WAVEFORMATEX 指针读取格式信息"""
+    wave_format = ctypes.cast(wave_format_ptr, POINTER(WAVEFORMATEX)).contents
+    
+    # 检查是否为扩展格式，按 SubFormat 和有效位数确定样本格式
+    valid_bits = wave_format.wBitsPerSample
+    if wave_format.wFormatTag == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE
+        wave_format_ext = ctypes.cast(wave_format_ptr, POINTER(WAVEFORMATEXTENSIBLE)).contents
+        sub_format = wave_format_ext.SubFormat
+        if sub_format not in (KSDATAFORMAT_SUBTYPE_IEEE_FLOAT, KSDATAFORMAT_SUBTYPE_PCM):
+            raise Exception(f"不支持的音频 SubFormat: {sub_format}")
+        is_float = (sub_format == KSDATAFORMAT_SUBTYPE_IEEE_FLOAT)
+        valid_bits = wave_format_ext.Samples.wValidBitsPerSample or valid_bits
+    else:
+        is_float = (wave_format.wFormatTag == 3)  # WAVE_FORMAT_IEEE_FLOAT
+    return {
+        'channels': wave_format.nChannels,
+        'sample_rate': wave_format.nSamplesPerSec,
+        'bits_per_sample': wave_format.wBitsPerSample,
+        'valid_bits_per_sample': valid_bits,
+        'is_float': is_float,
+        'sample_format': describe_format(wave_format.wBitsPerSample, valid_bits, is_float)
+    }
+
+def read_mix_format(audio_client):
+    """读取 IAudioClient 的混音格式信息，GetMixFormat 分配的内存读取后释放"""
+    wave_format_ptr = audio_client.GetMixFormat()
+    try:
+        return _parse_wave_format(wave_format_ptr)
+    finally:
+        ctypes.windll.ole32.CoTaskMemFree(wave_format_ptr)
+
+def _is_invalidated(error):
+    return isinstance(error, comtypes.COMError) and (error.hresult & 0xFFFFFFFF) in DEVICE_INVALIDATED_HRESULTS
+
+def _raise_if_invalidated(error):
+    """设备失效的 COMError 转换为 DeviceInvalidatedError 抛出；其他错误由调用方用 raise 原样抛出"""
+    if _is_invalidated(error):
+        raise DeviceInvalidatedError(f"音频设备已失效 (0x{error.hresult & 0xFFFFFFFF:08X})") from error
+
+class WasapiCaptureBackend(CaptureBackend):
+    """基于 IAudioClient/IAudioCaptureClient 的 WASAPI 共享模式采集后端"""
+    def __init__(self, device, is_input=False):
+        super().__init__()
+        self.device = device
+        self.is_input = is_input
+        self.audio_client = None
+        self.capture_client = None
+        self.event_handle = None
+
+    def open(self, event_driven=False):
+        """激活设备并初始化音频客户端，返回格式信息"""
+        # 激活设备的 IAudioClient 接口
+        try:
+            audio_interface = self.device.Activate(
+                IAudioClient._iid_, CLSCTX_ALL, None)
+        except comtypes.COMError as e:
+            _raise_if_invalidated(e)
+            raise
+        audio_client = audio_interface.QueryInterface(IAudioClient)
+        
+        try:
+            # 获取设备的原生格式，Initialize 之后释放 GetMixFormat 分配的内存
+            wave_format_ptr = audio_client.GetMixFormat()
+            try:
+                self.format = _parse_wave_format(wave_format_ptr)
+
+                # 初始化音频客户端
+                buffer_duration = REFERENCE_TIME(int(10000000))  # 1秒
+                flags = 0 if self.is_input else AUDCLNT_STREAMFLAGS_LOOPBACK
+                if event_driven:
+                    flags |= AUDCLNT_STREAMFLAGS_EVENTCALLBACK
+                hr = audio_client.Initialize(
+                    AUDCLNT_SHAREMODE_SHARED,
+                    flags,
+                    buffer_duration,
+                    0,
+                    wave_format_ptr,
+                    None
+                )
+            finally:
+                ctypes.windll.ole32.CoTaskMemFree(wave_format_ptr)
+        except comtypes.COMError as e:
+            # 激活之后、初始化完成之前设备也可能被拔出
+            _raise_if_invalidated(e)
+            raise
+        
+        if hr != 0:
+            raise Exception(f"初始化音频客户端失败，错误代码：{hr}")
+        
+        try:
+            if event_driven:
+                # 自动复位事件，由音频引擎在缓冲区就绪时触发
+                self.event_handle = ctypes.windll.kernel32.CreateEventW(None, False, False, None)
+                if not self.event_handle:
+                    raise Exception("创建音频事件失败")
+                audio_client.SetEventHandle(self.event_handle)
+
+            # 获取捕获客户端
+            capture_client = audio_client.GetService(IID_IAudioCaptureClient)
+            self.capture_client = capture_client.QueryInterface(IAudioCaptureClient)
+        except BaseException as e:
+            # 失败时关闭已经创建的事件句柄
+            self.close()
+            if isinstance(e, comtypes.COMError):
+                _raise_if_invalidated(e)
+            raise
+        self.audio_client = audio_client
+        return self.format
+
+    def wait(self, timeout):
+        if self.event_handle is None:
+            return super().wait(timeout)
+        result = ctypes.windll.kernel32.WaitForSingleObject(
+            self.event_handle, int(timeout * 1000))
+        return result == WAIT_OBJECT_0
+
+    def get_next_packet_size(self):
+        try:
+            return self.capture_client.GetNextPacketSize()
+        except comtypes.COMError as e:
+            _raise_if_invalidated(e)
+            raise
+
+    def get_buffer(self):
+        try:
+            return self.capture_client.GetBuffer()
+        except comtypes.COMError as e:
+            _raise_if_invalidated(e)
+            raise
+
+    def release_buffer(self, num_frames):
+        try:
+            self.capture_client.ReleaseBuffer(num_frames)
+        except comtypes.COMError as e:
+            _raise_if_invalidated(e)
+            raise
+
+    def start(self):
+        try:
+            self.audio_client.Start()
+        except comtypes.COMError as e:
+            _raise_if_invalidated(e)
+            raise
+
+    def stop(self):
+        if self.audio_client is not None:
+            try:
+                self.audio_client.Stop()
+            except comtypes.COMError as e:
+                # 已失效的设备无法停止，关闭即可
+                if not _is_invalidated(e):
+                    raise
+
+    def close(self):
+        if self.event_handle is not None:
+            ctypes.windll.kernel32.CloseHandle(self.event_handle)
+            self.event_handle = None
+        self.capture_client = None
+        self.audio_client = None
+
+def device_id(device):
+    """IMMDevice 的端点 id，无法读取时返回 None"""
+    device_id_ptr = device.GetId()
+    if not device_id_ptr:
+        return None
+    try:
+        return ctypes.wstring_at(device_id_ptr)
+    finally:
+        # GetId 分配的字符串由调用方释放
+        ctypes.windll.ole32.CoTaskMemFree(ctypes.c_void_p(device_id_ptr))
+
+def read_friendly_name(device):
+    """从属性存储读取设备的友好名称，没有时返回 None"""
+    store = device.OpenPropertyStore(STGM_READ)
+    key = PROPERTYKEY(PKEY_DEVICE_FRIENDLY_NAME[0], PKEY_DEVICE_FRIENDLY_NAME[1])
+    value = store.GetValue(byref(key))
+    try:
+        if value.vt != VT_LPWSTR:
+            return None
+        # PROPVARIANT 的数据部分开头是字符串指针
+        pointer = ctypes.cast(ctypes.addressof(value.data), POINTER(ctypes.c_void_p)).contents.value
+        return ctypes.wstring_at(pointer) if pointer else None
+    finally:
+        ctypes.oledll.ole32.PropVariantClear(byref(value))
+
+class DeviceNotificationClient(comtypes.COMObject):
+    """IMMNotificationClient 实现，把设备通知转给 DeviceCatalog
+
+    回调在音频服务的线程中执行，不能阻塞，也不能调用 IMMDeviceEnumerator。
+    """
+    _com_interfaces_ = [IMMNotificationClient]
+
+    def __init__(self, listener):
+        super().__init__()
+        self.listener = listener
+
+    def _forward(self, method, *args):
+        try:
+            getattr(self.listener, method)(*args)
+        except Exception as e:
+            print(f"[Devices] 处理设备通知 {method} 出错: {e}")
+        return 0
+
+    def OnDeviceStateChanged(self, this, pwstrDeviceId, dwNewState):
+        return self._forward('on_device_state_changed', pwstrDeviceId, dwNewState)
+
+    def OnDeviceAdded(self, this, pwstrDeviceId):
+        return self._forward('on_device_added', pwstrDeviceId)
+
+    def OnDeviceRemoved(self, this, pwstrDeviceId):
+        return self._forward('on_device_removed', pwstrDeviceId)
+
+    def OnDefaultDeviceChanged(self, this, flow, role, pwstrDefaultDeviceId):
+        return self._forward('on_default_device_changed', flow, role, pwstrDefaultDeviceId)
+
+    def OnPropertyValueChanged(self, this, pwstrDeviceId, key):
+        return self._forward('on_property_value_changed', pwstrDeviceId)
+
+class WasapiDeviceSource(DeviceSource):
+    """通过 IMMDeviceEnumerator 枚举设备，名称来自属性存储，混音格式来自 IAudioClient"""
+    def __init__(self):
+        self.enumerator = CoCreateInstance(CLSID_MMDeviceEnumerator, IMMDeviceEnumerator, CLSCTX_ALL)
+        self.client = None
+
+    def endpoints(self, flow):
+        collection = self.enumerator.EnumAudioEndpoints(flow, DEVICE_STATE_ACTIVE)
+        endpoints = []
+        for i in range(collection.GetCount()):
+            try:
+                device = collection.Item(i)
+                endpoint_id = device_id(device)
+                if endpoint_id:
+                    endpoints.append((endpoint_id, device))
+            except Exception as e:
+                print(f"处理设备 {i} 时出错: {str(e)}")
+        return endpoints
+
+    def describe(self, endpoint_id, device):
+        name = read_friendly_name(device)
+        try:
+            audio_interface = device.Activate(IAudioClient._iid_, CLSCTX_ALL, None)
+            mix_format = read_mix_format(audio_interface.QueryInterface(IAudioClient))
+        except Exception as e:
+            print(f"[Devices] 读取 {name or endpoint_id} 的混音格式失败: {e}")
+            mix_format = None
+        return {'name': name, 'mix_format': mix_format}
+
+    def default_endpoint(self, flow):
+        try:
+            return device_id(self.enumerator.GetDefaultAudioEndpoint(flow, DEFAULT_ROLE))
+        except comtypes.COMError:
+            # 该方向没有设备
+            return None
+
+    def register(self, listener):
+        self.client = DeviceNotificationClient(listener)
+        self.enumerator.RegisterEndpointNotificationCallback(self.client)
+
+    def unregister(self):
+        if self.client is not None:
+            self.enumerator.UnregisterEndpointNotificationCallback(self.client)
+            self.client = None
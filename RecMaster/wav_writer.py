@@ -0,0 +1,229 @@
+# 长时间录制用的流式 WAV 写入：RF64、定期提交文件头、按时长分段
+import os
+import struct
+import time
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+# RIFF 块大小字段的上限，超过后切换为 RF64
+RIFF_LIMIT = 0xFFFFFFFF
+
+# 文件头布局：RIFF/RF64 头 12 字节，JUNK/ds64 块 8+28 字节，fmt 块 8+16 字节，data 块头 8 字节
+_DS64_OFFSET = 12
+_DS64_SIZE = 28
+_FMT_OFFSET = _DS64_OFFSET + 8 + _DS64_SIZE
+_DATA_OFFSET = _FMT_OFFSET + 8 + 16
+HEADER_BYTES = _DATA_OFFSET + 8
+
+class StreamingWavWriter:
+    """不依赖 wave 模块的流式 WAV 写入，接口与 wave 写对象的 writeframes/close 相同
+
+    - 文件头预留 JUNK 块，数据超过 4GB 时原地改写为 RF64 (EBU Tech 3306 / BW64) 的 ds64 块，
+      rf64=False 时在 4GB 之前自动切换到下一个分段。
+    - 每隔 commit_interval 秒把缓冲数据写出并更新文件头中的长度，
+      进程意外退出时文件仍然可以播放，最多丢失最近 commit_interval 秒。
+    - segment_seconds 不为空时按时长切分文件：第一个分段使用 filename，
+      之后依次为 name_001.wav、name_002.wav ...，分段边界对齐到帧。
+    - 数据先拷贝到 buffer_bytes 大小的预分配缓冲区，满了才写入文件，减少系统调用。
+    """
+    def __init__(self, filename, channels, sample_width, sample_rate, is_float=False,
+                 buffer_bytes=4 * 1024 * 1024, commit_interval=2.0, segment_seconds=None,
+                 rf64=True, fsync=False):
+        self.filename = filename
+        self.channels = channels
+        self.sample_width = sample_width
+        self.sample_rate = sample_rate
+        self.is_float = is_float
+        self.frame_bytes = channels * sample_width
+        self.commit_interval = commit_interval
+        self.rf64 = rf64
+        self.fsync = fsync
+        self.segment_frames = int(segment_seconds * sample_rate) if segment_seconds else None
+        # 不使用 RF64 时，单个文件的数据不能超过 RIFF 上限
+        self._max_data_bytes = None
+        if not rf64:
+            limit = RIFF_LIMIT - HEADER_BYTES + 8
+            self._max_data_bytes = limit - limit % self.frame_bytes
+
+        buffer_bytes = max(self.frame_bytes, buffer_bytes - buffer_bytes % self.frame_bytes)
+        self._buffer = bytearray(buffer_bytes)
+        self._view = memoryview(self._buffer)
+        self._buffered = 0
+
+        self.segments = []
+        self.frames_written = 0
+        self.stats = {
+            'header_commits': 0,
+            'file_writes': 0,
+            'segments': 0,
+            'rf64_segments': 0,
+        }
+        self._file = None
+        self._open_segment()
+
+    def _segment_filename(self, index):
+        if index == 0:
+            return self.filename
+        base, ext = os.path.splitext(self.filename)
+        return f"{base}_{index:03d}{ext or '.wav'}"
+
+    def _open_segment(self):
+        filename = self._segment_filename(len(self.segments))
+        self._file = open(filename, 'wb', buffering=0)
+        self.segments.append(filename)
+        self.stats['segments'] += 1
+        self._data_bytes = 0
+        self._committed_bytes = -1
+        self._is_rf64 = False
+        self._last_commit = time.monotonic()
+        self._file.write(self._header())
+
+    def _header(self):
+        """当前数据长度对应的完整文件头"""
+        data_bytes = self._data_bytes
+        if self._is_rf64:
+            riff = b'RF64'
+            riff_size = RIFF_LIMIT
+            data_size = RIFF_LIMIT
+            # ds64: RIFF 大小、data 大小、采样帧数（64 位），table 长度为 0
+            ds64 = b'ds64' + struct.pack('<IQQQI', _DS64_SIZE, HEADER_BYTES - 8 + data_bytes,
+                                         data_bytes, data_bytes // self.frame_bytes, 0)
+        else:
+            riff = b'RIFF'
+            riff_size = HEADER_BYTES - 8 + data_bytes
+            data_size = data_bytes
+            ds64 = b'JUNK' + struct.pack('<I', _DS64_SIZE) + bytes(_DS64_SIZE)
+        fmt = b'fmt ' + struct.pack('<IHHIIHH', 16,
+                                    WAVE_FORMAT_IEEE_FLOAT if self.is_float else WAVE_FORMAT_PCM,
+                                    self.channels, self.sample_rate,
+                                    self.sample_rate * self.frame_bytes, self.frame_bytes,
+                                    self.sample_width * 8)
+        data = b'data' + struct.pack('<I', data_size)
+        return riff + struct.pack('<I', riff_size) + b'WAVE' + ds64 + fmt + data
+
+    def _write_all(self, mv):
+        # 无缓冲的 FileIO.write 可能只写出一部分
+        while mv.nbytes:
+            written = self._file.write(mv)
+            mv = mv[written:]
+        self.stats['file_writes'] += 1
+
+    def _flush_buffer(self):
+        if self._buffered:
+            self._write_all(self._view[:self._buffered])
+            self._buffered = 0
+
+    def commit(self):
+        """写出缓冲数据并更新文件头中的长度"""
+        self._flush_buffer()
+        if self._data_bytes != self._committed_bytes:
+            if not self._is_rf64 and HEADER_BYTES - 8 + self._data_bytes > RIFF_LIMIT:
+                self._is_rf64 = True
+                self.stats['rf64_segments'] += 1
+            self._file.seek(0)
+            self._file.write(self._header())
+            self._file.seek(0, os.SEEK_END)
+            self._committed_bytes = self._data_bytes
+            self.stats['header_commits'] += 1
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._last_commit = time.monotonic()
+
+    def _segment_room(self):
+        """当前分段还能写入的字节数，None 表示不限"""
+        room = None
+        if self.segment_frames:
+            room = self.segment_frames * self.frame_bytes - self._data_bytes
+        if self._max_data_bytes is not None:
+            limit = self._max_data_bytes - self._data_bytes
+            room = limit if room is None else min(room, limit)
+        return room
+
+    def _close_segment(self):
+        self.commit()
+        if self._data_bytes % 2:
+            # RIFF 块按偶数字节对齐，补齐字节不计入 data 长度
+            self._file.write(b'\0')
+        self._file.close()
+        self._file = None
+
+    def _rotate(self):
+        self._close_segment()
+        self._open_segment()
+
+    def writeframes(self, data):
+        mv = memoryview(data)
+        if mv.format != 'B' or mv.ndim != 1:
+            mv = mv.cast('B')
+        self.frames_written += mv.nbytes // self.frame_bytes
+        while mv.nbytes:
+            room = self._segment_room()
+            if room is not None and room <= 0:
+                self._rotate()
+                continue
+            size = mv.nbytes if room is None else min(mv.nbytes, room)
+            self._append(mv[:size])
+            self._data_bytes += size
+            mv = mv[size:]
+        if time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def _append(self, mv):
+        capacity = len(self._buffer)
+        # 大块数据直接写入文件，避免多一次拷贝
+        if mv.nbytes >= capacity:
+            self._flush_buffer()
+            self._write_all(mv)
+            return
+        while mv.nbytes:
+            size = min(mv.nbytes, capacity - self._buffered)
+            self._view[self._buffered:self._buffered + size] = mv[:size]
+            self._buffered += size
+            mv = mv[size:]
+            if self._buffered == capacity:
+                self._flush_buffer()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._close_segment()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['frames_written'] = self.frames_written
+        return stats
+
+def _read_header(filename):
+    """读取 StreamingWavWriter 的文件头，不是这种布局时返回 None"""
+    try:
+        with open(filename, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+    except OSError:
+        return None
+    if len(header) < HEADER_BYTES or header[8:12] != b'WAVE' or header[_FMT_OFFSET:_FMT_OFFSET + 4] != b'fmt ':
+        return None
+    return header
+
+def wav_format(filename):
+    """StreamingWavWriter 写出的文件的 (声道数, 采样率)，不是这种布局时返回 None"""
+    header = _read_header(filename)
+    if header is None:
+        return None
+    return struct.unpack_from('<HI', header, _FMT_OFFSET + 10)
+
+def committed_duration(filename):
+    """StreamingWavWriter 写出的文件当前文件头中记录的时长（秒）
+
+    录制过程中文件头每 commit_interval 秒更新一次，其他程序读到的数据不会超过这个长度。
+    不是 StreamingWavWriter 的文件头布局时返回 None。
+    """
+    header = _read_header(filename)
+    if header is None:
+        return None
+    byte_rate = struct.unpack_from('<I', header, _FMT_OFFSET + 16)[0]
+    if header[:4] == b'RF64':
+        data_bytes = struct.unpack_from('<Q', header, _DS64_OFFSET + 16)[0]
+    else:
+        data_bytes = struct.unpack_from('<I', header, _DATA_OFFSET + 4)[0]
+    return data_bytes / byte_rate if byte_rate else None
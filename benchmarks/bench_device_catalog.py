@@ -0,0 +1,87 @@
+"""设备目录基准：每次刷新重新枚举 与 缓存 + 设备通知增量失效 的刷新耗时和属性读取次数
+
+默认使用 FakeDeviceSource（--devices 个设备，每次读取属性耗时 --describe-ms 毫秒），
+依次测量全量刷新、缓存命中，以及插入设备、修改属性、切换默认设备、拔出设备之后的刷新。
+--wasapi 时使用本机的 WASAPI 设备（只测全量刷新和缓存命中）。
+
+    python benchmarks/bench_device_catalog.py [--devices 12] [--describe-ms 5] [--rounds 20] [--wasapi]
+"""
+import argparse
+import time
+from RecMaster.device_catalog import CAPTURE, RENDER, DeviceCatalog, FakeDeviceSource
+
+
+def timed_refresh(catalog, rounds, before=None):
+    """刷新 rounds 次（每次之前调用 before），返回 (平均毫秒, 平均属性读取次数)"""
+    elapsed = 0.0
+    describes = catalog.stats['describes']
+    for _ in range(rounds):
+        if before:
+            before()
+        start = time.perf_counter()
+        catalog.devices()
+        elapsed += time.perf_counter() - start
+    return elapsed / rounds * 1000, (catalog.stats['describes'] - describes) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=12, help='模拟设备数（输出和输入各一半）')
+    parser.add_argument('--describe-ms', type=float, default=5.0, help='每个设备读取属性的模拟耗时')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--wasapi', action='store_true', help='使用本机的 WASAPI 设备')
+    args = parser.parse_args()
+
+    if args.wasapi:
+        import comtypes
+        from RecMaster.wasapi import WasapiDeviceSource
+        comtypes.CoInitialize()
+        source = WasapiDeviceSource()
+        print("WASAPI devices")
+    else:
+        source = FakeDeviceSource(describe_delay=args.describe_ms / 1000)
+        for i in range(args.devices):
+            source.add_device(f'dev{i}', f'Device {i}', flow=RENDER if i % 2 == 0 else CAPTURE)
+        print(f"{args.devices} fake devices, {args.describe_ms:g} ms per property read")
+
+    catalog = DeviceCatalog(source)
+    outputs, inputs = catalog.devices()
+    print(f"{len(outputs)} outputs, {len(inputs)} inputs, notifications {'on' if catalog.watching else 'off'}")
+    print(f"{'refresh':<28}{'ms':>8}{'property reads':>16}")
+    rows = [
+        ('uncached (every refresh)', lambda: catalog.invalidate()),
+        ('cached', None),
+    ]
+    if not args.wasapi:
+        counter = iter(range(10 ** 6))
+
+        def plug():
+            source.add_device(f'usb{next(counter)}', 'USB Headset', flow=RENDER)
+
+        def rename():
+            source.set_property('dev0', name=f'Device 0 ({next(counter)})')
+
+        def switch_default():
+            source.set_default(RENDER, f'dev{2 * (next(counter) % max(1, args.devices // 2))}')
+
+        def unplug():
+            usb = [device_id for device_id in source.devices if device_id.startswith('usb')]
+            if usb:
+                source.remove_device(usb[0])
+            else:
+                plug()
+
+        rows += [
+            ('after device added', plug),
+            ('after property change', rename),
+            ('after default change', switch_default),
+            ('after device removed', unplug),
+        ]
+    for name, before in rows:
+        ms, reads = timed_refresh(catalog, args.rounds, before)
+        print(f"{name:<28}{ms:>8.2f}{reads:>16.2f}")
+    catalog.close()
+
+
+if __name__ == '__main__':
+    main()
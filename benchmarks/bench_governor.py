@@ -0,0 +1,79 @@
+"""编码调节基准：lavfi 测试图像在人为 CPU 负载下录制，比较有无 EncoderGovernor
+
+每种模式录制 --seconds 秒，期间用 --burners 个忙循环进程占用 CPU，
+报告最后一个编码进程的速度、丢帧数、编码进程数以及每次调节。需要 PATH 中有 ffmpeg。
+
+--threads 限定 x264 的线程数，编码调节先放开线程数再降低 preset。
+
+    python benchmarks/bench_governor.py [--seconds 60] [--burners 4] [--quality 5] [--size 1920x1080]
+                                        [--threads 2]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from RecMaster.encoder_governor import EncoderGovernor
+from RecMaster.screen_recorder import ScreenRecorder
+
+
+def burn(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+
+def record(args, output_file, governor):
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi', governor=governor,
+                              threads=args.threads)
+    width, height = map(int, args.size.split('x'))
+    recorder.start_recording(0, 0, width, height, output_file=output_file)
+    speeds = []
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        recorder.telemetry.wait_update(timeout=1.0)
+        speeds.append(recorder.get_stats()['speed'] or 0.0)
+    stats = recorder.get_stats()
+    recorder.stop_recording()
+    return stats, speeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--burners', type=int, default=os.cpu_count() or 4,
+                        help='占用 CPU 的忙循环进程数')
+    parser.add_argument('--quality', type=int, default=5)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--threads', type=int, help='x264 线程数，默认不限定')
+    args = parser.parse_args()
+
+    stop = multiprocessing.Event()
+    burners = [multiprocessing.Process(target=burn, args=(stop,), daemon=True)
+               for _ in range(args.burners)]
+    for process in burners:
+        process.start()
+
+    base_dir = tempfile.mkdtemp()
+    print(f"lavfi {args.size} quality {args.quality}, {args.burners} CPU burners, "
+          f"{args.seconds:g} s per run, files in {base_dir}")
+    try:
+        for name, governor in (('fixed', None),
+                               ('governor', EncoderGovernor(hold=5.0, probe_after=20.0))):
+            stats, speeds = record(args, os.path.join(base_dir, f'{name}.mp4'), governor)
+            tail = speeds[-10:]
+            threads = f"/{stats['threads']} threads" if stats['threads'] else ''
+            print(f"{name:<10} final {stats['preset']}@{stats['target_fps']}fps{threads}, "
+                  f"speed (last 10 updates) {sum(tail) / max(1, len(tail)):.2f}x, "
+                  f"drop {stats['drop_frames']}, dup {stats['dup_frames']}, "
+                  f"encoder runs {stats['encoder_runs']}")
+            for event in stats.get('adjustments', []):
+                print(f"{'':<10} {event['time']:>6.1f}s {event['action']:<5} "
+                      f"{event['from']} -> {event['to']} ({event['reason']}, {event['speed']:.2f}x)")
+    finally:
+        stop.set()
+        for process in burners:
+            process.join(timeout=2)
+
+
+if __name__ == '__main__':
+    main()
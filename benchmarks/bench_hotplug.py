@@ -0,0 +1,123 @@
+"""热插拔基准：录制中设备失效后音轨是否继续、与其他音轨是否对齐
+
+FakeDeviceSource 提供设备和通知，SyntheticCaptureBackend 提供数据并在拔出时注入 DeviceInvalidatedError。
+每个场景录制 --seconds 秒的两个设备（默认输出 speakers 和 headset），报告每个音轨的长度与
+录制时长的偏差、重新连接次数和补静音的时长：
+
+    driver-error   speakers 的后端在第 100 个包失效（没有设备通知），设备仍在
+    start-error    speakers 的后端在 start 时已经失效，重新打开后正常录制
+    replug         headset 在 1/3 处拔出，2/3 处插回
+    unplug         headset 在 1/3 处拔出，不再插回
+    default-change 1/2 处默认输出切换到 hdmi，speakers 音轨跟随
+
+    python benchmarks/bench_hotplug.py [--seconds 6] [--scenarios replug unplug]
+"""
+import argparse
+import os
+import tempfile
+import time
+import wave
+from RecMaster.audio_recorder import AudioRecorderManager
+from RecMaster.capture_backend import DeviceInvalidatedError, SyntheticCaptureBackend
+from RecMaster.device_catalog import RENDER, FakeDeviceSource
+
+SCENARIOS = ('driver-error', 'start-error', 'replug', 'unplug', 'default-change')
+
+
+class HotplugRig:
+    """模拟设备：backend_factory 只能打开 source 中存在的设备，unplug 使正在使用的后端失效"""
+    def __init__(self):
+        self.source = FakeDeviceSource()
+        self.source.add_device('speakers', 'Speakers', flow=RENDER, default=True)
+        self.source.add_device('headset', 'Headset', flow=RENDER)
+        self.source.add_device('hdmi', 'HDMI', flow=RENDER)
+        self.backends = {}
+        self.fail_at = {}
+
+    def factory(self, device, is_input=False):
+        if device not in self.source.devices:
+            raise DeviceInvalidatedError(f"{device} 不存在")
+        backend = SyntheticCaptureBackend(tone_hz=220 * (1 + len(self.backends) % 4),
+                                          fail_at_packet=self.fail_at.pop(device, None))
+        self.backends[device] = backend
+        return backend
+
+    def unplug(self, device):
+        self.backends[device].invalidate()
+        self.source.remove_device(device)
+
+    def plug(self, device, name):
+        self.source.add_device(device, name, flow=RENDER)
+
+
+class BenchPaths:
+    def __init__(self, base_dir, prefix):
+        self.base_dir = base_dir
+        self.prefix = prefix
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        return os.path.join(self.base_dir, f'{self.prefix}_{device_name}.wav')
+
+    def get_mixed_audio_filename(self):
+        return os.path.join(self.base_dir, f'{self.prefix}_mix.wav')
+
+
+def run(scenario, seconds, base_dir):
+    rig = HotplugRig()
+    if scenario == 'driver-error':
+        rig.fail_at['speakers'] = 100
+    elif scenario == 'start-error':
+        rig.fail_at['speakers'] = 0
+    manager = AudioRecorderManager(backend_factory=rig.factory, device_source=rig.source,
+                                   reattach_interval=0.2)
+    outputs, _ = manager.get_available_devices()
+    selected = [device for device in outputs if device['id'] in ('speakers', 'headset')]
+    files = manager.start_recording(selected_outputs=selected, path_manager=BenchPaths(base_dir, scenario))
+
+    events = []
+    if scenario in ('replug', 'unplug'):
+        events.append((seconds / 3, lambda: rig.unplug('headset')))
+    if scenario == 'replug':
+        events.append((seconds * 2 / 3, lambda: rig.plug('headset', 'Headset')))
+    if scenario == 'default-change':
+        events.append((seconds / 2, lambda: rig.source.set_default(RENDER, 'hdmi')))
+    start = time.monotonic()
+    for at, action in events:
+        time.sleep(max(0.0, start + at - time.monotonic()))
+        action()
+    time.sleep(max(0.0, start + seconds - time.monotonic()))
+    manager.stop_recording()
+    stats = manager.get_stats()
+
+    expected = (manager.stop_qpc - manager.start_qpc) / 10000000
+    rows = []
+    for filename in files:
+        with wave.open(filename) as f:
+            length = f.getnframes() / f.getframerate()
+        device_stats = stats[filename]
+        rows.append((os.path.basename(filename), length, (length - expected) * 1000,
+                     device_stats['reattaches'], device_stats['lost_seconds'], device_stats['device_name']))
+    return expected, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=6.0)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp()
+    results = []
+    for scenario in args.scenarios:
+        results.append((scenario,) + run(scenario, args.seconds, base_dir))
+    print(f"\nfiles in {base_dir}")
+    print(f"{'scenario':<16}{'track':<28}{'length (s)':>11}{'vs rec (ms)':>13}{'reattach':>10}"
+          f"{'silence (s)':>13}  device")
+    for scenario, expected, rows in results:
+        for name, length, delta_ms, reattaches, lost, device in rows:
+            print(f"{scenario:<16}{name:<28}{length:>11.3f}{delta_ms:>13.1f}{reattaches:>10}"
+                  f"{lost:>13.2f}  {device}")
+
+
+if __name__ == '__main__':
+    main()
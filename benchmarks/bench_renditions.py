@@ -0,0 +1,69 @@
+"""多路输出基准：一次采集同时编码主文件和代理文件 与 录制后再转码出代理文件
+
+用 lavfi 测试图像录制 --seconds 秒（实时）两次：一次带 PROXY_RENDITION，一次只录主文件，
+之后再用一个 ffmpeg 进程从主文件转码出同样参数的代理文件。报告录制时 ffmpeg 的 CPU 时间、
+停止后还需要的转码耗时和各文件的大小。需要 PATH 中有 ffmpeg。
+
+    python benchmarks/bench_renditions.py [--seconds 20] [--size 1920x1080] [--quality 3]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from RecMaster.screen_recorder import PROXY_RENDITION, ScreenRecorder
+
+
+def record(args, output_file, renditions):
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi', renditions=renditions)
+    width, height = map(int, args.size.split('x'))
+    recorder.start_recording(0, 0, width, height, output_file=output_file)
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        recorder.telemetry.wait_update(timeout=1.0)
+    stats = recorder.get_stats()
+    recorder.stop_recording()
+    return stats, recorder.outputs
+
+
+def transcode_proxy(input_file, output_file):
+    """录制后单独生成代理文件（与 PROXY_RENDITION 相同的参数）"""
+    cmd = [
+        'ffmpeg', '-y', '-i', input_file,
+        '-vf', f"scale=-2:'min({PROXY_RENDITION['height']},ih)',fps={PROXY_RENDITION['fps']}",
+        '-c:v', 'libx264',
+        '-preset', PROXY_RENDITION['preset'],
+        '-crf', str(PROXY_RENDITION['crf']),
+        '-b:v', PROXY_RENDITION['video_bitrate'],
+        '-pix_fmt', 'yuv420p',
+        output_file,
+    ]
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--quality', type=int, default=3)
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp()
+    print(f"lavfi {args.size} quality {args.quality}, {args.seconds:g} s per run, files in {base_dir}")
+
+    stats, outputs = record(args, os.path.join(base_dir, 'split.mp4'), [PROXY_RENDITION])
+    sizes = ', '.join(f"{output['name']} {os.path.getsize(output['file']) / 1e6:.2f} MB" for output in outputs)
+    print(f"{'split':<12} capture cpu {stats['cpu_seconds'] or 0:.1f}s, after stop 0.0s ({sizes})")
+
+    stats, outputs = record(args, os.path.join(base_dir, 'single.mp4'), None)
+    proxy_file = os.path.join(base_dir, 'single_proxy.mp4')
+    elapsed = transcode_proxy(outputs[0]['file'], proxy_file)
+    print(f"{'transcode':<12} capture cpu {stats['cpu_seconds'] or 0:.1f}s, after stop {elapsed:.1f}s "
+          f"(main {os.path.getsize(outputs[0]['file']) / 1e6:.2f} MB, "
+          f"proxy {os.path.getsize(proxy_file) / 1e6:.2f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""环形缓冲区 + 写线程在慢速磁盘下的表现
+
+用模拟采集后端录制，输出端包装成定期卡顿的慢速 sink（模拟杀毒扫描或网络目录），
+报告每个缓冲区大小下的溢出次数、峰值占用、最长单次写入时间，以及溢出时丢弃（按静音补齐）的时长
+和音轨长度与录制时长的偏差（应接近 0）。
+
+    python benchmarks/bench_ring_writer.py [--duration 5] [--stall 0.3] [--every 1.0]
+"""
+import argparse
+import os
+import tempfile
+import time
+import wave
+from RecMaster.audio_recorder import AudioRecorderManager, open_wave_sink
+from RecMaster.capture_backend import SyntheticCaptureBackend
+
+
+class SlowSink:
+    """每隔 every 秒让一次写入卡顿 stall 秒"""
+    def __init__(self, sink, stall, every):
+        self.sink = sink
+        self.stall = stall
+        self.every = every
+        self._last_stall = time.perf_counter()
+
+    def writeframes(self, data):
+        now = time.perf_counter()
+        if now - self._last_stall >= self.every:
+            self._last_stall = now
+            time.sleep(self.stall)
+        self.sink.writeframes(data)
+
+    def close(self):
+        self.sink.close()
+
+
+class TempPathManager:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        return os.path.join(self.base_dir, f"{device_name or 'input'}.wav")
+
+
+def run(ring_seconds, args, base_dir):
+    manager = AudioRecorderManager(
+        backend_factory=lambda device, is_input=False: SyntheticCaptureBackend(
+            sample_format='float32', channels=args.channels, sample_rate=args.rate),
+        sink_factory=lambda *sink_args: SlowSink(open_wave_sink(*sink_args), args.stall, args.every),
+        ring_seconds=ring_seconds)
+    filename, = manager.start_recording(selected_outputs=[{'name': f'ring_{ring_seconds}', 'device': None}],
+                                        path_manager=TempPathManager(base_dir))
+    time.sleep(args.duration)
+    manager.stop_recording()
+    stats = manager.get_stats()[filename]
+    with wave.open(filename) as f:
+        length = f.getnframes() / f.getframerate()
+    expected = (manager.stop_qpc - manager.start_qpc) / 10000000
+    return stats, (length - expected) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--stall', type=float, default=0.3, help='每次卡顿秒数')
+    parser.add_argument('--every', type=float, default=1.0, help='卡顿间隔秒数')
+    parser.add_argument('--rate', type=int, default=48000)
+    parser.add_argument('--channels', type=int, default=2)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as base_dir:
+        for ring_seconds in (0.1, 0.5, 2.0):
+            rows.append((ring_seconds,) + run(ring_seconds, args, base_dir))
+
+    print(f"slow sink: {args.stall}s stall every {args.every}s, {args.duration}s capture")
+    print(f"{'ring (s)':>9}{'overflows':>11}{'peak fill':>11}{'hwm events':>12}"
+          f"{'writes':>8}{'max write (s)':>15}{'dropped (s)':>13}{'vs rec (ms)':>13}")
+    for ring_seconds, stats, delta_ms in rows:
+        ring, writer = stats['ring'], stats['writer']
+        dropped = stats['timeline']['dropped_frames'] / args.rate
+        print(f"{ring_seconds:>9}{ring['overflows']:>11}{ring['peak_fill_ratio']:>11.0%}"
+              f"{ring['high_water_events']:>12}{writer['writes']:>8}{writer['max_write_time']:>15.3f}"
+              f"{dropped:>13.3f}{delta_ms:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
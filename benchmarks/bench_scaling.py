@@ -0,0 +1,72 @@
+"""缩放基准：不同输出尺寸和缩放算法下的编码实时倍数和码率
+
+对 calibration 中的合成屏幕内容（滚动文字、静态界面、视频）按 --size 采集尺寸离线编码
+--seconds 秒，分别使用原始尺寸、逻辑像素（--dpi 缩放）、最大 1920x1080 以及 50% 配合各种缩放算法，
+报告实时倍数（媒体时长 / 编码耗时）和码率。需要 PATH 中有 ffmpeg。
+
+    python benchmarks/bench_scaling.py [--size 3840x2160] [--dpi 2.0] [--seconds 5] [--quality 3]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from RecMaster.calibration import CALIBRATION_CLIPS, quality_params
+from RecMaster.screen_recorder import SCALERS, ScreenRecorder, scale_filter
+
+CHOICES = [('native', {})] + [('logical', {'scale': 'logical', 'scaler': 'area'}),
+                              ('max1080p', {'max_size': (1920, 1080), 'scaler': 'area'})] + [
+    (f'50% {scaler}', {'scale': 0.5, 'scaler': scaler}) for scaler in SCALERS]
+
+
+def output_size(width, height, dpi, options):
+    recorder = ScreenRecorder(video_source='lavfi', **options)
+    recorder.width, recorder.height = width, height
+    return recorder._output_size(dpi)
+
+
+def encode(args, clip, params, width, height, scaler, output_file):
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', CALIBRATION_CLIPS[clip].format(size=args.size, fps=params['fps']),
+        '-t', str(args.seconds),
+    ]
+    if f'{width}x{height}' != args.size:
+        cmd.extend(['-vf', scale_filter(width, height, scaler)])
+    cmd.extend([
+        '-c:v', 'libx264', '-preset', params['preset'], '-crf', str(params['crf']),
+        '-pix_fmt', 'yuv420p', output_file,
+    ])
+    start = time.perf_counter()
+    subprocess.run(cmd, check=True, capture_output=True)
+    elapsed = time.perf_counter() - start
+    return args.seconds / elapsed, os.path.getsize(output_file) * 8 / 1000 / args.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='3840x2160', help='采集尺寸')
+    parser.add_argument('--dpi', type=float, default=2.0, help='逻辑像素模式使用的 DPI 缩放比例')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--quality', type=int, default=3)
+    args = parser.parse_args()
+
+    params = quality_params(args.quality)
+    width, height = map(int, args.size.split('x'))
+    base_dir = tempfile.mkdtemp()
+    print(f"{args.size} @ {params['fps']} fps, {params['preset']} crf {params['crf']}, "
+          f"{args.seconds:g} s per clip, files in {base_dir}")
+    print(f"{'choice':<20}{'output':>11}" + ''.join(f"{clip:>22}" for clip in CALIBRATION_CLIPS))
+    for name, options in CHOICES:
+        out_width, out_height = output_size(width, height, args.dpi, options)
+        row = f"{name:<20}{f'{out_width}x{out_height}':>11}"
+        for clip in CALIBRATION_CLIPS:
+            realtime, kbps = encode(args, clip, params, out_width, out_height,
+                                    options.get('scaler', 'bicubic'),
+                                    os.path.join(base_dir, f'{clip}.mp4'))
+            row += f"{f'{realtime:.2f}x {kbps:.0f} kbps':>22}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""分段录制基准：整段录制后合并 与 分段边录边合并 的停止耗时随录制时长的变化
+
+每个时长各录制两次（lavfi 视频 + 模拟音频设备，实时）：一次写单个文件，停止后整体合并；
+一次按 --segment 秒分段，由 SegmentMerger 在录制过程中逐段合并。需要 PATH 中有 ffmpeg。
+
+    python benchmarks/bench_segment_merge.py [--lengths 60 240] [--segment 30] [--size 1280x720]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from RecMaster.audio_recorder import AudioRecorderManager
+from RecMaster.capture_backend import SyntheticCaptureBackend
+from RecMaster.merge import SegmentMerger, merge_command
+from RecMaster.screen_recorder import ScreenRecorder
+
+
+class BenchPaths:
+    """与 RecordingPathManager 相同的接口，文件放在临时目录"""
+    def __init__(self, base_dir, prefix):
+        self.base_dir = base_dir
+        self.prefix = prefix
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        return os.path.join(self.base_dir, f'{self.prefix}_audio_out_{device_name}.wav')
+
+    def get_mixed_audio_filename(self):
+        return os.path.join(self.base_dir, f'{self.prefix}_audio_mix.wav')
+
+    def get_merged_filename(self):
+        return os.path.join(self.base_dir, f'{self.prefix}_merge.mp4')
+
+
+def start(args, paths, segment_seconds):
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi',
+                              segment_seconds=segment_seconds)
+    width, height = map(int, args.size.split('x'))
+    recorder.start_recording(0, 0, width, height,
+                             output_file=os.path.join(paths.base_dir, f'{paths.prefix}_video.mp4'))
+    manager = AudioRecorderManager(
+        backend_factory=lambda device, is_input=False: SyntheticCaptureBackend())
+    audio_files = manager.start_recording(selected_outputs=[{'name': 'speakers', 'device': 'speakers'}],
+                                          path_manager=paths)
+    tracks = [(audio_file, manager.start_time - recorder.start_time) for audio_file in audio_files]
+    return recorder, manager, tracks
+
+
+def run_monolithic(args, paths, seconds):
+    recorder, manager, tracks = start(args, paths, None)
+    time.sleep(seconds)
+    stop_start = time.perf_counter()
+    recorder.stop_recording()
+    manager.stop_recording()
+    subprocess.run(merge_command(recorder.output_file, tracks, paths.get_merged_filename()),
+                   capture_output=True)
+    return time.perf_counter() - stop_start
+
+
+def run_segmented(args, paths, seconds):
+    recorder, manager, tracks = start(args, paths, args.segment)
+    merger = SegmentMerger(recorder, tracks, paths.get_merged_filename(), workers=args.workers)
+    merger.start()
+    time.sleep(seconds)
+    stop_start = time.perf_counter()
+    recorder.stop_recording()
+    manager.stop_recording()
+    merger.finish()
+    return time.perf_counter() - stop_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=float, nargs='+', default=[60.0, 240.0],
+                        help='录制时长（秒）')
+    parser.add_argument('--segment', type=float, default=30.0, help='分段时长')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--quality', type=int, default=2)
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp()
+    print(f"lavfi {args.size}, {args.segment:g} s segments, files in {base_dir}")
+    print(f"{'length (s)':>10}{'monolithic (s)':>18}{'segmented (s)':>16}")
+    for seconds in args.lengths:
+        monolithic = run_monolithic(args, BenchPaths(base_dir, f'mono{seconds:g}'), seconds)
+        segmented = run_segmented(args, BenchPaths(base_dir, f'seg{seconds:g}'), seconds)
+        print(f"{seconds:>10g}{monolithic:>18.2f}{segmented:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
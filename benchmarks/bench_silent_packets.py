@@ -0,0 +1,51 @@
+"""空闲回环设备的采集开销：按普通数据包转换 与 按 SILENT 标志写共享全零块 对比
+
+输出每个包的耗时 (ns/packet) 和临时内存分配 (bytes/packet)。
+
+    python benchmarks/bench_silent_packets.py [--frames 480] [--channels 2] [--packets 20000]
+"""
+import argparse
+import numpy as np
+from bench_convert import measure
+from RecMaster.audio_recorder import _write_silence
+from RecMaster.ring_buffer import RingBuffer
+from RecMaster.sample_format import PacketConverter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=480, help='每包帧数（48kHz 下 10ms）')
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--packets', type=int, default=20000)
+    args = parser.parse_args()
+
+    format_info = {'channels': args.channels, 'sample_rate': 48000,
+                   'bits_per_sample': 32, 'is_float': True}
+    converter = PacketConverter(format_info)
+    frame_bytes = args.channels * converter.sample_width
+    packet_bytes = args.frames * frame_bytes
+    # 回环设备空闲时 WASAPI 仍然按节奏交付全零的数据包
+    device_buffer = np.zeros(args.frames * args.channels, dtype=np.float32)
+    address = device_buffer.ctypes.data
+    zero_block = memoryview(bytes(4800 * frame_bytes))
+    ring = RingBuffer(packet_bytes * 64)
+    drain = bytearray(ring.capacity)
+
+    def convert_path():
+        data, _ = converter.convert(address, args.frames)
+        ring.write(data)
+        ring.read_into(drain, ring.capacity)
+
+    def silent_path():
+        _write_silence(ring, zero_block, packet_bytes)
+        ring.read_into(drain, ring.capacity)
+
+    print(f"{args.frames} frames x {args.channels} ch silent float32 packets, {args.packets} packets")
+    print(f"{'path':<12}{'ns/packet':>12}{'bytes/packet':>16}")
+    for name, func in (('convert', convert_path), ('SILENT flag', silent_path)):
+        ns_per_frame, bytes_per_packet = measure(func, args.packets, args.frames)
+        print(f"{name:<12}{ns_per_frame * args.frames:>12.0f}{bytes_per_packet:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""单次录制（音频管道送入录屏 ffmpeg）与 分别录制后合并 的停止耗时对比
+
+视频使用 ffmpeg lavfi 测试图像，音频使用两路模拟设备，实时录制 --seconds 秒后停止，
+报告从停止到最终 mp4 可用的时间，以及额外读写的文件字节数。需要 PATH 中有 ffmpeg。
+
+    python benchmarks/bench_single_pass.py [--seconds 30] [--size 1280x720] [--quality 3]
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from RecMaster.audio_recorder import AudioRecorderManager
+from RecMaster.capture_backend import SyntheticCaptureBackend
+from RecMaster.muxed_recording import MuxedRecording
+from RecMaster.screen_recorder import ScreenRecorder
+
+DEVICE_FORMATS = {
+    'speakers': dict(sample_format='float32', channels=2),
+    'microphone': dict(sample_format='int16', channels=1),
+}
+
+
+class BenchPaths:
+    """与 RecordingPathManager 相同的接口，文件放在临时目录"""
+    def __init__(self, base_dir, prefix):
+        self.base_dir = base_dir
+        self.prefix = prefix
+
+    def _path(self, name):
+        return os.path.join(self.base_dir, f'{self.prefix}_{name}')
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        return self._path('audio_in.wav' if is_input else f'audio_out_{device_name}.wav')
+
+    def get_mixed_audio_filename(self):
+        return self._path('audio_mix.wav')
+
+    def get_video_filename(self):
+        return self._path('video.mp4')
+
+    def get_merged_filename(self):
+        return self._path('merge.mp4')
+
+
+def make_devices():
+    manager = AudioRecorderManager(
+        backend_factory=lambda device, is_input=False: SyntheticCaptureBackend(**DEVICE_FORMATS[device])
+    )
+    outputs = [{'name': 'speakers', 'device': 'speakers'}]
+    microphone = {'name': 'microphone', 'device': 'microphone'}
+    return manager, outputs, microphone
+
+
+def region(args):
+    width, height = map(int, args.size.split('x'))
+    return 0, 0, width, height
+
+
+def run_two_pass(args, paths):
+    manager, outputs, microphone = make_devices()
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi')
+    recorder.start_recording(*region(args), output_file=paths.get_video_filename())
+    audio_files = manager.start_recording(selected_outputs=outputs, selected_input=microphone,
+                                          path_manager=paths, mix=True)
+    time.sleep(args.seconds)
+
+    stop_start = time.perf_counter()
+    recorder.stop_recording()
+    manager.stop_recording()
+    offset = manager.start_time - recorder.start_time
+    subprocess.run([
+        'ffmpeg', '-y', '-i', recorder.output_file,
+        '-itsoffset', f'{offset:.3f}', '-i', audio_files[0],
+        '-map', '0:v', '-map', '1:a',
+        '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k',
+        paths.get_merged_filename()
+    ], check=True, capture_output=True)
+    elapsed = time.perf_counter() - stop_start
+    # 合并时读一遍视频和音频，再写一遍最终文件
+    extra_bytes = (os.path.getsize(recorder.output_file) + os.path.getsize(audio_files[0])
+                   + os.path.getsize(paths.get_merged_filename()))
+    return elapsed, extra_bytes
+
+
+def run_single_pass(args, paths):
+    manager, outputs, microphone = make_devices()
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi')
+    muxed = MuxedRecording(recorder, manager)
+    muxed.start(*region(args), selected_outputs=outputs, selected_input=microphone,
+                path_manager=paths)
+    time.sleep(args.seconds)
+    output_file = muxed.stop()
+    if not os.path.exists(output_file):
+        raise RuntimeError(f"单次录制没有生成 {output_file}")
+    return muxed.stats['finalize_seconds'], 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30.0, help='录制时长')
+    parser.add_argument('--size', default='1280x720', help='测试图像尺寸')
+    parser.add_argument('--quality', type=int, default=3)
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp()
+    print(f"{args.seconds:g} s lavfi {args.size} + 2 synthetic devices, files in {base_dir}")
+    print(f"{'mode':<14}{'stop -> ready (s)':>20}{'extra I/O (MB)':>18}")
+    for name, func in (('two-pass', run_two_pass), ('single-pass', run_single_pass)):
+        elapsed, extra_bytes = func(args, BenchPaths(base_dir, name))
+        print(f"{name:<14}{elapsed:>20.2f}{extra_bytes / 1e6:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
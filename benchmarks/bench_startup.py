@@ -0,0 +1,129 @@
+"""启动基准：import 耗时（python -X importtime）和界面的首次绘制 / 设备列表填充时间
+
+每项在新的解释器中运行 --runs 次，报告中位数。import 耗时为 -X importtime 各模块自身耗时之和，
+减去空解释器（-c pass）的部分。界面部分需要 tkinter、显示器和 Windows 音频环境，不可用时跳过。
+
+    python benchmarks/bench_startup.py [--runs 5] [--no-ui]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# 分别计时的导入
+IMPORTS = [
+    'RecMaster',
+    'RecMaster.screen_recorder',
+    'RecMaster.audio_recorder',
+    'RecMaster.cli',
+    'RecMaster.videoRecorder',
+]
+
+# import RecMaster 时不应加载的重量级模块
+HEAVY_MODULES = ('numpy', 'tkinter', 'comtypes', 'pycaw', 'win32gui', 'humanize')
+
+UI_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+from RecMaster.videoRecorder import RecorderUI
+imported = time.perf_counter() - start
+ui = RecorderUI()
+def check():
+    if 'devices_seconds' not in ui.startup:
+        ui.window.after(10, check)
+        return
+    print(json.dumps(dict(ui.startup, import_seconds=imported)))
+    ui.on_close()
+ui.window.after(10, check)
+ui.run()
+'''
+
+
+def _env():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+
+
+def import_profile(statement):
+    """运行一次 -X importtime，返回 ({模块: 自身微秒}, 导入成功后已加载的重量级模块)；失败时后者为 None
+
+    导入失败的可选依赖（如 Linux 上的 win32gui）也出现在 importtime 的输出中，
+    所以重量级模块由子进程按 sys.modules 报告。
+    """
+    script = f'{statement}\nimport sys\nprint(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+                            capture_output=True, text=True, env=_env())
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    if result.returncode:
+        return modules, None
+    return modules, [name for name in result.stdout.strip().split(',') if name]
+
+
+def measure_import(module, runs, baseline):
+    totals = []
+    for _ in range(runs):
+        modules, heavy = import_profile(f'import {module}')
+        if heavy is None:
+            return None
+        totals.append(sum(us for name, us in modules.items() if name not in baseline))
+    top = sorted(((us, name) for name, us in modules.items() if name not in baseline), reverse=True)[:3]
+    return {
+        'ms': statistics.median(totals) / 1000,
+        'modules': sum(1 for name in modules if name not in baseline),
+        'heavy': heavy,
+        'top': [f'{name} {us / 1000:.1f}ms' for us, name in top],
+    }
+
+
+def measure_ui(runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', UI_SCRIPT], capture_output=True, text=True,
+                                env=_env(), timeout=120)
+        process_seconds = time.perf_counter() - start
+        lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+        if result.returncode or not lines:
+            return None
+        samples.append(dict(json.loads(lines[-1]), process_seconds=process_seconds))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-ui', action='store_true', help='只测 import 耗时')
+    args = parser.parse_args()
+
+    baseline, _ = import_profile('pass')
+    print(f"{'import':<28}{'ms':>8}{'modules':>9}  heavy / top modules")
+    for module in IMPORTS:
+        stats = measure_import(module, args.runs, baseline)
+        if stats is None:
+            print(f"{module:<28}{'n/a':>8}")
+            continue
+        print(f"{module:<28}{stats['ms']:>8.1f}{stats['modules']:>9}  "
+              f"{','.join(stats['heavy']) or '-'} / {', '.join(stats['top'])}")
+
+    if args.no_ui:
+        return
+    ui = measure_ui(args.runs)
+    if ui is None:
+        print("\nUI: 无法启动（需要 tkinter、显示器和 Windows 环境），跳过")
+        return
+    print(f"\nUI: import {ui['import_seconds'] * 1000:.0f} ms, "
+          f"first paint {ui['window_seconds'] * 1000:.0f} ms, "
+          f"devices listed {ui['devices_seconds'] * 1000:.0f} ms, "
+          f"process {ui['process_seconds'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""两阶段录制基准：直接编码 与 近无损快速录制 的录制时 CPU 对比，以及后台转码队列的吞吐量
+
+先用 lavfi 测试图像按 --quality 直接录制 --seconds 秒，再以 two_phase=True 录制同样时长，
+报告 ffmpeg 的 CPU 时间和文件大小；然后把中间文件复制 --jobs 份，分别用 1 个和 --workers 个
+转码进程压缩，报告耗时、吞吐量（媒体秒数 / 墙钟秒数）和压缩后的大小。需要 PATH 中有 ffmpeg 和 ffprobe。
+
+    python benchmarks/bench_transcode.py [--seconds 20] [--size 1920x1080] [--quality 4] [--jobs 4] [--workers 2]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from RecMaster.screen_recorder import ScreenRecorder
+from RecMaster.transcode import TranscodeQueue, probe_duration
+
+
+def record(args, two_phase, output_file):
+    recorder = ScreenRecorder(quality=args.quality, video_source='lavfi', two_phase=two_phase)
+    width, height = map(int, args.size.split('x'))
+    recorder.start_recording(0, 0, width, height, output_file=output_file)
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        recorder.telemetry.wait_update(timeout=1.0)
+    stats = recorder.get_stats()
+    recorder.stop_recording()
+    stats['file_size'] = os.path.getsize(output_file)
+    return stats
+
+
+def run_queue(args, source, workers, base_dir):
+    files = []
+    for i in range(args.jobs):
+        path = os.path.join(base_dir, f'w{workers}_job{i}.mp4')
+        shutil.copy(source, path)
+        files.append(path)
+    queue = TranscodeQueue(workers=workers, state_dir=base_dir, low_priority=False)
+    start = time.perf_counter()
+    for path in files:
+        queue.submit(path, args.quality)
+    queue.wait()
+    elapsed = time.perf_counter() - start
+    queue.shutdown()
+    os.remove(queue.state_file)
+    return elapsed, sum(os.path.getsize(path) for path in files) / len(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--quality', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=4, help='转码任务数')
+    parser.add_argument('--workers', type=int, default=2, help='并行转码进程数')
+    args = parser.parse_args()
+
+    base_dir = tempfile.mkdtemp()
+    print(f"lavfi {args.size} quality {args.quality}, {args.seconds:g} s per capture, files in {base_dir}")
+    print(f"{'capture':<12}{'preset':>10}{'cpu s':>8}{'size MB':>9}")
+    captures = {}
+    for name, two_phase in (('direct', False), ('two-phase', True)):
+        output_file = os.path.join(base_dir, f'{name}.mp4')
+        stats = record(args, two_phase, output_file)
+        captures[name] = output_file
+        cpu = f"{stats['cpu_seconds']:.1f}" if stats['cpu_seconds'] is not None else '-'
+        print(f"{name:<12}{stats['preset']:>10}{cpu:>8}{stats['file_size'] / 1e6:>9.2f}")
+
+    media_seconds = (probe_duration(captures['two-phase']) or args.seconds) * args.jobs
+    print(f"\n{'workers':<12}{'wall s':>8}{'media s/s':>11}{'size MB':>9}")
+    for workers in sorted({1, args.workers}):
+        elapsed, size = run_queue(args, captures['two-phase'], workers, base_dir)
+        print(f"{workers:<12}{elapsed:>8.1f}{media_seconds / elapsed:>11.2f}{size / 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
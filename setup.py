@@ -22,7 +22,7 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: Microsoft :: Windows",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     install_requires=[
         "comtypes",
         "numpy",
@@ -34,6 +34,8 @@ setup(
     entry_points={
         'console_scripts': [
             'recmaster=RecMaster:main',
+            'recmaster-calibrate=RecMaster.calibration:main',
+            'recmaster-recover=RecMaster.recovery:main',
         ],
     },
 ) 
\ No newline at end of file
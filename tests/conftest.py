@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+# 直接运行 pytest 时也能导入 RecMaster
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestPaths:
+    """录制文件放在 pytest 的临时目录中"""
+    def __init__(self, base_dir):
+        self.base_dir = str(base_dir)
+
+    def get_audio_filename(self, is_input=False, device_name=None):
+        return os.path.join(self.base_dir, f'{device_name}.wav')
+
+    def get_mixed_audio_filename(self):
+        return os.path.join(self.base_dir, 'mix.wav')
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return TestPaths(tmp_path)
@@ -0,0 +1,62 @@
+import time
+import wave
+import numpy as np
+from RecMaster.audio_recorder import AudioRecorderManager, _write_silence
+from RecMaster.capture_backend import (AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY, AUDCLNT_BUFFERFLAGS_SILENT,
+                                       SyntheticCaptureBackend)
+from RecMaster.ring_buffer import RingBuffer
+
+PACKET_FRAMES = 480
+
+
+def record(paths, seconds, **backend_options):
+    manager = AudioRecorderManager(
+        backend_factory=lambda device, is_input=False: SyntheticCaptureBackend(**backend_options))
+    files = manager.start_recording(selected_outputs=[{'name': 'synthetic', 'device': 'synthetic'}],
+                                    path_manager=paths)
+    time.sleep(seconds)
+    manager.stop_recording()
+    return files[0], manager.get_glitch_report()[files[0]]
+
+
+def zero_runs(filename, min_frames=100):
+    """音轨中间（不含首尾）的全零段长度，单位为帧"""
+    with wave.open(filename) as f:
+        frame_bytes = f.getsampwidth() * f.getnchannels()
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype=np.uint8)
+    silent = ~data.reshape(-1, frame_bytes).any(axis=1)
+    bounds = [0] + list(np.flatnonzero(np.diff(silent.astype(np.int8))) + 1) + [len(silent)]
+    return [int(end - start) for start, end in zip(bounds[1:-2], bounds[2:-1])
+            if silent[start] and end - start >= min_frames]
+
+
+def test_write_silence_writes_zeros():
+    ring = RingBuffer(4096)
+    ring.write(b'\x01' * 1000)
+    ring.read_into(bytearray(1000), 1000)
+    zero_block = memoryview(bytes(256))
+    assert _write_silence(ring, zero_block, 1000, 4) == 1000
+    out = bytearray(1000)
+    ring.read_into(out, 1000)
+    assert not any(out)
+
+
+def test_silent_packets_and_discontinuity(paths):
+    # 包 10~19 为 SILENT（缓冲区里仍然是正弦波），包 30 之前丢了一个包
+    schedule = {index: AUDCLNT_BUFFERFLAGS_SILENT for index in range(10, 20)}
+    schedule[30] = AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY
+    filename, report = record(paths, 0.5, flag_schedule=schedule)
+
+    assert report['silent_packets'] == 10
+    assert report['discontinuities'] == 1
+    assert [kind for _, kind, _ in report['events']] == ['discontinuity']
+    # SILENT 包写入全零，丢失的包按设备位置补一个包的静音
+    runs = zero_runs(filename)
+    assert len(runs) == 2
+    assert abs(runs[0] - 10 * PACKET_FRAMES) <= 2
+    assert abs(runs[1] - PACKET_FRAMES) <= 2
+
+
+def test_first_packet_discontinuity_not_counted(paths):
+    _, report = record(paths, 0.2, flag_schedule={0: AUDCLNT_BUFFERFLAGS_DATA_DISCONTINUITY})
+    assert report['discontinuities'] == 0
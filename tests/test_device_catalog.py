@@ -0,0 +1,80 @@
+import pytest
+from RecMaster.device_catalog import CAPTURE, RENDER, DeviceCatalog, FakeDeviceSource
+
+
+@pytest.fixture
+def source():
+    source = FakeDeviceSource()
+    source.add_device('speakers', 'Speakers', flow=RENDER)
+    source.add_device('hdmi', 'HDMI', flow=RENDER)
+    source.add_device('mic', 'Microphone', flow=CAPTURE)
+    return source
+
+
+@pytest.fixture
+def catalog(source):
+    catalog = DeviceCatalog(source)
+    catalog.devices()
+    yield catalog
+    catalog.close()
+
+
+def names(devices):
+    return [device['name'] for device in devices]
+
+
+def test_cached_refresh_reads_nothing(source, catalog):
+    describes = source.calls['describe']
+    enumerations = catalog.stats['enumerations']
+    for _ in range(3):
+        outputs, inputs = catalog.devices()
+    assert names(outputs) == ['Speakers', 'HDMI']
+    assert names(inputs) == ['Microphone']
+    assert source.calls['describe'] == describes
+    assert catalog.stats['enumerations'] == enumerations
+    assert catalog.stats['hits'] == 9
+
+
+def test_added_device_is_the_only_one_described(source, catalog):
+    events = []
+    catalog.add_listener(lambda event, device_id, flow: events.append((event, device_id)))
+    describes = source.calls['describe']
+    source.add_device('headset', 'Headset', flow=RENDER)
+    outputs, _ = catalog.devices()
+    assert names(outputs) == ['Speakers', 'HDMI', 'Headset']
+    assert source.calls['describe'] == describes + 1
+    assert events == [('added', 'headset')]
+
+
+def test_property_change_invalidates_one_device(source, catalog):
+    describes = source.calls['describe']
+    events = catalog.stats['events']
+    source.set_property('hdmi', name='TV')
+    outputs, _ = catalog.devices()
+    assert names(outputs) == ['Speakers', 'TV']
+    assert source.calls['describe'] == describes + 1
+    assert catalog.stats['events'] == events + 1
+
+
+def test_removed_and_default_change_need_no_reads(source, catalog):
+    describes = source.calls['describe']
+    enumerations = catalog.stats['enumerations']
+    source.set_default(RENDER, 'hdmi')
+    assert catalog.default_device(RENDER)['id'] == 'hdmi'
+    source.remove_device('speakers')
+    outputs, _ = catalog.devices()
+    assert names(outputs) == ['HDMI']
+    assert catalog.get('speakers') is None
+    assert source.calls['describe'] == describes
+    assert catalog.stats['enumerations'] == enumerations
+
+
+def test_invalidate(source, catalog):
+    describes = source.calls['describe']
+    catalog.invalidate('mic')
+    catalog.devices()
+    assert source.calls['describe'] == describes + 1
+    catalog.invalidate()
+    catalog.devices()
+    assert source.calls['describe'] == describes + 4
+    assert catalog.stats['invalidations'] == 2
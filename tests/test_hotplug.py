@@ -0,0 +1,105 @@
+import time
+import wave
+import numpy as np
+import pytest
+from RecMaster.audio_recorder import AudioRecorderManager
+from RecMaster.capture_backend import DeviceInvalidatedError, SyntheticCaptureBackend
+from RecMaster.device_catalog import RENDER, FakeDeviceSource
+
+# 音轨长度与录制时长（stop_qpc - start_qpc）的允许偏差
+TOLERANCE = 0.02
+
+
+class Rig:
+    """backend_factory 只能打开 source 中存在的设备，options 为各设备的 SyntheticCaptureBackend 参数"""
+    def __init__(self):
+        self.source = FakeDeviceSource()
+        self.source.add_device('speakers', 'Speakers', flow=RENDER, default=True)
+        self.source.add_device('headset', 'Headset', flow=RENDER)
+        self.backends = {}
+        self.options = {}
+
+    def factory(self, device, is_input=False):
+        if device not in self.source.devices:
+            raise DeviceInvalidatedError(f"{device} 不存在")
+        backend = SyntheticCaptureBackend(**self.options.pop(device, {}))
+        self.backends[device] = backend
+        return backend
+
+    def record(self, paths, seconds, events=()):
+        manager = AudioRecorderManager(backend_factory=self.factory, device_source=self.source,
+                                       reattach_interval=0.05)
+        outputs, _ = manager.get_available_devices()
+        files = manager.start_recording(selected_outputs=outputs, path_manager=paths)
+        start = time.monotonic()
+        for at, action in events:
+            time.sleep(max(0.0, start + at - time.monotonic()))
+            action()
+        time.sleep(max(0.0, start + seconds - time.monotonic()))
+        manager.stop_recording()
+        return manager, dict(zip(('speakers', 'headset'), files))
+
+
+def read_track(filename):
+    with wave.open(filename) as f:
+        assert f.getsampwidth() == 2
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        return data.reshape(-1, f.getnchannels()), f.getframerate()
+
+
+def assert_track_length(manager, filename):
+    expected = (manager.stop_qpc - manager.start_qpc) / 10000000
+    frames, rate = read_track(filename)
+    assert len(frames) / rate == pytest.approx(expected, abs=TOLERANCE)
+    return frames, rate
+
+
+@pytest.mark.parametrize('fail_at_packet', [0, 30])
+def test_driver_error_reattaches_same_device(paths, fail_at_packet):
+    rig = Rig()
+    rig.options['speakers'] = {'fail_at_packet': fail_at_packet}
+    manager, files = rig.record(paths, 0.8)
+    stats = manager.get_stats()
+    assert stats[files['speakers']]['reattaches'] == 1
+    assert stats[files['headset']]['reattaches'] == 0
+    for filename in files.values():
+        assert_track_length(manager, filename)
+
+
+def test_unplug_and_replug(paths):
+    rig = Rig()
+
+    def unplug():
+        rig.backends['headset'].invalidate()
+        rig.source.remove_device('headset')
+
+    manager, files = rig.record(paths, 1.0, [(0.3, unplug),
+                                             (0.6, lambda: rig.source.add_device('headset', 'Headset'))])
+    stats = manager.get_stats()[files['headset']]
+    assert stats['reattaches'] == 1
+    assert stats['lost_seconds'] == pytest.approx(0.3, abs=0.1)
+    frames, rate = assert_track_length(manager, files['headset'])
+    # 拔出期间为静音，重新连接后恢复
+    assert not frames[int(0.4 * rate):int(0.5 * rate)].any()
+    assert frames[int(0.8 * rate):int(0.9 * rate)].any()
+
+
+def test_replug_with_different_format(paths):
+    rig = Rig()
+
+    def replug():
+        rig.backends['headset'].invalidate()
+        rig.source.remove_device('headset')
+        rig.options['headset'] = {'channels': 1, 'sample_rate': 44100, 'sample_format': 'int16'}
+        rig.source.add_device('headset', 'Headset')
+
+    manager, files = rig.record(paths, 1.0, [(0.4, replug)])
+    assert manager.get_stats()[files['headset']]['reattaches'] == 1
+    frames, rate = assert_track_length(manager, files['headset'])
+    # 单声道 44.1kHz 的新设备转换为原音轨的双声道 48kHz
+    assert rate == 48000 and frames.shape[1] == 2
+    tail = frames[int(0.6 * rate):int(0.9 * rate)]
+    assert np.array_equal(tail[:, 0], tail[:, 1])
+    # 重采样后仍然是 440Hz 的正弦波
+    spectrum = np.abs(np.fft.rfft(tail[:, 0]))
+    assert np.argmax(spectrum) * rate / len(tail) == pytest.approx(440, abs=5)